@@ -0,0 +1,189 @@
+import argparse
+import json
+import sys
+from das.utils.ingest_benchmark import (
+    compare_results,
+    run_benchmark,
+    run_dispatch_benchmark,
+)
+from das.utils.log_codecs import CODECS
+from das.utils.log_format import LOG_FORMATS
+
+parser = argparse.ArgumentParser(
+    description="Measure how many messages per second the recorder can log, without an MQTT broker",
+    add_help=True,
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+)
+
+parser.add_argument(
+    "-n",
+    "--messages",
+    action="store",
+    type=int,
+    default=100000,
+    help="""Number of messages injected per run""",
+)
+
+parser.add_argument(
+    "-i",
+    "--id",
+    action="store",
+    nargs="+",
+    type=int,
+    default=[1, 2, 3, 4],
+    help="""Ids of the fake modules sending data (the same sensors as V3_fake_module)""",
+)
+
+parser.add_argument(
+    "--payload-size",
+    action="store",
+    type=int,
+    default=None,
+    help="""Pad every payload to at least PAYLOAD_SIZE bytes (the V3_fake_module sizes by default)""",
+)
+
+parser.add_argument(
+    "-r",
+    "--repeat",
+    action="store",
+    type=int,
+    default=3,
+    help="""Number of runs, the median of the runs is reported""",
+)
+
+parser.add_argument(
+    "-f",
+    "--format",
+    action="store",
+    type=str,
+    choices=list(LOG_FORMATS),
+    default="csv",
+    help="""On-disk format of the log""",
+)
+
+parser.add_argument(
+    "-c",
+    "--compression",
+    action="store",
+    type=str,
+    choices=list(CODECS),
+    default=None,
+    help="""Compress the log with this codec""",
+)
+
+parser.add_argument(
+    "--broker",
+    action="store_true",
+    default=False,
+    help="""Publish the messages through an in-process MQTT broker instead of calling the recorder directly, to
+    measure the end to end rate including the MQTT client""",
+)
+
+parser.add_argument(
+    "--qos",
+    action="store",
+    type=int,
+    choices=[0, 1, 2],
+    default=0,
+    help="""MQTT QoS of the publishes with --broker""",
+)
+
+parser.add_argument(
+    "--dispatch",
+    action="store_true",
+    default=False,
+    help="""Measure the cost of dispatching a message to its handler in the wireless logger instead (only -n, -i and
+    -r apply)""",
+)
+
+parser.add_argument(
+    "-o",
+    "--output",
+    action="store",
+    type=str,
+    default=None,
+    help="""Save the result as JSON, to be used as the baseline of a later run""",
+)
+
+parser.add_argument(
+    "--compare",
+    action="store",
+    type=str,
+    default=None,
+    help="""Compare with a result saved with --output and exit with an error if a metric regressed""",
+)
+
+parser.add_argument(
+    "--tolerance",
+    action="store",
+    type=float,
+    default=0.1,
+    help="""Relative change in the wrong direction that counts as a regression with --compare""",
+)
+
+
+if __name__ == "__main__":
+    # Read command line arguments
+    args = parser.parse_args()
+
+    if args.dispatch:
+        result = run_dispatch_benchmark(
+            messages=args.messages, modules=args.id, repeat=args.repeat
+        )
+
+        print(
+            f"Commit {result['environment']['commit']} | {args.messages} messages x {args.repeat} runs | "
+            "wireless logger dispatch"
+        )
+        print(
+            f"Per message: {result['dispatch_ns']:.0f}ns routed | {result['topic_objects_ns']:.0f}ns comparing "
+            f"topic objects ({result['speedup']:.1f}x)"
+        )
+
+    else:
+        result = run_benchmark(
+            messages=args.messages,
+            modules=args.id,
+            payload_size=args.payload_size,
+            repeat=args.repeat,
+            broker=args.broker,
+            qos=args.qos,
+            log_format=args.format,
+            compression=args.compression,
+        )
+
+        print(
+            f"Commit {result['environment']['commit']} | {args.messages} messages x {args.repeat} runs | "
+            f"{args.format}{' + ' + args.compression if args.compression else ''}"
+            f"{f' | through the broker (QoS {args.qos})' if args.broker else ''}"
+        )
+        print(
+            f"{result['msgs_per_s']:.0f} msgs/s ingest | {result['end_to_end_msgs_per_s']:.0f} msgs/s end to end"
+        )
+        if result["p50_us"] is not None:
+            print(
+                f"Per message: p50 {result['p50_us']:.2f}us | p99 {result['p99_us']:.2f}us | max {result['max_us']:.2f}us"
+            )
+        print(
+            f"Written {result['bytes_written']:.0f} bytes ({result['bytes_per_message']:.1f} bytes/message), "
+            f"{result['dropped']:.0f} dropped"
+        )
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(result, output_file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+
+        comparison = compare_results(baseline, result, tolerance=args.tolerance)
+        print(f"Compared with commit {baseline['environment']['commit']}:")
+        for metric in comparison:
+            print(
+                f"  {metric['metric']: <28} {metric['baseline']: >12.2f} -> {metric['result']: >12.2f} "
+                f"({metric['change']:+.1%}){'  REGRESSION' if metric['regression'] else ''}"
+            )
+
+        if any(metric["regression"] for metric in comparison):
+            sys.exit(1)
@@ -0,0 +1,114 @@
+import argparse
+from datetime import datetime
+import json
+import os
+import sys
+from das.utils.log_catalog import CATALOG_FILENAME, LogCatalog
+
+parser = argparse.ArgumentParser(
+    description="Query the catalog of recorded logs without opening any log",
+    add_help=True,
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+)
+
+parser.add_argument(
+    "folder",
+    action="store",
+    type=str,
+    nargs="?",
+    default=os.path.join(os.path.dirname(__file__), "csv_data"),
+    help="""Folder of the logs (containing the catalog)""",
+)
+
+parser.add_argument(
+    "-s",
+    "--sequence",
+    action="store",
+    type=str,
+    default=None,
+    help="""Only show logs from this sequence ("log" or "wireless")""",
+)
+
+parser.add_argument(
+    "-n",
+    "--num",
+    action="store",
+    type=int,
+    default=None,
+    help="""Only show the log with this number""",
+)
+
+parser.add_argument(
+    "--topic",
+    action="store",
+    type=str,
+    default=None,
+    help="""Only show logs that recorded a topic containing TOPIC, or matching TOPIC if it has + or #
+    wildcards (e.g. /v3/wireless_module/+/battery)""",
+)
+
+parser.add_argument(
+    "--since",
+    action="store",
+    type=datetime.fromisoformat,
+    default=None,
+    help="""Only show logs started at or after this time (e.g. 2020-12-01T09:00)""",
+)
+
+parser.add_argument(
+    "--until",
+    action="store",
+    type=datetime.fromisoformat,
+    default=None,
+    help="""Only show logs started before this time""",
+)
+
+parser.add_argument(
+    "--json",
+    action="store_true",
+    default=False,
+    help="""Output the matching logs as JSON""",
+)
+
+
+def format_log(log: dict) -> str:
+    """Formats a catalog entry as a single line."""
+    start_time = (
+        datetime.fromtimestamp(log["start_time"]).strftime("%Y-%m-%d %H:%M:%S")
+        if log["start_time"]
+        else "?"
+    )
+    duration = f"{log['duration']:.1f}s" if log["duration"] is not None else "?"
+    messages = log["messages"] if log["messages"] is not None else "?"
+    size = log["bytes"] if log["bytes"] is not None else "?"
+    filename = os.path.basename(log["filepath"] or "")
+
+    return (
+        f"{log['sequence']: <9} {log['log_num']: >5} | {start_time} | {duration: >9} | "
+        f"{messages: >9} msgs | {size: >11} B | {log['status']: <9} | {filename} | "
+        f"{', '.join(log['topics'] or log['subscriptions'])}"
+    )
+
+
+if __name__ == "__main__":
+    # Read command line arguments
+    args = parser.parse_args()
+
+    if not os.path.exists(os.path.join(args.folder, CATALOG_FILENAME)):
+        print(f"There is no log catalog in {args.folder}")
+        sys.exit(1)
+
+    logs = LogCatalog(args.folder).find(
+        sequence=args.sequence,
+        log_num=args.num,
+        topic=args.topic,
+        since=args.since.timestamp() if args.since else None,
+        until=args.until.timestamp() if args.until else None,
+    )
+
+    if args.json:
+        print(json.dumps(logs, indent=2))
+    else:
+        for log in logs:
+            print(format_log(log))
+        print(f"{len(logs)} logs")
@@ -0,0 +1,103 @@
+import argparse
+import os
+import sys
+from das.utils import log_codecs, log_format
+from das.utils.topic_filter import TopicFilter
+
+parser = argparse.ArgumentParser(
+    description="Convert logs between the csv and binary log formats and compress them",
+    add_help=True,
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+)
+
+parser.add_argument(
+    "input", action="store", type=str, help="""Filepath of the log to convert"""
+)
+
+parser.add_argument(
+    "output",
+    action="store",
+    type=str,
+    nargs="?",
+    default=None,
+    help="""Filepath of the converted log (defaults to the input with the new extension)""",
+)
+
+parser.add_argument(
+    "-f",
+    "--format",
+    action="store",
+    type=str,
+    choices=list(log_format.LOG_FORMATS),
+    default=None,
+    help="""Format of the converted log (defaults to the opposite of the input format, or to the input format
+    when compressing)""",
+)
+
+parser.add_argument(
+    "-c",
+    "--compression",
+    action="store",
+    type=str,
+    choices=list(log_codecs.CODECS),
+    default=None,
+    help="""Compress the converted log with this codec""",
+)
+
+parser.add_argument(
+    "--topic",
+    action="store",
+    type=str,
+    nargs="+",
+    default=None,
+    help="""Only keep the messages on these topics (+ and # wildcards allowed, e.g. /v3/wireless_module/3/#)""",
+)
+
+parser.add_argument(
+    "--exclude",
+    action="store",
+    type=str,
+    nargs="+",
+    default=None,
+    help="""Drop the messages on these topics (+ and # wildcards allowed)""",
+)
+
+if __name__ == "__main__":
+    # Read command line arguments
+    args = parser.parse_args()
+
+    input_format = log_format.detect_log_format(args.input)
+    output_format = args.format
+    if output_format is None and args.compression is not None:
+        output_format = input_format
+    elif output_format is None:
+        output_format = "csv" if input_format == "binary" else "binary"
+
+    output_filepath = args.output
+    if output_filepath is None:
+        # Compressed inputs have two extensions (e.g. 1_log.csv.gz)
+        input_name = os.path.splitext(log_codecs.strip_codec_extension(args.input))[0]
+        extension = log_format.LOG_FORMATS[output_format]
+        output_filepath = f"{input_name}.{extension}"
+
+        if args.compression is not None:
+            output_filepath += log_codecs.get_codec(args.compression).EXTENSION
+
+    if os.path.abspath(output_filepath) == os.path.abspath(args.input):
+        print(f"Refusing to overwrite {args.input}")
+        sys.exit(1)
+
+    topic_filter = None
+    if args.topic or args.exclude:
+        topic_filter = TopicFilter(args.topic, args.exclude)
+
+    count = log_format.convert_log(
+        args.input, output_filepath, output_format, topic_filter=topic_filter
+    )
+
+    input_size = os.path.getsize(args.input)
+    output_size = os.path.getsize(output_filepath)
+    print(f"Converted {count} messages from {input_format} to {output_format}")
+    print(
+        f"{args.input} ({input_size} bytes) -> {output_filepath} ({output_size} bytes)"
+    )
@@ -0,0 +1,62 @@
+import argparse
+import os
+import re
+from das.utils.log_catalog import CATALOG_FILENAME, LogCatalog
+from das.utils.log_recovery import recover_session
+
+parser = argparse.ArgumentParser(
+    description="Repair a log left behind by a crash or power loss by truncating it to its last complete record",
+    add_help=True,
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+)
+
+parser.add_argument(
+    "filepath",
+    action="store",
+    type=str,
+    help="""Filepath of the log (csv, binary, compressed) or of a session manifest (N_log.json)""",
+)
+
+parser.add_argument(
+    "--dry-run",
+    action="store_true",
+    default=False,
+    help="""Only report how much would be lost without changing any file""",
+)
+
+
+def update_catalog(filepath: str, reports: list) -> None:
+    """Marks a recovered log in the catalog of its folder (if it has one) with the recovered counts."""
+    folder_path = os.path.dirname(os.path.abspath(filepath))
+    match = re.match(r"(\d+)_log\.", os.path.basename(filepath))
+    if not match or not os.path.exists(os.path.join(folder_path, CATALOG_FILENAME)):
+        return
+
+    LogCatalog(folder_path).update(
+        int(match.group(1)),
+        status="recovered",
+        messages=sum(report["messages"] for report in reports),
+        bytes=sum(report["valid_bytes"] for report in reports),
+    )
+
+
+if __name__ == "__main__":
+    # Read command line arguments
+    args = parser.parse_args()
+
+    reports = recover_session(args.filepath, dry_run=args.dry_run)
+
+    for report in reports:
+        last_time_delta = (
+            f"{report['last_time_delta']:.3f}s"
+            if report["last_time_delta"] is not None
+            else "?"
+        )
+        print(
+            f"{os.path.basename(report['filepath'])}: kept {report['messages']} messages up to {last_time_delta}, "
+            f"{report['lost_bytes']} of {report['total_bytes']} bytes "
+            f"{'would be lost' if args.dry_run else 'lost'}"
+        )
+
+    if not args.dry_run:
+        update_catalog(args.filepath, reports)
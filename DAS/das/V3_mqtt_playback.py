@@ -1,7 +1,27 @@
 import sys
 import argparse
 import socket
+from datetime import datetime
 from das.utils import logger
+from das.utils.playback_timing import format_timing_summary
+
+
+def parse_time(value: str):
+    """Parses a playback time as seconds (e.g. 2400), minutes and seconds (e.g. 40:00, 1:05:30) or a wall clock
+    time (e.g. 2020-12-01T09:40)."""
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    if "-" not in value and "T" not in value:
+        seconds = 0.0
+        for part in value.split(":"):
+            seconds = seconds * 60 + float(part)
+        return seconds
+
+    return datetime.fromisoformat(value)
+
 
 parser = argparse.ArgumentParser(
     description="MQTT playback",
@@ -10,7 +30,28 @@ parser = argparse.ArgumentParser(
 )
 
 parser.add_argument(
-    "filepath", action="store", type=str, help="""Filepath of the csv log"""
+    "filepath",
+    action="store",
+    type=str,
+    nargs="+",
+    help="""Filepath of the log (or of a segmented session manifest), several logs are merged into one stream
+    ordered by time""",
+)
+
+parser.add_argument(
+    "--offset",
+    action="store",
+    type=float,
+    nargs="+",
+    default=None,
+    help="""Clock offset in seconds added to each log when playing several logs (one per log)""",
+)
+
+parser.add_argument(
+    "--align",
+    action="store_true",
+    default=False,
+    help="""Line several logs up by the wall clock time they were started at""",
 )
 
 parser.add_argument(
@@ -30,6 +71,93 @@ parser.add_argument(
     help="""Playback speed up""",
 )
 
+parser.add_argument(
+    "--start",
+    action="store",
+    type=parse_time,
+    default=None,
+    help="""Start playing at this time into the log (seconds, MM:SS or HH:MM:SS) or at this wall clock time
+    (e.g. 2020-12-01T09:40)""",
+)
+
+parser.add_argument(
+    "--end",
+    action="store",
+    type=parse_time,
+    default=None,
+    help="""Stop playing at this time into the log or wall clock time (same formats as --start)""",
+)
+
+parser.add_argument(
+    "--topic",
+    action="store",
+    type=str,
+    nargs="+",
+    default=None,
+    help="""Only play the messages on these topics (+ and # wildcards allowed, e.g. /v3/wireless_module/3/#)""",
+)
+
+parser.add_argument(
+    "--exclude",
+    action="store",
+    type=str,
+    nargs="+",
+    default=None,
+    help="""Do not play the messages on these topics (+ and # wildcards allowed)""",
+)
+
+parser.add_argument(
+    "--control",
+    action="store",
+    type=str,
+    nargs="?",
+    const="/v3/playback",
+    default=None,
+    help="""Control the playback over MQTT while it runs: publish to CONTROL/pause, CONTROL/resume, CONTROL/seek
+    (seconds) and CONTROL/speed (multiplier), the position is reported on CONTROL/status""",
+)
+
+parser.add_argument(
+    "--max-rate",
+    action="store_true",
+    default=False,
+    help="""Ignore the recorded timing and publish as fast as the broker accepts the messages, then report the
+    achieved throughput and acknowledgement latency""",
+)
+
+parser.add_argument(
+    "--qos",
+    action="store",
+    type=int,
+    choices=[0, 1, 2],
+    default=0,
+    help="""MQTT quality of service used with --max-rate""",
+)
+
+parser.add_argument(
+    "--inflight",
+    action="store",
+    type=int,
+    default=100,
+    help="""Maximum number of unacknowledged messages with --max-rate""",
+)
+
+parser.add_argument(
+    "--timing",
+    action="store_true",
+    default=False,
+    help="""Measure how far each message was published from its intended time and print a lag histogram and drift
+    summary""",
+)
+
+parser.add_argument(
+    "--timing-csv",
+    action="store",
+    type=str,
+    default=None,
+    help="""Also write the intended and actual publish time of every message to this csv (implies --timing)""",
+)
+
 parser.add_argument(
     "-v",
     "--verbose",
@@ -45,10 +173,41 @@ if __name__ == "__main__":
     try:
         # Make logger object and initiate playback
         main_playback = logger.Playback(
-            filepath=args.filepath, broker_address=args.host, verbose=args.verbose
+            filepath=args.filepath,
+            broker_address=args.host,
+            verbose=args.verbose,
+            start=args.start,
+            end=args.end,
+            offsets="start_time" if args.align else args.offset,
+            topics=args.topic,
+            exclude_topics=args.exclude,
+            control_topic=args.control,
         )
 
-        main_playback.play(speed=args.speed)
+        if args.max_rate:
+            report = main_playback.play_max_rate(
+                qos=args.qos, max_inflight=args.inflight
+            )
+
+            latency = report["latency_ms"]
+            print(
+                f"Published {report['messages']} messages ({report['bytes']} bytes, {report['errors']} errors) "
+                f"in {report['duration']:.2f}s"
+            )
+            print(
+                f"{report['msgs_per_s']:.0f} msgs/s | {report['bytes_per_s'] / 1000:.1f} kB/s"
+            )
+            if latency["max"] is not None:
+                print(
+                    f"Ack latency: p50 {latency['p50']:.2f}ms | p90 {latency['p90']:.2f}ms | "
+                    f"p99 {latency['p99']:.2f}ms | max {latency['max']:.2f}ms"
+                )
+        else:
+            timing = main_playback.play(
+                speed=args.speed, timing=args.timing, timing_csv=args.timing_csv
+            )
+            if timing is not None:
+                print(format_timing_summary(timing))
 
     except KeyboardInterrupt:
         pass
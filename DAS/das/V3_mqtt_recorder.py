@@ -1,9 +1,16 @@
 import argparse
 import os
+import signal
+import threading
 import time
 import sys
 import socket
+from mhp import topics
 from das.utils import logger
+from das.utils.log_codecs import CODECS
+from das.utils.log_format import LOG_FORMATS
+from das.utils.recorder_daemon import RecorderDaemon
+from das.utils.recorder_sinks import LogSink
 
 parser = argparse.ArgumentParser(
     description="MQTT logger",
@@ -40,6 +47,148 @@ parser.add_argument(
     help="""Length of time to record data (duration)""",
 )
 
+parser.add_argument(
+    "-f",
+    "--format",
+    action="store",
+    type=str,
+    choices=list(LOG_FORMATS),
+    default="csv",
+    help="""On-disk format of the log""",
+)
+
+parser.add_argument(
+    "--segment-size",
+    action="store",
+    type=int,
+    default=None,
+    help="""Roll the log into a new segment every SEGMENT_SIZE bytes""",
+)
+
+parser.add_argument(
+    "--segment-duration",
+    action="store",
+    type=float,
+    default=None,
+    help="""Roll the log into a new segment every SEGMENT_DURATION seconds""",
+)
+
+parser.add_argument(
+    "--segment-on-das",
+    action="store_true",
+    default=False,
+    help="""Roll the log into a new segment when the DAS starts or stops""",
+)
+
+parser.add_argument(
+    "-c",
+    "--compression",
+    action="store",
+    type=str,
+    choices=list(CODECS),
+    default=None,
+    help="""Compress the log with this codec""",
+)
+
+parser.add_argument(
+    "--checkpoint",
+    action="store",
+    type=float,
+    default=None,
+    help="""Checkpoint the log every CHECKPOINT seconds (fsync plus manifest and catalog update) so that a power
+    loss only loses the data since the last checkpoint""",
+)
+
+parser.add_argument(
+    "--exclude",
+    action="store",
+    type=str,
+    nargs="+",
+    default=None,
+    help="""Do not record messages on these topics (+ and # wildcards allowed), even if they are subscribed to""",
+)
+
+parser.add_argument(
+    "--copy",
+    action="store",
+    type=str,
+    nargs="+",
+    choices=list(LOG_FORMATS),
+    default=None,
+    help="""Also write a copy of the log in these formats (e.g. a binary log next to the csv), each on its own
+    writer thread""",
+)
+
+parser.add_argument(
+    "--pre-trigger",
+    action="store",
+    type=float,
+    default=None,
+    help="""Wait for a trigger topic (the DAS start unless --trigger is given) before writing the log, keeping the
+    last PRE_TRIGGER seconds of messages in memory and writing them to the start of the log""",
+)
+
+parser.add_argument(
+    "--pre-trigger-mb",
+    action="store",
+    type=float,
+    default=8,
+    help="""Maximum size of the messages kept before the trigger in MB""",
+)
+
+parser.add_argument(
+    "--trigger",
+    action="store",
+    type=str,
+    nargs="+",
+    default=None,
+    help="""Topics that trigger the recording with --pre-trigger (+ and # wildcards allowed)""",
+)
+
+parser.add_argument(
+    "--daemon",
+    action="store_true",
+    default=False,
+    help="""Keep running and record a new log from every DAS start to the following DAS stop, over a single broker
+    connection, until stopped with SIGTERM or Ctrl+C""",
+)
+
+parser.add_argument(
+    "--status-topic",
+    action="store",
+    type=str,
+    default="/v3/recorder/status",
+    help="""Topic the daemon publishes its state and CPU and memory use on""",
+)
+
+parser.add_argument(
+    "--status-interval",
+    action="store",
+    type=float,
+    default=5,
+    help="""Time in seconds between the status messages of the daemon""",
+)
+
+parser.add_argument(
+    "--metrics",
+    action="store",
+    type=str,
+    nargs="?",
+    const="/v3/recorder/metrics",
+    default=None,
+    help="""Publish live metrics (message rates per topic, time since the last message of each wireless module,
+    queue depth, write latency, file size) on this topic while recording (/v3/recorder/metrics when no topic is
+    given)""",
+)
+
+parser.add_argument(
+    "--metrics-interval",
+    action="store",
+    type=float,
+    default=5,
+    help="""Time in seconds between metrics messages""",
+)
+
 if __name__ == "__main__":
     CURRENT_FILEPATH = os.path.dirname(__file__)
     CSV_FILEPATH = os.path.join(CURRENT_FILEPATH, "csv_data")
@@ -47,7 +196,59 @@ if __name__ == "__main__":
     # Read command line arguments
     args = parser.parse_args()
 
+    recorder_options = dict(
+        log_format=args.format,
+        segment_size=args.segment_size,
+        segment_duration=args.segment_duration,
+        segment_topics=(
+            [str(topics.DAS.start), str(topics.DAS.stop)]
+            if args.segment_on_das
+            else None
+        ),
+        compression=args.compression,
+        fsync_interval=args.checkpoint,
+        exclude_topics=args.exclude,
+        sinks=[LogSink(log_format) for log_format in args.copy or []],
+        trigger_topics=(
+            args.trigger or [str(topics.DAS.start)]
+            if args.pre_trigger is not None
+            else None
+        ),
+        pre_trigger_seconds=args.pre_trigger,
+        pre_trigger_bytes=int(args.pre_trigger_mb * 1024 * 1024),
+        metrics_topic=args.metrics,
+        metrics_interval=args.metrics_interval,
+    )
+
+    if args.daemon:
+        try:
+            # Blocks until SIGTERM/Ctrl+C (or the time is up), saving the current log before exiting
+            RecorderDaemon(
+                CSV_FILEPATH,
+                topics=args.topics,
+                broker_address=args.host,
+                start_topics=[str(topics.DAS.start)],
+                stop_topics=[str(topics.DAS.stop)],
+                status_topic=args.status_topic,
+                status_interval=args.status_interval,
+                verbose=args.verbose,
+                **recorder_options,
+            ).run(None if args.time == float("Inf") else args.time)
+
+        except socket.timeout as e:
+            print(f"{type(e)}: {e}")
+            print(f"The IP address of the MQTT broker is probably wrong")
+
+        except Exception as e:
+            print(f"{type(e)}: {e}")
+
+        sys.exit()
+
+    # SIGTERM (e.g. from systemd) stops the recorder the same way as Ctrl+C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+
     # Logger can run forever or for a specific time
+    main_recorder = None
     try:
         # Make logger object and initiate logging
         main_recorder = logger.Recorder(
@@ -55,16 +256,17 @@ if __name__ == "__main__":
             topics=args.topics,
             broker_address=args.host,
             verbose=args.verbose,
+            **recorder_options,
         )
 
         # Start the logger
         main_recorder.start()
 
+        # Sleep until the time is up or a signal arrives, leaving the CPU to the network and writer threads
         if args.time != float("Inf"):
             time.sleep(args.time)
         else:
-            while True:
-                pass
+            threading.Event().wait()
 
     except KeyboardInterrupt:
         pass
@@ -78,5 +280,6 @@ if __name__ == "__main__":
 
     finally:
         # Graceful exit that nicely quits the recorder to ensure the data is saved
-        main_recorder.stop()
+        if main_recorder is not None:
+            main_recorder.stop()
         sys.exit()
@@ -1,14 +1,19 @@
 import paho.mqtt.client as mqtt
 import os
-import pandas as pd
 from datetime import datetime
 import argparse
-import glob
-import re
+import json
+import logging
+import time
 
 from mhp import topics
 
-from das.utils import DataToTempCSV
+from das.utils import (
+    DataToTempCSV, TempCSVWriters, merge_temp_csvs, parse_module_message)
+from das.utils.DataToTempCSV import WirelessModuleType
+from das.utils.column_store import ColumnStoreWriters
+from das.utils.log_catalog import LogCatalog
+from das.utils.sensor_rings import RING_CAPACITY, SensorRings
 
 
 # Global dicts to store state
@@ -16,6 +21,11 @@ from das.utils import DataToTempCSV
 is_recording = {}       # If the data is being recorded
 module_start_time = {}  # When the data started being recorded
 output_filepath = {}    # Output filepath to save the file
+output_log_num = {}     # Log number allocated from the catalog
+
+# Route of every topic seen so far, {<topic>: (handler, module_id_str,
+# module_id_num, module_type)} or {<topic>: None} for topics not handled
+topic_routes = {}
 
 # Global file path
 GLOBAL_FILEPATH = os.path.dirname(__file__)
@@ -24,6 +34,25 @@ GLOBAL_FILEPATH = os.path.dirname(__file__)
 TEMP_DIR = os.path.join(GLOBAL_FILEPATH, ".~temps")
 CSV_DIR = os.path.join(GLOBAL_FILEPATH, "csv_data")
 
+# Catalog that allocates the log numbers (created on the first recording)
+catalog = None
+
+# Open temp files of the modules being recorded, kept open between messages,
+# that also merge the rows of each module into its final CSV as they arrive
+temp_writers = TempCSVWriters(TEMP_DIR)
+
+# Column stores of the modules being recorded when they are saved with
+# --store columnar instead of as CSVs (None saves CSVs)
+column_stores = None
+
+# Extension of the recordings of each --store
+STORE_EXTENSIONS = {"csv": ".csv", "columnar": ".cols"}
+
+# Live ring buffers of the latest samples of every sensor channel, and the
+# topic they are queried on (None when --rings is not used)
+sensor_rings = None
+query_topic = None
+
 parser = argparse.ArgumentParser(
     description='MQTT wireless logger',
     add_help=True)
@@ -33,6 +62,28 @@ parser.add_argument(
     help="""Address of the MQTT broker. If nothing is selected it will
     default to localhost.""")
 
+parser.add_argument(
+    '--store', action='store', type=str, choices=list(STORE_EXTENSIONS),
+    default="csv",
+    help="""How the recordings are saved. csv merges the battery and sensor
+    data of a module into a CSV. columnar saves them into a folder of NumPy
+    column chunks (one row per message, new sensors add columns), which
+    das.utils.column_store.read_column_store loads into a DataFrame.""")
+
+parser.add_argument(
+    '--rings', action='store', type=str, nargs='?',
+    const="/v3/wireless-logger/query", default=None,
+    help="""Keep the latest samples of every sensor channel (eg. M2_co2) in
+    memory, whether the module is recording or not, and answer queries for
+    them sent on this topic (/v3/wireless-logger/query when no topic is
+    given). See SensorRings.query for the JSON requests, the response is
+    published on the response_topic of the request, or on the query topic
+    followed by /response.""")
+
+parser.add_argument(
+    '--ring-size', action='store', type=int, default=RING_CAPACITY,
+    help="""Number of samples kept per sensor channel with --rings""")
+
 
 def on_connect(client, userdata, flags, rc):
     """ When the MQTT client connects to the broker it prints out if it
@@ -47,36 +98,119 @@ def on_connect(client, userdata, flags, rc):
     # Subscribe to all of the wireless module topics
     client.subscribe("/v3/wireless-module/#")
 
+    # Subscribe to the queries of the live sensor rings
+    if query_topic is not None:
+        client.subscribe(query_topic)
+
 
 def on_message(client, userdata, msg):
     """ MQTT callback for when data is sent on the subscribed
-    '/v3/wireless-module/#' topics. The module_id_str is found by squashing M
+    '/v3/wireless-module/#' topics. The message is passed on to the handler of
+    its topic (see route), which starts or stops the recording of the module,
+    records its data or answers a query of the sensor rings.
+    """
+    topic_route = route(msg.topic)
+    if topic_route is not None:
+        handler, module_id_str, module_id_num, module_type = topic_route
+        handler(client, msg, module_id_str, module_id_num, module_type)
+
+
+def route(topic):
+    """ Returns the route of a topic as (handler, module_id_str,
+    module_id_num, module_type), or None if it is not handled. The routes of
+    every topic of a module are worked out the first time one of them is
+    seen, after that a message only costs a dict lookup."""
+    try:
+        return topic_routes[topic]
+    except KeyError:
+        return add_module_routes(topic)
+
+
+def add_module_routes(topic):
+    """ Adds the routes of every topic of the module a topic belongs to and
+    returns the route of the topic. The module_id_str is found by squashing M
     infront of the module number. eg M1, M2, M3... etc. The module_id_str is
-    used for identifying what data came from where and is also used for naming
-    the temp files.
+    used for identifying what data came from where and is also used for
+    naming the temp files.
     """
-    module_id_num = msg.topic.split("/")[3]
-    module_id_str = "M" + module_id_num
-
-    # Start the recording of <module_id>
-    if topics.WirelessModule.id(module_id_num).start == msg.topic:
-        start_recording(module_id_str)
-        print(module_id_str,
-              "STARTED, RECORDING TO FILE:",
-              output_filepath[module_id_str])
-
-    # Stop the recording of <module_id>
-    elif topics.WirelessModule.id(module_id_num).stop == msg.topic:
-        stop_recording(module_id_str)
-        print(module_id_str,
-              "STOPPED, RECORDED TO FILE:",
-              output_filepath[module_id_str])
-
-    # Record data (battery, low-battery and sensor data)
-    elif is_recording[module_id_str]:
-        DataToTempCSV(
+    topic_levels = topic.split("/")
+    if len(topic_levels) > 3:
+        module_id_num = topic_levels[3]
+        module_id_str = "M" + module_id_num
+        module_topics = topics.WirelessModule.id(module_id_num)
+
+        # Low-battery messages are recorded with the battery data
+        module_handlers = [
+            ("start", handle_start, None),
+            ("stop", handle_stop, None),
+            ("data", handle_data, WirelessModuleType.data),
+            ("battery", handle_data, WirelessModuleType.battery),
+            ("low_battery", handle_data, WirelessModuleType.battery),
+        ]
+        for name, handler, module_type in module_handlers:
+            module_topic = getattr(module_topics, name, None)
+            if module_topic is not None:
+                topic_routes[str(module_topic)] = (
+                    handler, module_id_str, module_id_num,
+                    None if module_type is None else str(module_type))
+
+    # Topics that are not handled are remembered as well
+    return topic_routes.setdefault(topic, None)
+
+
+def handle_start(client, msg, module_id_str, module_id_num, module_type):
+    """ Start the recording of <module_id> """
+    start_recording(module_id_str)
+    print(module_id_str,
+          "STARTED, RECORDING TO FILE:",
+          output_filepath[module_id_str])
+
+
+def handle_stop(client, msg, module_id_str, module_id_num, module_type):
+    """ Stop the recording of <module_id> """
+    stop_recording(module_id_str)
+    print(module_id_str,
+          "STOPPED, RECORDED TO FILE:",
+          output_filepath[module_id_str])
+
+
+def handle_data(client, msg, module_id_str, module_id_num, module_type):
+    """ Record data (battery, low-battery and sensor data) if <module_id> is
+    being recorded, and add it to the sensor rings """
+    data_dict = None
+    if is_recording.get(module_id_str):
+        writers = temp_writers if column_stores is None else column_stores
+        data_dict = DataToTempCSV(
             msg, module_start_time[module_id_str],
-            module_id_str, module_id_num, TEMP_DIR)
+            module_id_str, module_id_num, TEMP_DIR, writers, module_type)
+
+    if sensor_rings is not None:
+        if data_dict is None:
+            data_dict = parse_module_message(msg, module_id_str, module_type)
+        sensor_rings.record(time.time(), data_dict)
+
+
+def handle_query(client, msg, module_id_str, module_id_num, module_type):
+    """ Answer a query of the sensor rings (see SensorRings.query) """
+    try:
+        request = json.loads(msg.payload)
+        response_topic = request.get(
+            "response_topic", query_topic + "/response")
+        response = sensor_rings.query(request)
+        client.publish(response_topic, json.dumps(response))
+
+    except Exception as e:
+        logging.error(f"{type(e)}: {e}")
+
+
+def enable_rings(topic, capacity=RING_CAPACITY):
+    """ Keep the latest samples of every sensor channel in sensor_rings and
+    answer the queries sent on topic """
+    global sensor_rings, query_topic
+
+    sensor_rings = SensorRings(capacity)
+    query_topic = topic
+    topic_routes[topic] = (handle_query, None, None, None)
 
 
 def start_recording(module_id_str):
@@ -85,25 +219,42 @@ def start_recording(module_id_str):
     is_recording[module_id_str] = True
     module_start_time[module_id_str] = datetime.now()
 
-    # Generate filename from the last log number + 1
-    max_file_id = 0
-    for filepath in glob.glob(os.path.join(CSV_DIR, '*_M?.csv')):
-        # split the filepath into the filename
-        filename = filepath.split("/")[-1]
-
-        # Gets all the digits from the file name
-        temp = re.findall(r'\d+', filename)
-
-        # Gets all the digits from the file name
-        file_id = list(map(int, temp))[0]
-
-        if file_id > max_file_id:
-            max_file_id = file_id
+    # Allocate the next log number from the catalog (atomic, so modules
+    # starting together never get the same number and the folder is not
+    # scanned on every start)
+    log_num = get_catalog().allocate(
+        "wireless", seed_pattern=r"(\d+)_M\d+\.",
+        subscriptions=[f"/v3/wireless-module/{module_id_str[1:]}/#"])
 
     # Save output filepath in global dict
-    output_filename = f"{max_file_id+1}_{module_id_str}.csv"
+    store = "csv" if column_stores is None else "columnar"
+    output_filename = f"{log_num}_{module_id_str}{STORE_EXTENSIONS[store]}"
     print(output_filename)
+    output_log_num[module_id_str] = log_num
     output_filepath[module_id_str] = os.path.join(CSV_DIR, output_filename)
+    get_catalog().update(log_num, "wireless",
+                         filepath=output_filepath[module_id_str])
+
+    # Store the data as it arrives, or merge the battery and sensor data into
+    # the final CSV while recording
+    if column_stores is not None:
+        column_stores.open_module(
+            module_id_str, output_filepath[module_id_str])
+    else:
+        temp_writers.merge_module(
+            module_id_str, output_filepath[module_id_str])
+
+
+def get_catalog():
+    """ Returns the log catalog of CSV_DIR, creating it if needed """
+    global catalog
+
+    if catalog is None:
+        if not os.path.exists(CSV_DIR):
+            os.makedirs(CSV_DIR)
+        catalog = LogCatalog(CSV_DIR)
+
+    return catalog
 
 
 def stop_recording(module_id_str):
@@ -111,11 +262,35 @@ def stop_recording(module_id_str):
     # Change the state of recording to false in global dict
     is_recording[module_id_str] = False
 
-    # Find the temp files in the current folder for the current module
-    temp_filepaths = find_temp_csvs(module_id_str)
+    if column_stores is not None:
+        # The data was stored as it arrived, only write what is in memory
+        store = column_stores.close_module(module_id_str)
+        rows, size = store.rows, store.bytes_written
+        temp_filepaths = []
 
-    # Merge the battery and sensor data into a single CSV
-    merge_and_save_temps(temp_filepaths, output_filepath[module_id_str])
+    else:
+        # Close the temp files of the module so everything is written to disk
+        temp_writers.close_module(module_id_str)
+
+        # Find the temp files in the current folder for the current module
+        temp_filepaths = find_temp_csvs(module_id_str)
+
+        # The battery and sensor data were merged into the final CSV as they
+        # arrived, merge the temp files instead if they were not (eg. the
+        # module was already recording when the merge was started, or its
+        # battery data only started after the header of the final CSV was
+        # written)
+        rows = temp_writers.finish_merge(module_id_str)
+        if rows is None:
+            rows = merge_and_save_temps(
+                temp_filepaths, output_filepath[module_id_str])
+        size = os.path.getsize(output_filepath[module_id_str])
+
+    # Save a summary of the recording in the catalog
+    duration = datetime.now() - module_start_time[module_id_str]
+    get_catalog().update(
+        output_log_num[module_id_str], "wireless", status="complete",
+        duration=duration.total_seconds(), messages=rows, bytes=size)
 
     # Remove the temp files for the specific module that where generated
     for file in temp_filepaths:
@@ -139,27 +314,26 @@ def find_temp_csvs(module_id_str=""):
 
 def merge_and_save_temps(temp_filepaths, save_filepath):
     """ This function merges multiple temporary module CSVs into a final one
-    and names the file correctly.
+    and names the file correctly. The rows are ordered by their *_TIME
+    columns and hold the latest values of the other temp CSVs at that time,
+    only one row of each temp CSV is in memory at once. Returns the number of
+    rows saved.
     temp_filepaths:     Example list of filepaths is [filepath1, filepath2]"""
 
     # If the csv directory does not exist, make one
     if not os.path.exists(CSV_DIR):
         os.makedirs(CSV_DIR)
 
-    # Place all of the pandas dataframes into a list
-    temp_dataframes = []
-    for temp_filename in temp_filepaths:
-        df = pd.read_csv(temp_filename)
-        temp_dataframes.append(df)
-
-    # Merge the dataframes and output the final csv
-    merged_dataframe = pd.concat(temp_dataframes, axis=1)
-    merged_dataframe.to_csv(save_filepath)
+    return merge_temp_csvs(temp_filepaths, save_filepath)
 
 
 if __name__ == "__main__":
     args = parser.parse_args()
     broker_address = args.host
+    if args.store == "columnar":
+        column_stores = ColumnStoreWriters()
+    if args.rings:
+        enable_rings(args.rings, args.ring_size)
     client = mqtt.Client()
 
     client.on_connect = on_connect
@@ -167,4 +341,10 @@ if __name__ == "__main__":
 
     client.connect(broker_address)
 
-    client.loop_forever()
+    try:
+        client.loop_forever()
+    finally:
+        # Save what is buffered for the modules that are still recording
+        temp_writers.close()
+        if column_stores is not None:
+            column_stores.close()
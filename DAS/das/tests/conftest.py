@@ -0,0 +1,26 @@
+from das.utils.mqtt_broker import MqttBroker
+import paho.mqtt.client as mqtt
+import pytest
+
+
+@pytest.fixture(scope="class")
+def mqtt_broker(request):
+    """In-process MQTT broker on a free local port, shared by the tests of a class.
+
+    On unittest classes (`@pytest.mark.usefixtures("mqtt_broker")`) it is also available as `self.broker`.
+    """
+    with MqttBroker() as broker:
+        if request.cls is not None:
+            request.cls.broker = broker
+        yield broker
+
+
+@pytest.fixture
+def mqtt_client(mqtt_broker):
+    """paho client connected to the test broker with its network loop running."""
+    client = mqtt.Client()
+    client.connect(mqtt_broker.host, mqtt_broker.port)
+    client.loop_start()
+    yield client
+    client.loop_stop()
+    client.disconnect()
@@ -0,0 +1,70 @@
+from das.utils.batch_writer import BatchWriter
+import tempfile
+import unittest
+
+
+class TestBatchWriter(unittest.TestCase):
+    def setUp(self):
+        self.log_file = tempfile.TemporaryFile("w+")
+        self.batches = []
+
+        def write_batch(records):
+            self.batches.append(records)
+            self.log_file.write("".join(records))
+
+        self.writer = BatchWriter(
+            write_batch, self.log_file, flush_size=10, flush_interval=0.05
+        )
+
+    def tearDown(self):
+        self.log_file.close()
+
+    def contents(self):
+        self.log_file.seek(0)
+        return self.log_file.read()
+
+    def test_writes_all_records_in_order(self):
+        self.writer.start()
+        for i in range(95):
+            assert self.writer.put(f"{i}\n")
+        self.writer.stop()
+
+        assert self.contents() == "".join(f"{i}\n" for i in range(95))
+
+        # No batch should be larger than the flush size
+        assert max(len(batch) for batch in self.batches) <= 10
+        assert self.writer.stats["written"] == 95
+        assert self.writer.stats["queue_depth"] == 0
+
+    def test_sync_writes_queued_records(self):
+        self.writer.start()
+        self.writer.put("a\n")
+        self.writer.put("b\n")
+
+        assert self.writer.sync(timeout=5)
+        assert self.contents() == "a\nb\n"
+        assert self.writer.stats["fsyncs"] >= 1
+
+        self.writer.stop()
+
+    def test_full_queue_drops_records(self):
+        writer = BatchWriter(lambda records: None, self.log_file, max_queue_size=3)
+
+        # The writer thread has not been started so nothing is drained
+        results = [writer.put(i) for i in range(5)]
+
+        assert results == [True, True, True, False, False]
+        assert writer.stats["dropped"] == 2
+        assert writer.stats["queue_depth"] == 3
+
+    def test_latency_percentiles(self):
+        assert self.writer.latency_percentiles()["p50"] is None
+
+        self.writer.start()
+        for i in range(50):
+            self.writer.put(f"{i}\n")
+        self.writer.stop()
+
+        latency = self.writer.latency_percentiles()
+        assert 0 <= latency["p50"] <= latency["p99"] <= latency["max"]
+        assert latency["max"] == self.writer.stats["max_flush_latency"]
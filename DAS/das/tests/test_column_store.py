@@ -0,0 +1,80 @@
+from das.utils.column_store import (
+    ColumnStore,
+    ColumnStoreWriters,
+    chunk_filepaths,
+    read_column_store,
+)
+import numpy as np
+import os
+import shutil
+import unittest
+
+CURRENT_FILEPATH = os.path.dirname(__file__)
+
+# Used to store the column stores created by the tests
+TEST_FOLDER = os.path.join(CURRENT_FILEPATH, ".~column_stores")
+STORE_PATH = os.path.join(TEST_FOLDER, "1_M1.cols")
+
+
+class TestColumnStore(unittest.TestCase):
+    def tearDown(self):
+        shutil.rmtree(TEST_FOLDER)
+
+    def test_new_columns_are_backfilled(self):
+        with ColumnStore(STORE_PATH, chunk_rows=2) as store:
+            store.append({"M1_co2": 1, "M1_DATA_TIME": 0.1})
+            store.append({"M1_co2": 2, "M1_DATA_TIME": 0.2})
+            store.append({"M1_co2": 3, "M1_gps_datetime": "a", "M1_DATA_TIME": 0.3})
+            store.append({"M1_percentage": 80, "M1_BATTERY_TIME": 0.4})
+            store.append({"M1_co2": 4, "M1_gps_datetime": "b", "M1_DATA_TIME": 0.5})
+
+        assert len(chunk_filepaths(STORE_PATH)) == 3
+        store_df = read_column_store(STORE_PATH)
+        assert store_df.columns.tolist() == [
+            "M1_co2",
+            "M1_DATA_TIME",
+            "M1_gps_datetime",
+            "M1_percentage",
+            "M1_BATTERY_TIME",
+        ]
+        assert store_df["M1_co2"].dtype == np.float64
+        assert store_df["M1_co2"].fillna(0).tolist() == [1, 2, 3, 0, 4]
+        assert store_df["M1_gps_datetime"].fillna("").tolist() == ["", "", "a", "", "b"]
+        assert store_df["M1_percentage"].fillna(0).tolist() == [0, 0, 0, 80, 0]
+
+    def test_reopen_appends(self):
+        with ColumnStore(STORE_PATH) as store:
+            store.append({"M1_co2": 1})
+        with ColumnStore(STORE_PATH) as store:
+            assert store.rows == 1
+            store.append({"M1_co2": 2, "M1_humidity": 85.5})
+            assert store.bytes_written > 0
+
+            store_df = store.to_dataframe(["M1_humidity", "M1_co2"])
+        assert store_df.columns.tolist() == ["M1_humidity", "M1_co2"]
+        assert store_df["M1_co2"].tolist() == [1, 2]
+        assert store_df["M1_humidity"].isna().tolist() == [True, False]
+
+    def test_empty(self):
+        with ColumnStore(STORE_PATH) as store:
+            assert store.rows == 0
+        assert chunk_filepaths(STORE_PATH) == []
+        assert read_column_store(STORE_PATH).empty
+
+
+class TestColumnStoreWriters(unittest.TestCase):
+    def tearDown(self):
+        shutil.rmtree(TEST_FOLDER)
+
+    def test_write_per_module(self):
+        with ColumnStoreWriters() as writers:
+            writers.open_module("M1", STORE_PATH)
+            writers.write("M1", "DATA", {"M1_co2": 1, "M1_DATA_TIME": 0.1})
+            writers.write("M2", "DATA", {"M2_co2": 1, "M2_DATA_TIME": 0.1})
+            writers.write("M1", "BATTERY", {"M1_percentage": 80})
+
+            store = writers.close_module("M1")
+            assert store.rows == 2
+            assert writers.close_module("M1") is None
+
+        assert read_column_store(STORE_PATH).shape == (2, 3)
@@ -0,0 +1,66 @@
+from das.utils.das_data_generator import send_csv_data
+import csv
+import os
+import shutil
+import unittest
+
+CURRENT_FILEPATH = os.path.dirname(__file__)
+
+# Used to store the csv created by the tests
+TEST_FOLDER = os.path.join(CURRENT_FILEPATH, "das_data_generator_data")
+
+FIELDNAMES = [
+    "time",
+    "aX",
+    "aY",
+    "aZ",
+    "gX",
+    "gY",
+    "gZ",
+    "thermoC",
+    "thermoF",
+    "pot",
+    "reed_velocity",
+    "reed_distance",
+    "power",
+    "cadence",
+    "gps",
+    "gps_course",
+    "gps_speed",
+    "gps_satellites",
+    "gps_location",
+]
+
+
+class TestSendCsvData(unittest.TestCase):
+    def setUp(self):
+        os.makedirs(TEST_FOLDER, exist_ok=True)
+        self.csv_path = os.path.join(TEST_FOLDER, "ride.csv")
+
+        # A V2 DAS log with a row every 100ms for 10 minutes
+        with open(self.csv_path, "w", newline="") as csv_file:
+            writer = csv.DictWriter(csv_file, fieldnames=FIELDNAMES)
+            writer.writeheader()
+            for i in range(6000):
+                row = {field: "0" for field in FIELDNAMES}
+                row["time"] = i * 100
+                row["gps"] = "1"
+                row["gps_location"] = "-37.9,145.1,50"
+                writer.writerow(row)
+
+    def tearDown(self):
+        # Clean up and remove test folder
+        shutil.rmtree(TEST_FOLDER)
+
+    def test_jump(self):
+        sent = []
+        send_csv_data(sent.append, self.csv_path, 599.5, speedup=1)
+
+        # Starts at the first row at or after the jump
+        assert [data.split("&time=")[1].split("&")[0] for data in sent] == [
+            "599500",
+            "599600",
+            "599700",
+            "599800",
+            "599900",
+        ]
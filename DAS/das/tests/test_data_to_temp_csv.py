@@ -0,0 +1,212 @@
+from das.utils.DataToTempCSV import (
+    DataToTempCSV,
+    TempCSVMerger,
+    TempCSVWriters,
+    merge_temp_csvs,
+)
+from datetime import datetime
+import json
+import os
+import paho.mqtt.client as mqtt
+import pandas as pd
+import shutil
+import unittest
+
+CURRENT_FILEPATH = os.path.dirname(__file__)
+
+# Used to store the temp files created by the tests
+TEST_FOLDER = os.path.join(CURRENT_FILEPATH, ".~temps")
+
+
+def read_temp(module_id_str, module_type):
+    return pd.read_csv(
+        os.path.join(TEST_FOLDER, f".~temp_{module_id_str}_{module_type}.csv")
+    )
+
+
+class TestTempCSVWriters(unittest.TestCase):
+    def setUp(self):
+        self.writers = TempCSVWriters(TEST_FOLDER, max_open=2, flush_interval=None)
+
+    def tearDown(self):
+        self.writers.close()
+        shutil.rmtree(TEST_FOLDER)
+
+    def test_rows_with_one_header(self):
+        for i in range(10):
+            self.writers.write("M1", "DATA", {"M1_co2": i, "M1_DATA_TIME": i * 0.1})
+        self.writers.close_module("M1")
+
+        temp_df = read_temp("M1", "DATA")
+        assert temp_df.columns.tolist() == ["M1_co2", "M1_DATA_TIME"]
+        assert temp_df["M1_co2"].tolist() == list(range(10))
+
+    def test_files_stay_open_and_are_flushed(self):
+        self.writers.write("M1", "DATA", {"M1_co2": 1})
+        assert self.writers.open_files == 1
+        self.writers.flush()
+
+        assert read_temp("M1", "DATA")["M1_co2"].tolist() == [1]
+        self.writers.write("M1", "DATA", {"M1_co2": 2})
+        assert self.writers.open_files == 1
+
+    def test_least_recently_used_file_is_closed(self):
+        self.writers.write("M1", "DATA", {"M1_co2": 1})
+        self.writers.write("M2", "DATA", {"M2_co2": 1})
+        self.writers.write("M1", "DATA", {"M1_co2": 2})
+        self.writers.write("M3", "DATA", {"M3_co2": 1})
+        assert self.writers.open_files == 2
+
+        # M2 was closed and is reopened in append mode with its columns
+        self.writers.write("M2", "DATA", {"M2_co2": 2, "M2_new": 0})
+        self.writers.close()
+        assert read_temp("M2", "DATA").to_dict("list") == {"M2_co2": [1, 2]}
+        assert read_temp("M1", "DATA")["M1_co2"].tolist() == [1, 2]
+
+    def test_close_module(self):
+        self.writers.write("M1", "DATA", {"M1_co2": 1})
+        self.writers.write("M1", "BATTERY", {"M1_percentage": 80})
+        self.writers.write("M2", "DATA", {"M2_co2": 1})
+        self.writers.close_module("M1")
+
+        assert self.writers.open_files == 1
+        assert read_temp("M1", "BATTERY")["M1_percentage"].tolist() == [80]
+
+
+class TestTempCSVMerger(unittest.TestCase):
+    def setUp(self):
+        os.makedirs(TEST_FOLDER, exist_ok=True)
+        self.save_filepath = os.path.join(TEST_FOLDER, "merged.csv")
+
+    def tearDown(self):
+        shutil.rmtree(TEST_FOLDER)
+
+    def read_merged(self):
+        return pd.read_csv(self.save_filepath, index_col=0)
+
+    def test_as_of_rows(self):
+        merger = TempCSVMerger(self.save_filepath, sources=["DATA", "BATTERY"])
+        merger.add("DATA", {"M1_co2": 1, "M1_DATA_TIME": 0.1})
+        merger.add("DATA", {"M1_co2": 2, "M1_DATA_TIME": 0.2})
+        # The header waits for the columns of the battery
+        assert not os.path.exists(self.save_filepath)
+        merger.add("BATTERY", {"M1_percentage": 80, "M1_BATTERY_TIME": 0.25})
+        merger.add("DATA", {"M1_co2": 3, "M1_DATA_TIME": 0.3})
+        merger.add("BATTERY", {"M1_percentage": 79, "M1_BATTERY_TIME": 0.4})
+        assert merger.close() == 5
+
+        merged_df = self.read_merged()
+        assert merged_df.columns.tolist() == [
+            "M1_co2",
+            "M1_DATA_TIME",
+            "M1_percentage",
+            "M1_BATTERY_TIME",
+        ]
+        assert merged_df.index.tolist() == list(range(5))
+        assert merged_df["M1_co2"].tolist() == [1, 2, 2, 3, 3]
+        assert merged_df["M1_percentage"].fillna(0).tolist() == [0, 0, 80, 80, 79]
+
+    def test_source_after_the_header(self):
+        merger = TempCSVMerger(self.save_filepath)
+        merger.add("DATA", {"M1_co2": 1, "M1_DATA_TIME": 0.1})
+        merger.add("DATA", {"M1_co2": 2, "M1_DATA_TIME": 0.2})
+
+        with self.assertRaises(ValueError):
+            merger.add("BATTERY", {"M1_percentage": 80, "M1_BATTERY_TIME": 0.25})
+        merger.add("DATA", {"M1_co2": 3, "M1_DATA_TIME": 0.3})
+        assert merger.close() == 3
+        assert self.read_merged()["M1_co2"].tolist() == [1, 2, 3]
+
+    def test_writers_stop_merging(self):
+        with TempCSVWriters(TEST_FOLDER) as writers:
+            writers.merge_module("M1", self.save_filepath, max_pending=1)
+            writers.write("M1", "DATA", {"M1_co2": 1, "M1_DATA_TIME": 0.1})
+            writers.write("M1", "BATTERY", {"M1_percentage": 80})
+
+            # The temp files have to be merged instead
+            assert writers.finish_merge("M1") is None
+
+    def test_merge_temp_csvs(self):
+        with TempCSVWriters(TEST_FOLDER) as writers:
+            writers.merge_module("M1", self.save_filepath)
+            for i in range(6):
+                writers.write("M1", "DATA", {"M1_co2": i, "M1_DATA_TIME": i})
+                if i % 2:
+                    writers.write(
+                        "M1",
+                        "BATTERY",
+                        {"M1_percentage": i, "M1_BATTERY_TIME": i + 0.5},
+                    )
+            assert writers.finish_merge("M1") == 9
+            assert writers.finish_merge("M1") is None
+        incremental_df = self.read_merged()
+
+        # Merging the temp files afterwards gives the same rows
+        rows = merge_temp_csvs(
+            [
+                writers.temp_filepath("M1", "BATTERY"),
+                writers.temp_filepath("M1", "DATA"),
+            ],
+            self.save_filepath,
+        )
+        assert rows == 9
+        merged_df = self.read_merged()[incremental_df.columns]
+        pd.testing.assert_frame_equal(merged_df, incremental_df)
+
+    def test_merge_nothing(self):
+        assert merge_temp_csvs([], self.save_filepath) == 0
+        assert os.path.exists(self.save_filepath)
+
+
+class TestDataToTempCSV(unittest.TestCase):
+    def tearDown(self):
+        shutil.rmtree(TEST_FOLDER)
+
+    def message(self, module_id_num, kind, data):
+        msg = mqtt.MQTTMessage(
+            topic=f"/v3/wireless_module/{module_id_num}/{kind}".encode()
+        )
+        msg.payload = json.dumps(data).encode()
+        return msg
+
+    def test_with_and_without_writers(self):
+        start_time = datetime.now()
+        data = {
+            "module-id": 1,
+            "sensors": [
+                {"type": "co2", "value": 325},
+                {"type": "accelerometer", "value": {"x": 1, "y": 2, "z": 3}},
+            ],
+        }
+
+        # Without writers every message opens and closes the temp file
+        DataToTempCSV(self.message(1, "data", data), start_time, "M1", 1, TEST_FOLDER)
+        with TempCSVWriters(TEST_FOLDER) as writers:
+            for _ in range(3):
+                DataToTempCSV(
+                    self.message(1, "data", data),
+                    start_time,
+                    "M1",
+                    1,
+                    TEST_FOLDER,
+                    writers,
+                )
+            DataToTempCSV(
+                self.message(1, "battery", {"module-id": 1, "percentage": 80}),
+                start_time,
+                "M1",
+                1,
+                TEST_FOLDER,
+                writers,
+            )
+
+        temp_df = read_temp("M1", "DATA")
+        assert temp_df.columns.tolist() == [
+            "M1_co2",
+            "M1_accelerometer_x",
+            "M1_accelerometer_y",
+            "M1_accelerometer_z",
+            "M1_DATA_TIME",
+        ]
+        assert len(temp_df) == 4
+        assert read_temp("M1", "BATTERY")["M1_percentage"].tolist() == [80]
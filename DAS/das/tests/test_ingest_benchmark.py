@@ -0,0 +1,86 @@
+from das.utils.ingest_benchmark import (
+    compare_results,
+    run_benchmark,
+    run_dispatch_benchmark,
+    synthetic_messages,
+)
+import json
+import unittest
+
+
+class TestSyntheticMessages(unittest.TestCase):
+    def test_fake_module_shape(self):
+        messages = synthetic_messages(10, modules=[1, 3], battery_every=2)
+
+        topics = [message.topic for message in messages]
+        assert topics[:4] == [
+            "/v3/wireless_module/1/data",
+            "/v3/wireless_module/1/battery",
+            "/v3/wireless_module/3/data",
+            "/v3/wireless_module/3/battery",
+        ]
+        data = json.loads(messages[2].payload)
+        assert data["module-id"] == 3
+        assert [sensor["type"] for sensor in data["sensors"]] == [
+            "co2",
+            "reedVelocity",
+            "reedDistance",
+            "gps",
+        ]
+
+    def test_repeatable(self):
+        first = [message.payload for message in synthetic_messages(20, seed=1)]
+        second = [message.payload for message in synthetic_messages(20, seed=1)]
+        assert first == second
+
+    def test_payload_size(self):
+        for message in synthetic_messages(20, modules=[1, 2, 5], payload_size=1024):
+            assert len(message.payload) >= 1024
+            json.loads(message.payload)
+
+
+class TestIngestBenchmark(unittest.TestCase):
+    def test_run(self):
+        result = run_benchmark(messages=500, repeat=2, log_format="binary")
+
+        assert len(result["runs"]) == 2
+        assert result["messages"] == 500
+        assert result["dropped"] == 0
+        assert result["msgs_per_s"] > 0
+        assert 0 < result["p50_us"] <= result["p99_us"] <= result["max_us"]
+        assert result["bytes_written"] > 0
+        assert result["settings"]["recorder_options"] == {"log_format": "binary"}
+
+    def test_run_through_broker(self):
+        result = run_benchmark(messages=200, repeat=1, broker=True, qos=1)
+
+        assert result["dropped"] == 0
+        assert result["msgs_per_s"] > 0
+        assert result["p50_us"] is None
+        assert result["bytes_written"] > 0
+        assert result["settings"]["qos"] == 1
+
+    def test_dispatch(self):
+        result = run_dispatch_benchmark(messages=200, repeat=2)
+
+        assert len(result["runs"]) == 2
+        assert result["settings"]["benchmark"] == "dispatch"
+        assert 0 < result["dispatch_ns"]
+        assert 0 < result["topic_objects_ns"]
+        assert result["speedup"] > 0
+
+    def test_compare(self):
+        settings = {"messages": 10}
+        baseline = {"settings": settings, "msgs_per_s": 1000.0, "p99_us": 10.0}
+        result = {"settings": settings, "msgs_per_s": 950.0, "p99_us": 20.0}
+
+        comparison = {
+            metric["metric"]: metric
+            for metric in compare_results(baseline, result, tolerance=0.1)
+        }
+        assert not comparison["msgs_per_s"]["regression"]
+        assert comparison["p99_us"]["regression"]
+        assert comparison["p99_us"]["change"] == 1.0
+
+        with self.assertRaises(ValueError):
+            compare_results(baseline, {"settings": {"messages": 20}})
@@ -0,0 +1,90 @@
+from das.utils.log_catalog import LogCatalog
+from concurrent.futures import ThreadPoolExecutor
+import os
+import shutil
+import unittest
+
+CURRENT_FILEPATH = os.path.dirname(__file__)
+
+# Used to store the catalog created by the tests
+TEST_FOLDER = os.path.join(CURRENT_FILEPATH, "log_catalog_data")
+
+
+class LogCatalogBaseTest(unittest.TestCase):
+    def setUp(self):
+        os.makedirs(TEST_FOLDER, exist_ok=True)
+
+    def tearDown(self):
+        # Clean up and remove test folder
+        shutil.rmtree(TEST_FOLDER)
+
+
+class TestAllocate(LogCatalogBaseTest):
+    def test_sequential_numbers(self):
+        catalog = LogCatalog(TEST_FOLDER)
+
+        assert [catalog.allocate() for _ in range(3)] == [1, 2, 3]
+
+        # Sequences are numbered independently
+        assert catalog.allocate("wireless") == 1
+
+    def test_continues_from_existing_logs(self):
+        for filename in ["3_log.csv", "7_log.bin.gz", "12_M1.csv", "notes.txt"]:
+            open(os.path.join(TEST_FOLDER, filename), "w").close()
+
+        catalog = LogCatalog(TEST_FOLDER)
+        assert catalog.allocate() == 8
+        assert catalog.allocate("wireless", seed_pattern=r"(\d+)_M\d+\.csv") == 13
+
+    def test_concurrent_allocations_are_unique(self):
+        # Each worker opens its own catalog like separate recorders would
+        def allocate(_):
+            return LogCatalog(TEST_FOLDER).allocate()
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            log_nums = list(executor.map(allocate, range(40)))
+
+        assert sorted(log_nums) == list(range(1, 41))
+
+
+class TestMetadata(LogCatalogBaseTest):
+    def test_update_and_find(self):
+        catalog = LogCatalog(TEST_FOLDER)
+        first = catalog.allocate(subscriptions=["/v3/#"])
+        second = catalog.allocate(subscriptions=["boost/#"])
+
+        catalog.update(
+            first,
+            status="complete",
+            duration=12.5,
+            messages=100,
+            bytes=2048,
+            topics={"/v3/wireless_module/1/data", "/v3/das/start"},
+        )
+        catalog.update(second, topics=["boost/power"])
+
+        log = catalog.find(log_num=first)[0]
+        assert log["status"] == "complete"
+        assert log["duration"] == 12.5
+        assert log["messages"] == 100
+        assert log["bytes"] == 2048
+        assert log["topics"] == ["/v3/das/start", "/v3/wireless_module/1/data"]
+        assert log["subscriptions"] == ["/v3/#"]
+
+        assert [log["log_num"] for log in catalog.find(topic="wireless_module")] == [
+            first
+        ]
+        assert [
+            log["log_num"] for log in catalog.find(topic="/v3/wireless_module/+/data")
+        ] == [first]
+        assert catalog.find(topic="/v3/wireless_module/+/battery") == []
+        assert catalog.find(log_num=second)[0]["status"] == "recording"
+        assert len(catalog.find(sequence="log")) == 2
+        assert catalog.find(sequence="wireless") == []
+
+    def test_unknown_metadata_raises(self):
+        catalog = LogCatalog(TEST_FOLDER)
+        log_num = catalog.allocate()
+
+        with self.assertRaises(ValueError):
+            catalog.update(log_num, colour="blue")
@@ -0,0 +1,93 @@
+from das.utils import log_codecs, log_format
+import gzip
+import os
+import shutil
+import unittest
+
+CURRENT_FILEPATH = os.path.dirname(__file__)
+
+# Used to store the logs created by the tests
+TEST_FOLDER = os.path.join(CURRENT_FILEPATH, "log_codecs_data")
+
+RECORDS = [
+    (i * 0.1, f"/v3/wireless_module/{i % 4}/data", f'{{"value": {i}}}')
+    for i in range(1000)
+]
+
+
+class LogCodecsBaseTest(unittest.TestCase):
+    def setUp(self):
+        os.makedirs(TEST_FOLDER, exist_ok=True)
+
+    def tearDown(self):
+        # Clean up and remove test folder
+        shutil.rmtree(TEST_FOLDER)
+
+    def write_compressed_log(self, filepath, fmt, codec, block_size=1024):
+        with log_codecs.CompressedFile(filepath, codec, block_size) as log_file:
+            writer = log_format.create_log_writer(log_file, fmt)
+            writer.write_header()
+
+            # Write in batches with a flush after each one like the Recorder does
+            for i in range(0, len(RECORDS), 50):
+                writer.write_records(RECORDS[i : i + 50])
+                log_file.flush()
+
+
+class TestCompressedLogs(LogCodecsBaseTest):
+    def test_round_trip_every_codec(self):
+        for codec in log_codecs.CODECS.values():
+            for fmt, extension in log_format.LOG_FORMATS.items():
+                filepath = os.path.join(
+                    TEST_FOLDER, f"1_log.{extension}{codec.EXTENSION}"
+                )
+                self.write_compressed_log(filepath, fmt, codec)
+
+                assert log_format.detect_log_format(filepath) == fmt
+                records = list(log_format.read_log(filepath))
+                assert [row[1] for row in records] == [row[1] for row in RECORDS]
+
+                os.remove(filepath)
+
+    def test_gzip_log_is_a_valid_gzip_file(self):
+        filepath = os.path.join(TEST_FOLDER, "1_log.csv.gz")
+        self.write_compressed_log(filepath, "csv", log_codecs.get_codec("gzip"))
+
+        with gzip.open(filepath, "rt") as log_file:
+            # Header plus one line per record
+            assert len(log_file.read().splitlines()) == len(RECORDS) + 1
+
+    def test_crash_loses_at_most_one_block(self):
+        filepath = os.path.join(TEST_FOLDER, "1_log.bin.gz")
+        self.write_compressed_log(filepath, "binary", log_codecs.get_codec("gzip"))
+
+        # Cut the last block short as a power loss would
+        with open(filepath, "r+b") as log_file:
+            log_file.truncate(os.path.getsize(filepath) - 10)
+
+        records = list(log_format.read_log(filepath))
+        assert 0 < len(records) < len(RECORDS)
+        assert [row[1] for row in records] == [
+            row[1] for row in RECORDS[: len(records)]
+        ]
+
+        # With a 1024 byte block size the lost block is at most a few dozen records
+        assert len(RECORDS) - len(records) <= 50
+
+
+class TestCustomCodec(LogCodecsBaseTest):
+    def tearDown(self):
+        log_codecs.CODECS.pop("gzip-fast", None)
+        super().tearDown()
+
+    def test_register_codec(self):
+        class FastGzipCodec(log_codecs.GzipCodec):
+            NAME = "gzip-fast"
+            EXTENSION = ".fgz"
+
+        log_codecs.register_codec(FastGzipCodec(level=1))
+        filepath = os.path.join(TEST_FOLDER, "1_log.csv.fgz")
+        self.write_compressed_log(filepath, "csv", log_codecs.get_codec("gzip-fast"))
+
+        assert log_codecs.detect_codec(filepath).NAME == "gzip-fast"
+        assert len(list(log_format.read_log(filepath))) == len(RECORDS)
@@ -0,0 +1,121 @@
+from das.utils import log_format
+from das.utils.topic_filter import TopicFilter
+import os
+import shutil
+import unittest
+
+CURRENT_FILEPATH = os.path.dirname(__file__)
+
+# Used to store the logs created by the tests
+TEST_FOLDER = os.path.join(CURRENT_FILEPATH, "log_format_data")
+
+RECORDS = [
+    (0.5, "/v3/wireless_module/1/data", '{"sensors": [{"type": "co2", "value": 325}]}'),
+    (0.75, "/v3/wireless_module/2/data", '{"sensors": []}'),
+    (
+        1.25,
+        "/v3/wireless_module/1/data",
+        "message with `backticks`, commas\nand newlines",
+    ),
+    (2.0, "/v3/das/start", ""),
+]
+
+
+def write_log(filepath, fmt, records=RECORDS):
+    with open(filepath, log_format.log_file_mode(fmt)) as log_file:
+        writer = log_format.create_log_writer(log_file, fmt)
+        writer.write_header()
+        writer.write_records(records)
+
+
+class LogFormatBaseTest(unittest.TestCase):
+    def setUp(self):
+        os.makedirs(TEST_FOLDER, exist_ok=True)
+        self.csv_log = os.path.join(TEST_FOLDER, "1_log.csv")
+        self.binary_log = os.path.join(TEST_FOLDER, "1_log.bin")
+
+    def tearDown(self):
+        # Clean up and remove test folder
+        shutil.rmtree(TEST_FOLDER)
+
+
+class TestBinaryLog(LogFormatBaseTest):
+    def test_round_trip(self):
+        write_log(self.binary_log, "binary")
+
+        assert log_format.detect_log_format(self.binary_log) == "binary"
+        records = list(log_format.read_log(self.binary_log))
+
+        assert len(records) == len(RECORDS)
+        for (time_delta, topic, message), expected in zip(records, RECORDS):
+            assert abs(time_delta - expected[0]) < 1e-9
+            assert topic == expected[1]
+            assert message == expected[2].encode("utf-8")
+
+    def test_smaller_than_csv(self):
+        records = RECORDS * 100
+        write_log(self.binary_log, "binary", records)
+        write_log(self.csv_log, "csv", records)
+
+        assert os.path.getsize(self.binary_log) < os.path.getsize(self.csv_log)
+
+    def test_corrupt_record_raises(self):
+        write_log(self.binary_log, "binary")
+
+        # Flip a byte in the payload of the last record (just before its crc)
+        with open(self.binary_log, "r+b") as log_file:
+            log_file.seek(-5, os.SEEK_END)
+            byte = log_file.read(1)
+            log_file.seek(-5, os.SEEK_END)
+            log_file.write(bytes([byte[0] ^ 0xFF]))
+
+        with self.assertRaises(ValueError):
+            list(log_format.read_log(self.binary_log))
+
+    def test_incomplete_record_is_skipped(self):
+        write_log(self.binary_log, "binary")
+
+        # Cut the last record short as a power loss would
+        with open(self.binary_log, "r+b") as log_file:
+            log_file.truncate(os.path.getsize(self.binary_log) - 3)
+
+        records = list(log_format.read_log(self.binary_log))
+        assert len(records) == len(RECORDS) - 1
+
+
+class TestConvertLog(LogFormatBaseTest):
+    def test_csv_to_binary_and_back(self):
+        write_log(self.csv_log, "csv")
+        converted_csv = os.path.join(TEST_FOLDER, "2_log.csv")
+
+        assert log_format.convert_log(self.csv_log, self.binary_log, "binary") == len(
+            RECORDS
+        )
+        assert log_format.convert_log(self.binary_log, converted_csv, "csv") == len(
+            RECORDS
+        )
+
+        assert log_format.detect_log_format(converted_csv) == "csv"
+        original = list(log_format.read_log(self.csv_log))
+        converted = list(log_format.read_log(converted_csv))
+
+        assert [row[1:] for row in original] == [row[1:] for row in converted]
+        for original_row, converted_row in zip(original, converted):
+            assert abs(original_row[0] - converted_row[0]) < 1e-9
+
+    def test_convert_with_topic_filter(self):
+        write_log(self.csv_log, "csv")
+
+        topic_filter = TopicFilter(
+            ["/v3/wireless_module/#"], ["/v3/wireless_module/2/#"]
+        )
+        assert (
+            log_format.convert_log(
+                self.csv_log, self.binary_log, "binary", topic_filter=topic_filter
+            )
+            == 2
+        )
+        assert [row[1] for row in log_format.read_log(self.binary_log)] == [
+            "/v3/wireless_module/1/data",
+            "/v3/wireless_module/1/data",
+        ]
@@ -0,0 +1,114 @@
+from das.utils import log_format, log_index, log_session
+import os
+import shutil
+import unittest
+
+CURRENT_FILEPATH = os.path.dirname(__file__)
+
+# Used to store the logs created by the tests
+TEST_FOLDER = os.path.join(CURRENT_FILEPATH, "log_index_data")
+
+# 10 minutes of messages at 20Hz, with 4 messages sharing each timestamp
+RECORDS = [
+    (i // 4 * 0.2, f"/v3/wireless_module/{i % 4}/data", f'{{"value": {i}}}')
+    for i in range(12000)
+]
+
+
+class LogIndexBaseTest(unittest.TestCase):
+    def setUp(self):
+        os.makedirs(TEST_FOLDER, exist_ok=True)
+
+    def tearDown(self):
+        # Clean up and remove test folder
+        shutil.rmtree(TEST_FOLDER)
+
+    def record(self, log_num, log_format="csv", **options):
+        # Write in batches like the Recorder does
+        session = log_session.LogSession(
+            TEST_FOLDER, log_num, log_format=log_format, **options
+        )
+        for i in range(0, len(RECORDS), 500):
+            session.write_records(RECORDS[i : i + 500])
+        session.close()
+        return session
+
+    def expected(self, start, end):
+        return [
+            (round(record[0], 6), record[1])
+            for record in RECORDS
+            if start <= record[0] <= end
+        ]
+
+
+class TestIndex(LogIndexBaseTest):
+    def test_index_written_while_recording(self):
+        for log_num, fmt in enumerate(log_format.LOG_FORMATS, start=1):
+            session = self.record(log_num, fmt)
+
+            indexer = log_index.LogIndexer.load(session.name)
+            assert indexer.size == os.path.getsize(session.name)
+            assert indexer.START_TIME is not None
+            assert len(indexer.entries) > 1
+
+    def test_seek_matches_a_full_read(self):
+        for log_num, fmt in enumerate(log_format.LOG_FORMATS, start=1):
+            session = self.record(log_num, fmt)
+
+            # Start exactly on a timestamp shared by several messages
+            records = list(log_index.read_log_range(session.name, 400.0, 405.0))
+            assert [(round(row[0], 6), row[1]) for row in records] == self.expected(
+                400, 405
+            )
+            assert records[0][2] in ('{"value": 8000}', b'{"value": 8000}')
+
+    def test_index_built_lazily(self):
+        session = self.record(1, "binary")
+        os.remove(log_index.index_path(session.name))
+
+        records = list(log_index.read_log_range(session.name, 100.1, 100.5))
+        assert [(round(row[0], 6), row[1]) for row in records] == self.expected(
+            100.1, 100.5
+        )
+
+        # The index is saved for next time
+        assert os.path.exists(log_index.index_path(session.name))
+
+    def test_stale_index_is_extended(self):
+        session = self.record(1)
+        indexer = log_index.LogIndexer.load(session.name)
+
+        # An index saved part way through recording (e.g. before a crash) only covers the start of the log
+        indexer.entries = [entry for entry in indexer.entries if entry[0] < 60]
+        indexer.size = indexer.entries[-1][1]
+        indexer.save(session.name)
+
+        indexer = log_index.load_index(session.name)
+        assert indexer.size == os.path.getsize(session.name)
+        assert indexer.entries[-1][0] > 500
+
+    def test_compressed_logs_read_from_the_start(self):
+        session = self.record(1, compression="gzip")
+        assert log_index.load_index(session.name) is None
+
+        records = list(log_index.read_log_range(session.name, 50, 51))
+        assert [(round(row[0], 6), row[1]) for row in records] == self.expected(50, 51)
+
+
+class TestSessionRange(LogIndexBaseTest):
+    def test_segments_outside_the_range_are_skipped(self):
+        session = self.record(1, "binary", segment_duration=60)
+        assert len(session.segments) == 10
+
+        records = list(log_session.read_session(session.manifest_path, 119.0, 181.0))
+        assert [(round(row[0], 6), row[1]) for row in records] == self.expected(
+            119, 181
+        )
+
+    def test_start_time(self):
+        unsegmented = self.record(1)
+        segmented = self.record(2, segment_duration=60)
+
+        for session in (unsegmented, segmented):
+            start_time = log_session.session_start_time(session.name)
+            assert abs(start_time - os.path.getmtime(session.name)) < 60
@@ -0,0 +1,140 @@
+from das.utils import log_codecs, log_format, log_recovery, log_session
+import os
+import shutil
+import unittest
+
+CURRENT_FILEPATH = os.path.dirname(__file__)
+
+# Used to store the logs created by the tests
+TEST_FOLDER = os.path.join(CURRENT_FILEPATH, "log_recovery_data")
+
+RECORDS = [
+    (i * 0.1, f"/v3/wireless_module/{i % 4}/data", f'{{"value": {i}}}')
+    for i in range(200)
+]
+
+
+class LogRecoveryBaseTest(unittest.TestCase):
+    def setUp(self):
+        os.makedirs(TEST_FOLDER, exist_ok=True)
+
+    def tearDown(self):
+        # Clean up and remove test folder
+        shutil.rmtree(TEST_FOLDER)
+
+    def write_log(self, filename, fmt="csv", compression=None):
+        filepath = os.path.join(TEST_FOLDER, filename)
+        if compression:
+            log_file = log_codecs.CompressedFile(
+                filepath, log_codecs.get_codec(compression), 1024
+            )
+        else:
+            log_file = open(filepath, log_format.log_file_mode(fmt))
+
+        with log_file:
+            writer = log_format.create_log_writer(log_file, fmt)
+            writer.write_header()
+            for i in range(0, len(RECORDS), 20):
+                writer.write_records(RECORDS[i : i + 20])
+                log_file.flush()
+
+        return filepath
+
+    def crash(self, filepath, cut=0, garbage=b""):
+        # Cut the end of the log and leave some garbage behind as a power loss would
+        with open(filepath, "r+b") as log_file:
+            log_file.truncate(os.path.getsize(filepath) - cut)
+            log_file.seek(0, os.SEEK_END)
+            log_file.write(garbage)
+
+
+class TestRecoverLog(LogRecoveryBaseTest):
+    def test_complete_log_is_untouched(self):
+        for fmt, extension in log_format.LOG_FORMATS.items():
+            filepath = self.write_log(f"1_log.{extension}", fmt)
+            size = os.path.getsize(filepath)
+
+            report = log_recovery.recover_log(filepath)
+            assert report["messages"] == len(RECORDS)
+            assert report["lost_bytes"] == 0
+            assert not report["truncated"]
+            assert os.path.getsize(filepath) == size
+
+    def test_half_written_csv_row(self):
+        filepath = self.write_log("1_log.csv")
+        self.crash(filepath, garbage=b'19.9, "/v3/wireless_module/3/data", `{"val')
+
+        report = log_recovery.recover_log(filepath)
+        assert report["truncated"]
+        assert report["messages"] == len(RECORDS)
+        assert report["lost_bytes"] > 0
+        assert report["last_time_delta"] == RECORDS[-1][0]
+
+        # The repaired log reads back cleanly
+        assert len(list(log_format.read_log(filepath))) == len(RECORDS)
+        assert log_recovery.recover_log(filepath)["lost_bytes"] == 0
+
+    def test_garbage_after_csv_rows(self):
+        filepath = self.write_log("1_log.csv")
+        self.crash(filepath, garbage=b"\x00" * 100 + b"\n")
+
+        report = log_recovery.recover_log(filepath)
+        assert report["messages"] == len(RECORDS)
+        assert report["lost_bytes"] == 101
+
+    def test_truncated_binary_record(self):
+        filepath = self.write_log("1_log.bin", "binary")
+        self.crash(filepath, cut=5)
+
+        report = log_recovery.recover_log(filepath)
+        assert report["truncated"]
+        assert report["messages"] == len(RECORDS) - 1
+        assert [row[1] for row in log_format.read_log(filepath)] == [
+            row[1] for row in RECORDS[:-1]
+        ]
+
+    def test_dry_run_does_not_change_the_log(self):
+        filepath = self.write_log("1_log.bin", "binary")
+        self.crash(filepath, garbage=b"\xff" * 10)
+        size = os.path.getsize(filepath)
+
+        report = log_recovery.recover_log(filepath, dry_run=True)
+        assert report["lost_bytes"] == 10
+        assert not report["truncated"]
+        assert os.path.getsize(filepath) == size
+
+    def test_compressed_log_keeps_complete_blocks(self):
+        filepath = self.write_log("1_log.csv.gz", compression="gzip")
+        self.crash(filepath, cut=10)
+
+        report = log_recovery.recover_log(filepath)
+        assert report["truncated"]
+        assert 0 < report["messages"] < len(RECORDS)
+
+        # Only whole blocks are left so the log can be appended to and read again
+        assert len(list(log_format.read_log(filepath))) == report["messages"]
+
+
+class TestRecoverSession(LogRecoveryBaseTest):
+    def test_manifest_is_rewritten(self):
+        session = log_session.LogSession(
+            TEST_FOLDER, 1, log_format="binary", segment_size=1000
+        )
+        session.write_records(RECORDS)
+        session.checkpoint()
+
+        # Crash without closing the session
+        last_segment = session.segments[-1]
+        self.crash(os.path.join(TEST_FOLDER, last_segment["filename"]), cut=3)
+
+        reports = log_recovery.recover_session(session.manifest_path)
+        assert len(reports) == len(session.segments)
+        assert sum(report["messages"] for report in reports) == len(RECORDS) - 1
+
+        manifest = log_session.read_manifest(session.manifest_path)
+        assert manifest["recovered"]
+        assert not manifest["complete"]
+        assert manifest["segments"][-1]["messages"] == last_segment["messages"] - 1
+        assert len(list(log_session.read_session(session.manifest_path))) == (
+            len(RECORDS) - 1
+        )
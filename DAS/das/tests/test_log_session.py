@@ -0,0 +1,131 @@
+from das.utils import log_session
+import os
+import shutil
+import unittest
+
+CURRENT_FILEPATH = os.path.dirname(__file__)
+
+# Used to store the logs created by the tests
+TEST_FOLDER = os.path.join(CURRENT_FILEPATH, "log_session_data")
+
+START_TOPIC = "/v3/das/start"
+
+
+def make_records(count, start=0.0, step=0.1, topic="/v3/wireless_module/1/data"):
+    return [(start + i * step, topic, f'{{"count": {i}}}') for i in range(count)]
+
+
+class LogSessionBaseTest(unittest.TestCase):
+    def setUp(self):
+        os.makedirs(TEST_FOLDER, exist_ok=True)
+
+    def tearDown(self):
+        # Clean up and remove test folder
+        shutil.rmtree(TEST_FOLDER)
+
+
+class TestUnsegmentedSession(LogSessionBaseTest):
+    def test_single_log_file(self):
+        session = log_session.LogSession(TEST_FOLDER, 1)
+        session.write_records(make_records(10))
+        session.close()
+
+        # Without segment limits the layout is the classic single log file (plus its time index)
+        assert sorted(os.listdir(TEST_FOLDER)) == ["1_log.csv", "1_log.csv.idx"]
+        assert session.name == os.path.join(TEST_FOLDER, "1_log.csv")
+
+
+class TestSegmentedSession(LogSessionBaseTest):
+    def test_roll_on_duration(self):
+        session = log_session.LogSession(TEST_FOLDER, 1, segment_duration=1)
+        for i in range(5):
+            # 0.1s apart so each 1s segment holds 10 records
+            session.write_records(make_records(10, start=i * 1.0))
+        session.close()
+
+        manifest = log_session.read_manifest(session.manifest_path)
+        assert manifest["complete"]
+        assert [segment["messages"] for segment in manifest["segments"]] == [10] * 5
+
+        for segment in manifest["segments"]:
+            assert segment["end_time_delta"] - segment["start_time_delta"] < 1
+            assert segment["bytes"] == os.path.getsize(segment["filepath"])
+
+    def test_roll_on_size(self):
+        session = log_session.LogSession(
+            TEST_FOLDER, 2, log_format="binary", segment_size=500
+        )
+        for i in range(10):
+            session.write_records(make_records(10, start=i * 1.0))
+        session.close()
+
+        segments = log_session.read_manifest(session.manifest_path)["segments"]
+        assert len(segments) > 1
+        assert sum(segment["messages"] for segment in segments) == 100
+
+    def test_roll_on_topic(self):
+        session = log_session.LogSession(TEST_FOLDER, 3, segment_topics=[START_TOPIC])
+        session.write_records(
+            make_records(5)
+            + make_records(1, start=1, topic=START_TOPIC)
+            + make_records(5, start=2)
+        )
+        session.close()
+
+        segments = log_session.read_manifest(session.manifest_path)["segments"]
+        assert [segment["messages"] for segment in segments] == [5, 6]
+
+    def test_read_session_as_one_stream(self):
+        records = make_records(50)
+        session = log_session.LogSession(TEST_FOLDER, 4, segment_duration=1)
+        session.write_records(records)
+        session.close()
+
+        assert len(session.segments) == 5
+        streamed = list(log_session.read_session(session.manifest_path))
+        assert [row[2] for row in streamed] == [row[2] for row in records]
+
+
+class TestMergeSessions(LogSessionBaseTest):
+    def test_merge_is_time_ordered(self):
+        filepaths = []
+        for log_num, step in enumerate([0.1, 0.25, 0.4], start=1):
+            session = log_session.LogSession(TEST_FOLDER, log_num)
+            session.write_records(
+                make_records(
+                    100, step=step, topic=f"/v3/wireless_module/{log_num}/data"
+                )
+            )
+            session.close()
+            filepaths.append(session.name)
+
+        records = list(log_session.merge_sessions(filepaths))
+        assert len(records) == 300
+        assert [row[0] for row in records] == sorted(row[0] for row in records)
+
+        # Equal times keep the order of the logs
+        assert [row[1] for row in records[:3]] == [
+            f"/v3/wireless_module/{log_num}/data" for log_num in (1, 2, 3)
+        ]
+
+    def test_offsets_and_range(self):
+        bike = log_session.LogSession(TEST_FOLDER, 1)
+        bike.write_records(make_records(100, topic="bike"))
+        bike.close()
+
+        # The chase car started recording 5s after the bike
+        car = log_session.LogSession(TEST_FOLDER, 2, log_format="binary")
+        car.write_records(make_records(100, topic="car"))
+        car.close()
+
+        records = list(
+            log_session.merge_sessions(
+                [bike.name, car.name], offsets=[0, 5], start_time_delta=4.5
+            )
+        )
+        assert records[0][0] == 4.5
+        assert [row[1] for row in records].count("car") == 100
+        assert abs(records[-1][0] - 14.9) < 1e-9
+
+        with self.assertRaises(ValueError):
+            log_session.merge_sessions([bike.name, car.name], offsets=[0])
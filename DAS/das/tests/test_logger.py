@@ -1,10 +1,16 @@
-from das.utils import logger
+from das.utils import log_format, logger
+from das.utils.recorder_daemon import RecorderDaemon
+from das.utils.recorder_sinks import LogSink, RingSink
+import paho.mqtt.client as mqtt
 import shutil
 import os
 import time
 import unittest
 import csv
+import json
+import threading
 import pandas as pd
+import pytest
 
 CsvConfig = {
     "delimiter": ",",
@@ -19,11 +25,39 @@ CURRENT_FILEPATH = os.path.dirname(__file__)
 # Used to store the logs created by the tests
 TEST_FOLDER = os.path.join(CURRENT_FILEPATH, "csv_data")
 
-# Sample MQTT broker to run tests on
-MQTT_BROKER = "broker.hivemq.com"
+# Sample topics published while recording, the tests run on a local broker so nothing else arrives
+SAMPLE_TOPICS = ["sensor/speed", "sensor/power", "test/data", "data/module/1"]
 
 
+def list_logs(folder):
+    # The log catalog and the log indexes live next to the logs, so only list the log files
+    return [
+        filename
+        for filename in os.listdir(folder)
+        if "_log." in filename and not filename.endswith(".idx")
+    ]
+
+
+@pytest.mark.usefixtures("mqtt_broker")
 class LoggerBaseTestTearDown(unittest.TestCase):
+    def broker_options(self):
+        # Connection options of the in-process test broker (see conftest.py)
+        return {"broker_address": self.broker.host, "broker_port": self.broker.port}
+
+    def publish_samples(self, count=20, interval=0.05):
+        # Publish a few messages on each sample topic, once the recorders have subscribed
+        client = mqtt.Client()
+        client.connect(self.broker.host, self.broker.port)
+        client.loop_start()
+        time.sleep(0.5)
+        for i in range(count):
+            for topic in SAMPLE_TOPICS:
+                client.publish(topic, json.dumps({"value": i}), qos=1)
+            time.sleep(interval)
+        time.sleep(0.5)
+        client.loop_stop()
+        client.disconnect()
+
     def tearDown(self):
         # Clean up and remove test folder
         shutil.rmtree(TEST_FOLDER)
@@ -36,15 +70,17 @@ class TestSingleRecorder(LoggerBaseTestTearDown):
     def setUp(self):
         # Start and stop logger immediately
         recorder_1 = logger.Recorder(
-            csv_folder_path=TEST_FOLDER, topics=["sensor/#"], broker_address=MQTT_BROKER
+            csv_folder_path=TEST_FOLDER, topics=["sensor/#"], **self.broker_options()
         )
         recorder_1.start()
         recorder_1.stop()
+        self.log_filepath = recorder_1.log_filepath
 
     def test_make_csv_folder(self):
         # Check that a directory called csv_data has been created and 1_log.csv has been created
         assert os.path.exists(TEST_FOLDER)
         assert os.path.exists(os.path.join(TEST_FOLDER, "1_log.csv"))
+        assert self.log_filepath == os.path.join(TEST_FOLDER, "1_log.csv")
 
 
 class TestMultipleRecorders(LoggerBaseTestTearDown):
@@ -60,21 +96,21 @@ class TestMultipleRecorders(LoggerBaseTestTearDown):
         recorder_1 = logger.Recorder(
             csv_folder_path=TEST_FOLDER,
             topics=[f"{self.log_to_topic['1_log.csv']}/#"],
-            broker_address=MQTT_BROKER,
+            **self.broker_options(),
         )
 
         # Start logger 2 for test/#
         recorder_2 = logger.Recorder(
             csv_folder_path=TEST_FOLDER,
             topics=[f"{self.log_to_topic['2_log.csv']}/#"],
-            broker_address=MQTT_BROKER,
+            **self.broker_options(),
         )
 
         # Start logger 3 for data/#
         recorder_3 = logger.Recorder(
             csv_folder_path=TEST_FOLDER,
             topics=[f"{self.log_to_topic['3_log.csv']}/#"],
-            broker_address=MQTT_BROKER,
+            **self.broker_options(),
         )
 
         # Start all recorders
@@ -82,8 +118,8 @@ class TestMultipleRecorders(LoggerBaseTestTearDown):
         recorder_2.start()
         recorder_3.start()
 
-        # Wait for a short amount of time
-        time.sleep(5)
+        # Publish data on the topics of every recorder
+        self.publish_samples()
 
         # Pause the recorders at different times
         recorder_3.stop()
@@ -95,11 +131,11 @@ class TestMultipleRecorders(LoggerBaseTestTearDown):
         assert os.path.exists(TEST_FOLDER)
 
         # Check that there are 3 logs in the test folder
-        assert len(os.listdir(TEST_FOLDER)) == 3
+        assert len(list_logs(TEST_FOLDER)) == 3
 
     def test_correct_output_logs(self):
         # Ensure that each log file is correctly formatted
-        for filepath in os.listdir(TEST_FOLDER):
+        for filepath in list_logs(TEST_FOLDER):
             log_file = open(os.path.join(TEST_FOLDER, filepath), "r")
             csv_reader = csv.DictReader(
                 log_file,
@@ -109,7 +145,10 @@ class TestMultipleRecorders(LoggerBaseTestTearDown):
                 skipinitialspace=CsvConfig["skipinitialspace"],
             )
 
+            rows = 0
             for row in csv_reader:
+                rows += 1
+
                 # Assert that the rows contain data and are not null
                 assert row["time_delta"]
 
@@ -119,26 +158,214 @@ class TestMultipleRecorders(LoggerBaseTestTearDown):
                 # Assert that the message is a string
                 assert isinstance(row["message"], str)
 
+            # Every recorder received the samples on its topics
+            assert rows > 0
             log_file.close()
 
 
+class TestRecorderSinks(LoggerBaseTestTearDown):
+    def test_fan_out(self):
+        ring = RingSink(max_records=1000)
+        main_recorder = logger.Recorder(
+            TEST_FOLDER,
+            topics=["mhp_das_test/sinks/#"],
+            **self.broker_options(),
+            sinks=[LogSink("binary"), ring],
+        )
+        main_recorder.start()
+        for i in range(20):
+            main_recorder.log("mhp_das_test/sinks/data", str(i))
+        assert main_recorder.sync(10)
+        main_recorder.stop()
+
+        binary_log = os.path.join(TEST_FOLDER, "1_log.bin")
+        assert [row[2] for row in log_format.read_log(binary_log)] == [
+            str(i).encode() for i in range(20)
+        ]
+        assert [row[2] for row in ring.records()] == [str(i) for i in range(20)]
+        assert main_recorder.sink_stats[binary_log]["written"] == 20
+        assert main_recorder.sink_stats["ring"]["dropped"] == 0
+
+
+class TestPreTrigger(LoggerBaseTestTearDown):
+    def test_buffered_messages_start_the_log(self):
+        main_recorder = logger.Recorder(
+            TEST_FOLDER,
+            topics=["mhp_das_test/trigger/#"],
+            **self.broker_options(),
+            trigger_topics=["mhp_das_test/trigger/start"],
+            pre_trigger_seconds=60,
+        )
+        main_recorder.start()
+        for i in range(10):
+            main_recorder.log("mhp_das_test/trigger/data", str(i))
+        assert not main_recorder.triggered
+        assert os.path.getsize(os.path.join(TEST_FOLDER, "1_log.csv")) < 100
+
+        main_recorder.log("mhp_das_test/trigger/start", "")
+        main_recorder.log("mhp_das_test/trigger/data", "10")
+        assert main_recorder.triggered
+        main_recorder.stop()
+
+        log_df = pd.read_csv(
+            os.path.join(TEST_FOLDER, "1_log.csv"),
+            quotechar=CsvConfig["quotechar"],
+            quoting=CsvConfig["quoting"],
+            skipinitialspace=CsvConfig["skipinitialspace"],
+        )
+        assert log_df["mqtt_topic"].tolist()[10] == "mhp_das_test/trigger/start"
+        assert log_df["time_delta"].is_monotonic_increasing
+
+
+class TestRecorderMetrics(LoggerBaseTestTearDown):
+    def test_metrics_are_published(self):
+        published = []
+        client = mqtt.Client()
+        client.on_message = lambda client, userdata, msg: published.append(
+            json.loads(msg.payload)
+        )
+        client.connect(self.broker.host, self.broker.port)
+        client.subscribe("mhp_das_test/metrics")
+        client.loop_start()
+
+        main_recorder = logger.Recorder(
+            TEST_FOLDER,
+            topics=["/v3/wireless_module/#"],
+            **self.broker_options(),
+            metrics_topic="mhp_das_test/metrics",
+            metrics_interval=0.2,
+        )
+        main_recorder.start()
+        for i in range(20):
+            main_recorder.log("/v3/wireless_module/1/data", str(i))
+            main_recorder.log("/v3/wireless_module/2/data", "{}")
+        main_recorder.log("/v3/wireless_module/1/battery", "80")
+        assert main_recorder.sync(10)
+        time.sleep(1)
+
+        metrics = main_recorder.metrics()
+        main_recorder.stop()
+        client.loop_stop()
+        client.disconnect()
+
+        assert metrics["messages"] == 41
+        assert metrics["topics"]["/v3/wireless_module/2/data"]["bytes"] == 40
+        assert set(metrics["modules"]) == {"1", "2"}
+        assert metrics["modules"]["1"] < metrics["modules"]["2"]
+        assert metrics["written"] == 41
+        assert metrics["queue_depth"] == 0
+        assert metrics["file_size"] == os.path.getsize(
+            os.path.join(TEST_FOLDER, "1_log.csv")
+        )
+        assert metrics["write_latency_ms"]["p50"] >= 0
+
+        # Published regularly while recording
+        assert len(published) >= 3
+        assert published[-1]["messages"] == 41
+        assert published[-1]["log"] == metrics["log"]
+
+    def test_metrics_are_not_recorded(self):
+        main_recorder = logger.Recorder(
+            TEST_FOLDER,
+            topics=["#"],
+            **self.broker_options(),
+            metrics_topic="mhp_das_test/metrics",
+            metrics_interval=0.2,
+        )
+        main_recorder.start()
+        # Several metrics messages come back on the # subscription
+        time.sleep(1.5)
+        main_recorder.log("/v3/wireless_module/1/data", "1")
+        assert main_recorder.sync(10)
+
+        metrics = main_recorder.metrics()
+        main_recorder.stop()
+
+        assert "mhp_das_test/metrics" not in metrics["topics"]
+        assert metrics["messages"] == 1
+
+        log_df = pd.read_csv(
+            os.path.join(TEST_FOLDER, "1_log.csv"),
+            quotechar=CsvConfig["quotechar"],
+            quoting=CsvConfig["quoting"],
+            skipinitialspace=CsvConfig["skipinitialspace"],
+        )
+        assert log_df["mqtt_topic"].tolist() == ["/v3/wireless_module/1/data"]
+
+
+class TestRecorderDaemon(LoggerBaseTestTearDown):
+    def test_sessions_follow_start_and_stop(self):
+        daemon = RecorderDaemon(
+            TEST_FOLDER,
+            topics=["mhp_das_test/daemon/#"],
+            **self.broker_options(),
+            start_topics=["mhp_das_test/daemon/start"],
+            stop_topics=["mhp_das_test/daemon/stop"],
+            status_topic="mhp_das_test/daemon/status",
+            status_interval=0.5,
+        )
+        daemon_thread = threading.Thread(target=daemon.run)
+        daemon_thread.start()
+
+        client = mqtt.Client()
+        client.connect(self.broker.host, self.broker.port)
+        client.loop_start()
+        time.sleep(2)
+        for session in range(2):
+            client.publish("mhp_das_test/daemon/start", "", qos=1).wait_for_publish()
+            time.sleep(1)
+            for i in range(5):
+                client.publish("mhp_das_test/daemon/data", str(i), qos=1)
+            time.sleep(1)
+            client.publish("mhp_das_test/daemon/stop", "", qos=1).wait_for_publish()
+            time.sleep(1)
+        client.loop_stop()
+
+        status = daemon.status()
+        assert status["state"] == "idle"
+        assert status["rss_bytes"] is None or status["rss_bytes"] > 0
+
+        daemon.shutdown()
+        daemon_thread.join(10)
+        assert not daemon_thread.is_alive()
+        assert daemon.sessions == 2
+
+        for log_name in ("1_log.csv", "2_log.csv"):
+            log_df = pd.read_csv(
+                os.path.join(TEST_FOLDER, log_name),
+                quotechar=CsvConfig["quotechar"],
+                quoting=CsvConfig["quoting"],
+                skipinitialspace=CsvConfig["skipinitialspace"],
+            )
+            assert log_df["mqtt_topic"].tolist()[0] == "mhp_das_test/daemon/start"
+            assert log_df["mqtt_topic"].tolist()[-1] == "mhp_das_test/daemon/stop"
+            # The daemon's status messages are not recorded, even though their topic is subscribed to
+            assert "mhp_das_test/daemon/status" not in log_df["mqtt_topic"].tolist()
+            data = log_df[log_df["mqtt_topic"] == "mhp_das_test/daemon/data"]
+            assert data["message"].astype(int).tolist() == list(range(5))
+            assert len(log_df) == 7
+
+
 class TestPlayback(LoggerBaseTestTearDown):
     def setUp(self):
         main_recorder = logger.Recorder(
-            csv_folder_path=TEST_FOLDER, topics=["sensor/#"], broker_address=MQTT_BROKER
+            csv_folder_path=TEST_FOLDER, topics=["sensor/#"], **self.broker_options()
         )
 
-        # Wait for a short amount of time
+        # Record some sample data
         main_recorder.start()
-        time.sleep(5)
+        self.publish_samples()
         main_recorder.stop()
 
     def test_accurate_playback(self):
-        main_recorder = logger.Recorder(TEST_FOLDER)
-        main_playback = logger.Playback(os.path.join(TEST_FOLDER, "1_log.csv"))
+        main_recorder = logger.Recorder(TEST_FOLDER, **self.broker_options())
+        main_playback = logger.Playback(
+            os.path.join(TEST_FOLDER, "1_log.csv"), **self.broker_options()
+        )
 
         main_recorder.start()
         main_playback.play(speed=10)
+        time.sleep(1)
         main_recorder.stop()
 
         log_file1 = os.path.join(TEST_FOLDER, "1_log.csv")
@@ -158,3 +385,191 @@ class TestPlayback(LoggerBaseTestTearDown):
         )
 
         assert playback_df["message"].equals(original_df["message"])
+
+    def test_equal_timestamps_keep_order(self):
+        # Bursts of rows with the same time_delta are published in log order
+        filepath = os.path.join(TEST_FOLDER, "burst.csv")
+        with open(filepath, "w", newline="") as log_file:
+            csv_writer = csv.DictWriter(
+                log_file,
+                fieldnames=CsvConfig["fieldnames"],
+                delimiter=CsvConfig["delimiter"],
+                quotechar=CsvConfig["quotechar"],
+                quoting=CsvConfig["quoting"],
+            )
+            csv_writer.writeheader()
+            for i in range(300):
+                csv_writer.writerow(
+                    {
+                        "time_delta": 0.5 + i // 100,
+                        "mqtt_topic": "mhp_das_test/playback/order",
+                        "message": str(i),
+                    }
+                )
+
+        main_recorder = logger.Recorder(
+            TEST_FOLDER,
+            topics=["mhp_das_test/playback/order"],
+            **self.broker_options(),
+        )
+        main_playback = logger.Playback(filepath, **self.broker_options(), lookahead=10)
+
+        main_recorder.start()
+        main_playback.play(speed=2)
+        time.sleep(2)
+        main_recorder.stop()
+
+        log_file2 = os.path.join(TEST_FOLDER, "2_log.csv")
+        playback_df = pd.read_csv(
+            log_file2,
+            quotechar=CsvConfig["quotechar"],
+            quoting=CsvConfig["quoting"],
+            skipinitialspace=CsvConfig["skipinitialspace"],
+        )
+
+        assert playback_df["message"].tolist() == list(range(300))
+
+    def test_topic_filters(self):
+        filepath = os.path.join(TEST_FOLDER, "filter.csv")
+        with open(filepath, "w", newline="") as log_file:
+            csv_writer = csv.DictWriter(
+                log_file,
+                fieldnames=CsvConfig["fieldnames"],
+                delimiter=CsvConfig["delimiter"],
+                quotechar=CsvConfig["quotechar"],
+                quoting=CsvConfig["quoting"],
+            )
+            csv_writer.writeheader()
+            for i in range(30):
+                csv_writer.writerow(
+                    {
+                        "time_delta": i * 0.01,
+                        "mqtt_topic": f"mhp_das_test/filter/{i % 3}/data",
+                        "message": str(i),
+                    }
+                )
+
+        # The playback drops module 2 and the recorder drops module 1
+        main_recorder = logger.Recorder(
+            TEST_FOLDER,
+            topics=["mhp_das_test/filter/#"],
+            **self.broker_options(),
+            exclude_topics=["mhp_das_test/filter/1/#"],
+        )
+        main_playback = logger.Playback(
+            filepath,
+            **self.broker_options(),
+            topics=["mhp_das_test/filter/+/data"],
+            exclude_topics=["mhp_das_test/filter/2/data"],
+        )
+
+        main_recorder.start()
+        main_playback.play()
+        time.sleep(2)
+        main_recorder.stop()
+
+        playback_df = pd.read_csv(
+            os.path.join(TEST_FOLDER, "2_log.csv"),
+            quotechar=CsvConfig["quotechar"],
+            quoting=CsvConfig["quoting"],
+            skipinitialspace=CsvConfig["skipinitialspace"],
+        )
+
+        assert playback_df["message"].tolist() == list(range(0, 30, 3))
+
+    def test_playback_control(self):
+        filepath = os.path.join(TEST_FOLDER, "control.csv")
+        with open(filepath, "w", newline="") as log_file:
+            csv_writer = csv.DictWriter(
+                log_file,
+                fieldnames=CsvConfig["fieldnames"],
+                delimiter=CsvConfig["delimiter"],
+                quotechar=CsvConfig["quotechar"],
+                quoting=CsvConfig["quoting"],
+            )
+            csv_writer.writeheader()
+            for i in range(100):
+                csv_writer.writerow(
+                    {
+                        "time_delta": i * 0.1,
+                        "mqtt_topic": "mhp_das_test/playback/control",
+                        "message": str(i),
+                    }
+                )
+
+        main_recorder = logger.Recorder(
+            TEST_FOLDER,
+            topics=["mhp_das_test/playback/#"],
+            **self.broker_options(),
+        )
+        main_playback = logger.Playback(
+            filepath,
+            **self.broker_options(),
+            control_topic="mhp_das_test/playback",
+            status_interval=0.2,
+        )
+
+        def control():
+            # Pause after about 10 rows, then skip to 8s and finish at 4x speed
+            time.sleep(1)
+            main_playback.pause()
+            time.sleep(1)
+            main_playback.seek(8)
+            main_playback.set_speed(4)
+            main_playback.resume()
+
+        main_recorder.start()
+        control_thread = threading.Thread(target=control)
+        control_thread.start()
+        start_time = time.monotonic()
+        main_playback.play()
+        duration = time.monotonic() - start_time
+        control_thread.join()
+        time.sleep(2)
+        main_recorder.stop()
+
+        playback_df = pd.read_csv(
+            os.path.join(TEST_FOLDER, "2_log.csv"),
+            quotechar=CsvConfig["quotechar"],
+            quoting=CsvConfig["quoting"],
+            skipinitialspace=CsvConfig["skipinitialspace"],
+        )
+
+        played = (
+            playback_df[playback_df["mqtt_topic"] == "mhp_das_test/playback/control"][
+                "message"
+            ]
+            .astype(int)
+            .tolist()
+        )
+        assert played[-20:] == list(range(80, 100))
+        assert 30 not in played
+        assert duration < 4
+
+        states = [
+            json.loads(message)["state"]
+            for message in playback_df[
+                playback_df["mqtt_topic"] == "mhp_das_test/playback/status"
+            ]["message"]
+        ]
+        assert "paused" in states
+        assert states[-1] == "finished"
+
+    def test_max_rate_playback(self):
+        main_playback = logger.Playback(
+            os.path.join(TEST_FOLDER, "1_log.csv"), **self.broker_options()
+        )
+
+        report = main_playback.play_max_rate(qos=1, max_inflight=20)
+        assert report["errors"] == 0
+        assert report["messages"] == len(
+            pd.read_csv(
+                os.path.join(TEST_FOLDER, "1_log.csv"),
+                quotechar=CsvConfig["quotechar"],
+                quoting=CsvConfig["quoting"],
+                skipinitialspace=CsvConfig["skipinitialspace"],
+            )
+        )
+        if report["messages"]:
+            assert report["msgs_per_s"] > 0
+            assert report["latency_ms"]["p50"] <= report["latency_ms"]["max"]
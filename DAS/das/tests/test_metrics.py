@@ -0,0 +1,25 @@
+from das.utils.metrics import percentiles, process_usage
+import unittest
+
+
+class TestPercentiles(unittest.TestCase):
+    def test_nearest_rank(self):
+        result = percentiles(reversed(range(1, 101)))
+        assert result == {"p50": 50, "p90": 90, "p99": 99, "max": 100}
+
+    def test_custom_quantiles(self):
+        result = percentiles([3, 1, 2], quantiles=(0, 99.9))
+        assert result == {"p0": 1, "p99.9": 3, "max": 3}
+
+    def test_no_samples(self):
+        assert percentiles([]) == {"p50": None, "p90": None, "p99": None, "max": None}
+
+
+class TestProcessUsage(unittest.TestCase):
+    def test_cpu_time_increases(self):
+        before = process_usage()
+        sum(i * i for i in range(200000))
+        after = process_usage()
+
+        assert after["cpu_time"] > before["cpu_time"]
+        assert after["rss_bytes"] is None or after["rss_bytes"] > 0
@@ -0,0 +1,134 @@
+import paho.mqtt.client as mqtt
+import pytest
+import queue
+import time
+import unittest
+
+
+def connect(broker, client_id="", **will):
+    """Connects a paho client to the broker and collects its messages in a queue."""
+    client = mqtt.Client(client_id)
+    client.messages = queue.Queue()
+    client.on_message = lambda client, userdata, msg: client.messages.put(
+        (msg.topic, msg.payload, msg.qos, msg.retain)
+    )
+    if will:
+        client.will_set(**will)
+    client.connect(broker.host, broker.port)
+    client.loop_start()
+    return client
+
+
+def subscribe(client, topics):
+    """Subscribes and waits for the SUBACK."""
+    subscribed = queue.Queue()
+    client.on_subscribe = lambda client, userdata, mid, granted_qos: subscribed.put(
+        granted_qos
+    )
+    client.subscribe(topics)
+    return subscribed.get(timeout=5)
+
+
+def drain(client, timeout=0.5):
+    """Messages received until none arrive for timeout seconds."""
+    messages = []
+    try:
+        while True:
+            messages.append(client.messages.get(timeout=timeout))
+    except queue.Empty:
+        return messages
+
+
+@pytest.mark.usefixtures("mqtt_broker")
+class TestMqttBroker(unittest.TestCase):
+    def setUp(self):
+        self.clients = []
+
+    def tearDown(self):
+        for client in self.clients:
+            client.loop_stop()
+            client.disconnect()
+
+    def client(self, client_id="", **will):
+        client = connect(self.broker, client_id, **will)
+        self.clients.append(client)
+        return client
+
+    def test_wildcards(self):
+        subscriber = self.client()
+        publisher = self.client()
+        assert subscribe(subscriber, [("broker/+/data", 0), ("broker/3/#", 0)]) == (
+            0,
+            0,
+        )
+
+        for topic in ("broker/1/data", "broker/1/battery", "broker/3", "other/1/data"):
+            publisher.publish(topic, topic).wait_for_publish()
+
+        assert sorted(topic for topic, *_ in drain(subscriber)) == [
+            "broker/1/data",
+            "broker/3",
+        ]
+
+    def test_qos(self):
+        subscriber = self.client()
+        publisher = self.client()
+        # QoS 2 subscriptions are granted QoS 1
+        assert subscribe(subscriber, [("qos/0", 0), ("qos/1", 2)]) == (0, 1)
+
+        publisher.publish("qos/0", "a", qos=1).wait_for_publish()
+        publisher.publish("qos/1", "b", qos=1).wait_for_publish()
+        publisher.publish("qos/1", "c", qos=2).wait_for_publish()
+
+        assert drain(subscriber) == [
+            ("qos/0", b"a", 0, 0),
+            ("qos/1", b"b", 1, 0),
+            ("qos/1", b"c", 1, 0),
+        ]
+
+    def test_retained(self):
+        publisher = self.client()
+        publisher.publish("retained/a", "kept", qos=1, retain=True).wait_for_publish()
+        # An empty retained message clears the retained message (QoS 1 so that they are routed before subscribing)
+        publisher.publish("retained/b", "kept", qos=1, retain=True).wait_for_publish()
+        publisher.publish("retained/b", "", qos=1, retain=True).wait_for_publish()
+
+        subscriber = self.client()
+        subscribe(subscriber, [("retained/#", 1)])
+        publisher.publish("retained/a", "live").wait_for_publish()
+
+        assert drain(subscriber) == [
+            ("retained/a", b"kept", 1, 1),
+            ("retained/a", b"live", 0, 0),
+        ]
+
+    def test_unsubscribe(self):
+        subscriber = self.client()
+        publisher = self.client()
+        subscribe(subscriber, [("unsubscribe/#", 0)])
+        publisher.publish("unsubscribe/a", "1").wait_for_publish()
+        subscriber.unsubscribe("unsubscribe/#")
+        time.sleep(0.2)
+        publisher.publish("unsubscribe/a", "2").wait_for_publish()
+
+        assert drain(subscriber) == [("unsubscribe/a", b"1", 0, 0)]
+
+    def test_will(self):
+        subscriber = self.client()
+        subscribe(subscriber, [("will/#", 0)])
+        # Closing the socket without a DISCONNECT publishes the will
+        dying = connect(self.broker, "dying", topic="will/dying", payload="gone")
+        time.sleep(0.2)
+        assert "dying" in self.broker.clients
+        dying.loop_stop()
+        dying.socket().close()
+
+        assert drain(subscriber) == [("will/dying", b"gone", 0, 0)]
+        assert "dying" not in self.broker.clients
+
+    def test_publish_from_python(self):
+        subscriber = self.client()
+        subscribe(subscriber, [("python/#", 0)])
+        self.broker.publish("python/a", "from the broker")
+
+        assert drain(subscriber) == [("python/a", b"from the broker", 0, 0)]
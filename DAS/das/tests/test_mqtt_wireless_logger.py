@@ -0,0 +1,156 @@
+from das import mqtt_wireless_logger
+from das.utils.column_store import ColumnStoreWriters, read_column_store
+import json
+import os
+import paho.mqtt.client as mqtt
+import pandas as pd
+import shutil
+import unittest
+
+CURRENT_FILEPATH = os.path.dirname(__file__)
+
+# Used to store the temp and csv files created by the tests
+TEST_FOLDER = os.path.join(CURRENT_FILEPATH, ".~wireless_logger")
+
+
+class FakeClient:
+    def __init__(self):
+        self.published = []
+
+    def publish(self, topic, payload):
+        self.published.append((topic, json.loads(payload)))
+
+
+def message(topic, data=None):
+    msg = mqtt.MQTTMessage(topic=topic.encode())
+    msg.payload = json.dumps(data).encode()
+    return msg
+
+
+class TestRouting(unittest.TestCase):
+    def test_module_routes(self):
+        topic_route = mqtt_wireless_logger.route("/v3/wireless_module/7/data")
+        assert topic_route == (mqtt_wireless_logger.handle_data, "M7", "7", "DATA")
+
+        # Every topic of the module was routed on the first sight of the module
+        routes = mqtt_wireless_logger.topic_routes
+        start_route = routes["/v3/wireless_module/7/start"]
+        assert start_route == (mqtt_wireless_logger.handle_start, "M7", "7", None)
+        assert routes["/v3/wireless_module/7/battery"][3] == "BATTERY"
+
+    def test_topic_not_handled(self):
+        assert mqtt_wireless_logger.route("/v3/wireless_module/7/unknown") is None
+        assert mqtt_wireless_logger.route("/v3/other") is None
+        assert "/v3/other" in mqtt_wireless_logger.topic_routes
+
+
+class TestRecording(unittest.TestCase):
+    def setUp(self):
+        self.folders = (mqtt_wireless_logger.TEMP_DIR, mqtt_wireless_logger.CSV_DIR)
+        mqtt_wireless_logger.TEMP_DIR = os.path.join(TEST_FOLDER, ".~temps")
+        mqtt_wireless_logger.CSV_DIR = os.path.join(TEST_FOLDER, "csv_data")
+        mqtt_wireless_logger.temp_writers.TEMP_DIR = mqtt_wireless_logger.TEMP_DIR
+        mqtt_wireless_logger.catalog = None
+
+    def tearDown(self):
+        mqtt_wireless_logger.TEMP_DIR, mqtt_wireless_logger.CSV_DIR = self.folders
+        mqtt_wireless_logger.temp_writers.TEMP_DIR = mqtt_wireless_logger.TEMP_DIR
+        mqtt_wireless_logger.catalog = None
+        shutil.rmtree(TEST_FOLDER)
+
+    def test_start_data_stop(self):
+        data = {"module-id": 5, "sensors": [{"type": "co2", "value": 325}]}
+        battery = {"module-id": 5, "percentage": 80}
+
+        # Data before the start is not recorded
+        mqtt_wireless_logger.on_message(
+            None, None, message("/v3/wireless_module/5/data", data)
+        )
+        mqtt_wireless_logger.on_message(
+            None, None, message("/v3/wireless_module/5/start")
+        )
+        mqtt_wireless_logger.on_message(
+            None, None, message("/v3/wireless_module/5/data", data)
+        )
+        mqtt_wireless_logger.on_message(
+            None, None, message("/v3/wireless_module/5/battery", battery)
+        )
+        mqtt_wireless_logger.on_message(
+            None, None, message("/v3/wireless_module/5/data", data)
+        )
+        mqtt_wireless_logger.on_message(
+            None, None, message("/v3/wireless_module/5/stop")
+        )
+
+        output_df = pd.read_csv(mqtt_wireless_logger.output_filepath["M5"], index_col=0)
+        assert output_df["M5_co2"].tolist() == [325, 325, 325]
+        assert output_df["M5_percentage"].fillna(0).tolist() == [0, 80, 80]
+        assert mqtt_wireless_logger.find_temp_csvs("M5") == []
+
+    def test_columnar_store(self):
+        mqtt_wireless_logger.column_stores = ColumnStoreWriters()
+        try:
+            data = {"module-id": 5, "sensors": [{"type": "co2", "value": 325}]}
+            gps = {"type": "gps", "value": {"satellites": 4, "datetime": "12:00"}}
+            mqtt_wireless_logger.on_message(
+                None, None, message("/v3/wireless_module/5/start")
+            )
+            mqtt_wireless_logger.on_message(
+                None, None, message("/v3/wireless_module/5/data", data)
+            )
+            # A sensor that starts sending later adds columns
+            data["sensors"].append(gps)
+            mqtt_wireless_logger.on_message(
+                None, None, message("/v3/wireless_module/5/data", data)
+            )
+            mqtt_wireless_logger.on_message(
+                None, None, message("/v3/wireless_module/5/stop")
+            )
+        finally:
+            mqtt_wireless_logger.column_stores = None
+
+        output_filepath = mqtt_wireless_logger.output_filepath["M5"]
+        assert output_filepath.endswith(".cols")
+        store_df = read_column_store(output_filepath)
+        assert store_df["M5_co2"].tolist() == [325, 325]
+        assert store_df["M5_gps_satellites"].fillna(0).tolist() == [0, 4]
+        assert store_df["M5_gps_datetime"].fillna("").tolist() == ["", "12:00"]
+
+
+class TestSensorRings(unittest.TestCase):
+    def setUp(self):
+        mqtt_wireless_logger.enable_rings("/v3/wireless-logger/query", capacity=10)
+
+    def tearDown(self):
+        del mqtt_wireless_logger.topic_routes["/v3/wireless-logger/query"]
+        mqtt_wireless_logger.sensor_rings = None
+        mqtt_wireless_logger.query_topic = None
+
+    def test_query_without_recording(self):
+        client = FakeClient()
+        for co2 in [320, 330]:
+            data = {"module-id": 6, "sensors": [{"type": "co2", "value": co2}]}
+            mqtt_wireless_logger.on_message(
+                client, None, message("/v3/wireless_module/6/data", data)
+            )
+
+        mqtt_wireless_logger.on_message(
+            client,
+            None,
+            message("/v3/wireless-logger/query", {"id": 1, "channel": "M6_co2"}),
+        )
+        mqtt_wireless_logger.on_message(
+            client,
+            None,
+            message(
+                "/v3/wireless-logger/query",
+                {"channel": "M6_co2", "seconds": 60, "response_topic": "/dash"},
+            ),
+        )
+
+        (topic, response), (dash_topic, dash_response) = client.published
+        assert topic == "/v3/wireless-logger/query/response"
+        assert response["id"] == 1
+        assert response["latest"][1] == 330
+        assert dash_topic == "/dash"
+        assert dash_response["samples"]["value"] == [320, 330]
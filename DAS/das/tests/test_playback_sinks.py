@@ -0,0 +1,132 @@
+from das.utils import log_session, logger
+from das.utils.playback_sinks import (
+    PlaybackCallbackSink,
+    PlaybackSink,
+    QueueSink,
+    VirtualClock,
+    as_sink,
+)
+import asyncio
+import os
+import shutil
+import time
+import unittest
+
+CURRENT_FILEPATH = os.path.dirname(__file__)
+
+# Used to store the logs created by the tests
+TEST_FOLDER = os.path.join(CURRENT_FILEPATH, "playback_sinks_data")
+
+# 100 seconds of messages from 3 modules at 10Hz
+RECORDS = [
+    (i * 0.1, f"/v3/wireless_module/{i % 3}/data", f'{{"value": {i}}}')
+    for i in range(1000)
+]
+
+
+class PlaybackSinksBaseTest(unittest.TestCase):
+    def setUp(self):
+        os.makedirs(TEST_FOLDER, exist_ok=True)
+        session = log_session.LogSession(TEST_FOLDER, 1)
+        session.write_records(RECORDS)
+        session.close()
+        self.filepath = session.name
+
+    def tearDown(self):
+        # Clean up and remove test folder
+        shutil.rmtree(TEST_FOLDER)
+
+
+class TestSinks(PlaybackSinksBaseTest):
+    def test_callback_under_virtual_clock(self):
+        clock = VirtualClock()
+        received = []
+
+        def callback(time_delta, mqtt_topic, message):
+            received.append((clock.time(), time_delta, mqtt_topic, message))
+
+        # 100 seconds of log at 2x speed is simulated without waiting
+        start_time = time.monotonic()
+        main_playback = logger.Playback(self.filepath, sink=callback)
+        main_playback.play(speed=2, clock=clock)
+        assert time.monotonic() - start_time < 10
+
+        assert [row[2:] for row in received] == [record[1:] for record in RECORDS]
+        for simulated_time, time_delta, _, _ in received:
+            assert abs(simulated_time - time_delta / 2) < 1e-6
+
+    def test_queue_with_backpressure(self):
+        async def consume():
+            queue = asyncio.Queue(maxsize=10)
+            main_playback = logger.Playback(
+                self.filepath,
+                sink=QueueSink(queue, end_marker="end"),
+                topics=["/v3/wireless_module/1/#"],
+            )
+            playback = asyncio.ensure_future(
+                main_playback.play_async(clock=VirtualClock())
+            )
+
+            received = []
+            while True:
+                item = await queue.get()
+                if item == "end":
+                    break
+                received.append(item)
+
+            await playback
+            return received
+
+        received = asyncio.run(consume())
+        assert [row[1:] for row in received] == [
+            record[1:] for record in RECORDS if record[1].endswith("/1/data")
+        ]
+
+    def test_coroutine_callback(self):
+        received = []
+
+        async def callback(time_delta, mqtt_topic, message):
+            await asyncio.sleep(0)
+            received.append(message)
+
+        logger.Playback(self.filepath, sink=callback, end=0.95).play(
+            clock=VirtualClock()
+        )
+        assert received == [record[2] for record in RECORDS[:10]]
+
+    def test_real_time_sink(self):
+        received = []
+        main_playback = logger.Playback(
+            self.filepath, sink=lambda *row: received.append(row), end=1.0
+        )
+
+        start_time = time.monotonic()
+        main_playback.play(speed=2)
+        assert 0.45 < time.monotonic() - start_time < 1.5
+        assert len(received) == 11
+
+    def test_generator(self):
+        main_playback = logger.Playback(self.filepath, sink=print, start=50, end=51)
+
+        assert [row[1:] for row in main_playback.messages()] == [
+            record[1:] for record in RECORDS if 50 <= round(record[0], 6) <= 51
+        ]
+
+    def test_as_sink(self):
+        sink = PlaybackCallbackSink(print)
+        assert as_sink(sink) is sink
+        assert isinstance(as_sink(print), PlaybackCallbackSink)
+        assert isinstance(as_sink(asyncio.Queue()), QueueSink)
+
+        with self.assertRaises(TypeError):
+            as_sink("not a sink")
+
+        # A sink has to implement publish
+        with self.assertRaises(TypeError):
+            PlaybackSink()
+
+    def test_max_rate_needs_a_broker(self):
+        main_playback = logger.Playback(self.filepath, sink=print)
+
+        with self.assertRaises(ValueError):
+            main_playback.play_max_rate()
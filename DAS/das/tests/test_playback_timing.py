@@ -0,0 +1,59 @@
+from das.utils.playback_timing import PlaybackTiming, format_timing_summary
+import csv
+import os
+import shutil
+import unittest
+
+CURRENT_FILEPATH = os.path.dirname(__file__)
+
+# Used to store the timing csv created by the tests
+TEST_FOLDER = os.path.join(CURRENT_FILEPATH, "playback_timing_data")
+
+
+class TestPlaybackTiming(unittest.TestCase):
+    def setUp(self):
+        os.makedirs(TEST_FOLDER, exist_ok=True)
+
+    def tearDown(self):
+        # Clean up and remove test folder
+        shutil.rmtree(TEST_FOLDER)
+
+    def test_drift(self):
+        timing = PlaybackTiming()
+
+        # Lag grows by 1ms every second (60ms per minute) on top of a constant 2ms
+        for i in range(600):
+            intended = i * 0.1
+            timing.record(intended, "topic", intended, intended + 0.002 + i * 0.0001)
+
+        summary = timing.summary()
+        assert summary["messages"] == 600
+        assert abs(summary["drift_ms_per_min"] - 60) < 1e-6
+        assert abs(summary["min_lag_ms"] - 2) < 1e-6
+        assert abs(summary["last_lag_ms"] - 61.9) < 1e-6
+        assert sum(summary["histogram"].values()) == 600
+
+    def test_histogram(self):
+        timing = PlaybackTiming()
+        for lag in (0.00005, 0.0008, 0.0008, 0.003, 2.0):
+            timing.record(0, "topic", 1.0, 1.0 + lag)
+
+        histogram = timing.summary()["histogram"]
+        assert histogram["<=0.1ms"] == 1
+        assert histogram["<=1ms"] == 2
+        assert histogram["<=5ms"] == 1
+        assert histogram[">1000ms"] == 1
+        assert "messages" in format_timing_summary(timing.summary())
+
+    def test_csv(self):
+        csv_path = os.path.join(TEST_FOLDER, "timing.csv")
+        timing = PlaybackTiming(csv_path)
+        timing.record(1.5, "/v3/das/data", 0.5, 0.501)
+        timing.close()
+
+        with open(csv_path, newline="") as csv_file:
+            rows = list(csv.DictReader(csv_file))
+
+        assert len(rows) == 1
+        assert rows[0]["mqtt_topic"] == "/v3/das/data"
+        assert float(rows[0]["lag_ms"]) == 1.0
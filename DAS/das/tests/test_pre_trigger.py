@@ -0,0 +1,66 @@
+from das.utils.pre_trigger import PreTriggerBuffer
+import unittest
+
+
+class TestPreTriggerBuffer(unittest.TestCase):
+    def test_keeps_messages_in_order(self):
+        buffer = PreTriggerBuffer(max_seconds=None, max_bytes=1024, max_records=10)
+        buffer.append(0.1, "/v3/das/data", "a")
+        buffer.append(0.2, "/v3/wireless_module/1/data", b"bc")
+
+        assert len(buffer) == 2
+        assert buffer.bytes == 3
+        assert buffer.drain() == [
+            (0.1, "/v3/das/data", b"a"),
+            (0.2, "/v3/wireless_module/1/data", b"bc"),
+        ]
+        assert len(buffer) == 0
+        assert buffer.drain() == []
+
+    def test_time_window(self):
+        buffer = PreTriggerBuffer(max_seconds=1.0)
+        for i in range(100):
+            buffer.append(i * 0.1, "/v3/das/data", str(i))
+
+        records = buffer.drain()
+        assert [record[2] for record in records] == [
+            str(i).encode() for i in range(89, 100)
+        ]
+        assert buffer.dropped == 89
+
+    def test_record_limit(self):
+        buffer = PreTriggerBuffer(max_seconds=None, max_bytes=1024, max_records=5)
+        for i in range(12):
+            buffer.append(i, "/v3/das/data", str(i))
+
+        assert [record[0] for record in buffer.drain()] == [7, 8, 9, 10, 11]
+
+    def test_byte_limit_wraps_around(self):
+        buffer = PreTriggerBuffer(max_seconds=None, max_bytes=100, max_records=1000)
+        messages = [bytes([i]) * (7 + i % 5) for i in range(200)]
+        for i, message in enumerate(messages):
+            buffer.append(i, "/v3/das/data", message)
+            assert buffer.bytes <= 100
+
+        records = buffer.drain()
+        assert [record[2] for record in records] == messages[-len(records) :]
+        assert sum(len(message) for message in messages[-len(records) - 1 :]) > 100
+
+    def test_memory_is_allocated_up_front(self):
+        buffer = PreTriggerBuffer(max_seconds=None, max_bytes=64, max_records=4)
+        payloads = buffer._PAYLOADS
+        for i in range(1000):
+            buffer.append(i, f"/v3/wireless_module/{i % 3}/data", "x" * 10)
+
+        assert buffer._PAYLOADS is payloads
+        assert len(payloads) == 64
+        assert len(buffer._TIMES) == 4
+        assert len(buffer) == 4
+
+    def test_oversized_message_is_dropped(self):
+        buffer = PreTriggerBuffer(max_bytes=8)
+        buffer.append(0, "/v3/das/data", "small")
+        buffer.append(1, "/v3/das/data", "much too large")
+
+        assert buffer.drain() == [(0, "/v3/das/data", b"small")]
+        assert buffer.dropped == 1
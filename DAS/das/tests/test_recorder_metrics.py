@@ -0,0 +1,46 @@
+from das.utils.recorder_metrics import RecorderMetrics
+import unittest
+
+
+class TestRecorderMetrics(unittest.TestCase):
+    def setUp(self):
+        self.metrics = RecorderMetrics(interval=1.0)
+
+    def test_counts(self):
+        self.metrics.record(0.1, "/v3/wireless_module/1/data", b"1234")
+        self.metrics.record(0.2, "/v3/wireless_module/1/data", "12")
+        self.metrics.record(0.3, "/v3/das/start", b"")
+
+        snapshot = self.metrics.snapshot(0.5)
+        assert snapshot["messages"] == 3
+        assert snapshot["bytes"] == 6
+        assert snapshot["topics"]["/v3/wireless_module/1/data"]["messages"] == 2
+        assert snapshot["topics"]["/v3/wireless_module/1/data"]["bytes"] == 6
+
+    def test_rates_over_the_last_interval(self):
+        # Nothing is averaged until the first interval is over
+        self.metrics.record(0.5, "a", b"xx")
+        assert self.metrics.snapshot(0.5)["msgs_per_s"] == 0
+
+        for i in range(10):
+            self.metrics.record(1 + i * 0.1, "a", b"xx")
+        snapshot = self.metrics.snapshot(2.0)
+        assert snapshot["topics"]["a"]["msgs_per_s"] == 11 / 2
+        assert snapshot["topics"]["a"]["bytes_per_s"] == 22 / 2
+
+        # Reading again within the interval gives the same rates
+        self.metrics.record(2.1, "a", b"xx")
+        assert self.metrics.snapshot(2.5)["msgs_per_s"] == 11 / 2
+
+        # Topics that went quiet drop to 0
+        snapshot = self.metrics.snapshot(4.0)
+        assert snapshot["msgs_per_s"] == 1 / 2
+        assert self.metrics.snapshot(6.0)["msgs_per_s"] == 0
+
+    def test_time_since_last_module_message(self):
+        self.metrics.record(1.0, "/v3/wireless_module/1/data", b"")
+        self.metrics.record(3.0, "/v3/wireless_module/1/battery", b"")
+        self.metrics.record(2.0, "/v3/wireless_module/2/data", b"")
+        self.metrics.record(4.0, "/v3/camera/status", b"")
+
+        assert self.metrics.snapshot(5.0)["modules"] == {"1": 2.0, "2": 3.0}
@@ -0,0 +1,119 @@
+from das.utils import log_format
+from das.utils.batch_writer import BatchWriter
+from das.utils.recorder_sinks import CallbackSink, LogSink, RecorderSink, RingSink
+import os
+import shutil
+import threading
+import unittest
+
+CURRENT_FILEPATH = os.path.dirname(__file__)
+
+# Used to store the logs created by the tests
+TEST_FOLDER = os.path.join(CURRENT_FILEPATH, "recorder_sinks_data")
+
+RECORDS = [
+    (i * 0.1, f"/v3/wireless_module/{i % 3}/data", f'{{"value": {i}}}')
+    for i in range(100)
+]
+
+
+class RecorderSinksBaseTest(unittest.TestCase):
+    def setUp(self):
+        os.makedirs(TEST_FOLDER, exist_ok=True)
+
+    def tearDown(self):
+        # Clean up and remove test folder
+        shutil.rmtree(TEST_FOLDER)
+
+
+class TestSinks(RecorderSinksBaseTest):
+    def test_log_sink(self):
+        sink = LogSink("binary")
+        sink.open(TEST_FOLDER, 3)
+        sink.write(RECORDS[:50])
+        sink.sync()
+        sink.write(RECORDS[50:])
+        sink.close()
+
+        assert sink.name == os.path.join(TEST_FOLDER, "3_log.bin")
+        assert [row[1:] for row in log_format.read_log(sink.name)] == [
+            (topic, message.encode()) for _, topic, message in RECORDS
+        ]
+
+    def test_log_sink_never_shares_a_file(self):
+        open(os.path.join(TEST_FOLDER, "3_log.csv"), "w").close()
+
+        with self.assertRaises(FileExistsError):
+            LogSink("csv").open(TEST_FOLDER, 3)
+
+        # A compressed copy has a different name
+        sink = LogSink("csv", compression="gzip")
+        sink.open(TEST_FOLDER, 3)
+        sink.close()
+
+    def test_log_sink_never_replaces_a_manifest(self):
+        # A segmented recorder writes its manifest whatever its format
+        manifest_path = os.path.join(TEST_FOLDER, "4_log.json")
+        with open(manifest_path, "w") as manifest_file:
+            manifest_file.write("{}")
+
+        with self.assertRaises(FileExistsError):
+            LogSink("binary", segment_size=1000).open(TEST_FOLDER, 4)
+        with open(manifest_path) as manifest_file:
+            assert manifest_file.read() == "{}"
+
+        # A copy that is not segmented has no manifest
+        sink = LogSink("binary")
+        sink.open(TEST_FOLDER, 4)
+        sink.close()
+
+    def test_ring_sink(self):
+        sink = RingSink(max_records=10)
+        sink.write(RECORDS[:4])
+        assert sink.records() == RECORDS[:4]
+
+        sink.write(RECORDS[4:])
+        assert sink.records() == RECORDS[-10:]
+        assert sink.records(3) == RECORDS[-3:]
+
+    def test_callback_sink(self):
+        received = []
+
+        def on_record(time_delta, mqtt_topic, message):
+            received.append((time_delta, mqtt_topic, message))
+
+        sink = CallbackSink(on_record)
+        sink.write(RECORDS)
+
+        assert sink.name == "on_record"
+        assert received == RECORDS
+
+        # A sink has to implement write
+        with self.assertRaises(TypeError):
+            RecorderSink()
+
+    def test_slow_sink_does_not_block_others(self):
+        # Sinks are fed through their own writers like the Recorder does
+        release = threading.Event()
+        ring = RingSink(max_records=1000)
+        slow = CallbackSink(lambda *record: release.wait())
+
+        writers = [
+            BatchWriter(ring.write, None, flush_interval=0.01),
+            BatchWriter(slow.write, None, max_queue_size=10, flush_interval=0.01),
+        ]
+        for writer in writers:
+            writer.start()
+
+        for record in RECORDS:
+            for writer in writers:
+                writer.put(record)
+
+        assert writers[0].sync(5)
+        assert ring.records() == RECORDS
+        assert writers[1].stats["dropped"] > 0
+
+        release.set()
+        for writer in writers:
+            writer.stop()
+        assert writers[0].stats["dropped"] == 0
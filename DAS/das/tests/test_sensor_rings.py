@@ -0,0 +1,84 @@
+from das.utils.sensor_rings import SensorRing, SensorRings
+import unittest
+
+
+class TestSensorRing(unittest.TestCase):
+    def setUp(self):
+        self.ring = SensorRing(capacity=5)
+
+    def test_latest(self):
+        assert self.ring.latest() is None
+        self.ring.append(1.0, 10)
+        assert self.ring.latest() == (1.0, 10.0)
+
+    def test_window_after_wrapping(self):
+        for i in range(8):
+            self.ring.append(i, i * 10)
+
+        times, values = self.ring.window()
+        assert times.tolist() == [3, 4, 5, 6, 7]
+        assert values.tolist() == [30, 40, 50, 60, 70]
+        assert self.ring.window(4, 6)[1].tolist() == [40, 50, 60]
+        assert self.ring.window(10, 20)[0].tolist() == []
+        assert self.ring.latest() == (7.0, 70.0)
+
+    def test_downsample(self):
+        for i, value in enumerate([1, 5, 3, 8, 2]):
+            self.ring.append(i, value)
+
+        buckets = self.ring.downsample(0, 4, 2)
+        assert buckets["time"].tolist() == [0, 2]
+        assert buckets["min"].tolist() == [1, 2]
+        assert buckets["max"].tolist() == [5, 8]
+        assert buckets["mean"].tolist() == [3, 13 / 3]
+        assert buckets["count"].tolist() == [2, 3]
+
+        # Buckets without samples are left out
+        buckets = self.ring.downsample(-4, 0, 4)
+        assert buckets["time"].tolist() == [-1]
+        assert buckets["count"].tolist() == [1]
+
+
+class TestSensorRings(unittest.TestCase):
+    def setUp(self):
+        self.rings = SensorRings(capacity=100)
+        for i in range(50):
+            self.rings.record(
+                1000 + i,
+                {
+                    "M2_co2": 300 + i,
+                    "M2_gps_datetime": "2017-11-28 23:55:59",
+                    "M2_DATA_TIME": i,
+                },
+            )
+
+    def test_channels(self):
+        assert self.rings.channels() == ["M2_co2"]
+        assert self.rings.query({"id": 7}) == {"id": 7, "channels": ["M2_co2"]}
+
+    def test_latest(self):
+        assert self.rings.latest("M2_co2") == (1049, 349)
+        response = self.rings.query({"channel": "M2_co2"})
+        assert response["latest"] == [1049, 349]
+
+    def test_window(self):
+        times, values = self.rings.window("M2_co2", seconds=2, now=1049.5)
+        assert times.tolist() == [1048, 1049]
+        assert values.tolist() == [348, 349]
+
+        response = self.rings.query(
+            {"channel": "M2_co2", "start": 1010, "end": 1011}, now=1049.5
+        )
+        assert response["samples"] == {"time": [1010, 1011], "value": [310, 311]}
+
+    def test_downsample(self):
+        response = self.rings.query({"channel": "M2_co2", "buckets": 5})
+        assert response["buckets"]["min"] == [300, 310, 320, 330, 340]
+        assert response["buckets"]["max"] == [309, 319, 329, 339, 349]
+
+    def test_errors(self):
+        with self.assertRaises(KeyError):
+            self.rings.latest("M9_co2")
+
+        assert "error" in self.rings.query({"channel": "M9_co2"})
+        assert "error" in self.rings.query({"channel": "M2_co2", "buckets": "x"})
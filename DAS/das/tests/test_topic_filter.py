@@ -0,0 +1,83 @@
+from das.utils.topic_filter import TopicFilter
+import unittest
+
+
+class TestTopicFilter(unittest.TestCase):
+    def test_exact_topics(self):
+        topic_filter = TopicFilter(["/v3/das/start", "/v3/das/stop"])
+
+        assert topic_filter.matches("/v3/das/start")
+        assert topic_filter.matches("/v3/das/stop")
+        assert not topic_filter.matches("/v3/das/start/extra")
+        assert not topic_filter.matches("/v3/das")
+
+    def test_single_level_wildcard(self):
+        topic_filter = TopicFilter(["/v3/wireless_module/+/data"])
+
+        assert topic_filter.matches("/v3/wireless_module/1/data")
+        assert topic_filter.matches("/v3/wireless_module//data")
+        assert not topic_filter.matches("/v3/wireless_module/1/battery")
+        assert not topic_filter.matches("/v3/wireless_module/1/2/data")
+
+    def test_multi_level_wildcard(self):
+        topic_filter = TopicFilter(["/v3/wireless_module/3/#"])
+
+        assert topic_filter.matches("/v3/wireless_module/3/data")
+        assert topic_filter.matches("/v3/wireless_module/3/a/b/c")
+        # The parent level is matched too
+        assert topic_filter.matches("/v3/wireless_module/3")
+        assert not topic_filter.matches("/v3/wireless_module/30/data")
+
+        assert TopicFilter(["#"]).matches("boost/power")
+
+    def test_overlapping_patterns(self):
+        topic_filter = TopicFilter(["/v3/+/1/data", "/v3/wireless_module/+/battery"])
+
+        assert topic_filter.matches("/v3/wireless_module/1/data")
+        assert topic_filter.matches("/v3/wireless_module/2/battery")
+        assert not topic_filter.matches("/v3/wireless_module/2/data")
+
+    def test_system_topics(self):
+        # Wildcards at the first level do not match $ topics
+        assert not TopicFilter(["#"]).matches("$SYS/broker/uptime")
+        assert not TopicFilter(["+/broker/uptime"]).matches("$SYS/broker/uptime")
+        assert TopicFilter(["$SYS/#"]).matches("$SYS/broker/uptime")
+
+    def test_include_and_exclude(self):
+        topic_filter = TopicFilter(
+            ["/v3/wireless_module/#"], ["/v3/wireless_module/+/battery"]
+        )
+
+        assert topic_filter.matches("/v3/wireless_module/1/data")
+        assert not topic_filter.matches("/v3/wireless_module/1/battery")
+        assert not topic_filter.matches("/v3/das/start")
+
+        # Without includes every topic that is not excluded passes
+        topic_filter = TopicFilter(exclude=["boost/#"])
+        assert topic_filter.matches("/v3/das/start")
+        assert not topic_filter.matches("boost/power")
+
+        assert not TopicFilter()
+        assert TopicFilter(exclude=["boost/#"])
+
+    def test_invalid_patterns(self):
+        for pattern in ["/v3/#/data", "/v3/module+/data", "/v3/da#"]:
+            with self.assertRaises(ValueError):
+                TopicFilter([pattern])
+
+    def test_filter_records(self):
+        records = [
+            (0.0, "/v3/wireless_module/1/data", "a"),
+            (0.1, "/v3/wireless_module/3/data", "b"),
+            (0.2, "/v3/wireless_module/3/battery", "c"),
+        ]
+        topic_filter = TopicFilter(["/v3/wireless_module/3/#"])
+
+        assert list(topic_filter.filter_records(records)) == records[1:]
+
+    def test_cache_is_bounded(self):
+        topic_filter = TopicFilter(["/v3/wireless_module/+/data"])
+        for i in range(topic_filter.CACHE_SIZE * 2):
+            assert topic_filter.matches(f"/v3/wireless_module/{i}/data")
+
+        assert len(topic_filter._cache) <= topic_filter.CACHE_SIZE
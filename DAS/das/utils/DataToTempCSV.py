@@ -1,8 +1,12 @@
+from collections import OrderedDict
 import csv
 from datetime import datetime
 from enum import Enum, unique
+import heapq
 import json
+import logging
 import os
+import time
 
 from mhp import topics
 
@@ -18,14 +22,347 @@ class WirelessModuleType(Enum):
     battery = "BATTERY"
 
 
-def DataToTempCSV(msg, module_start_time, module_id_str, module_id_num, temp_dir):
-    """ Function to parse the MQTT data and convert it to a temporary
-    CSV file stored in the current derectory
+class TempCSVMerger:
+    """ Incremental, time ordered merge of the rows of a module's temp CSVs
+    (one source per module_type) into its final CSV. Rows have to be added in
+    the order of their *_TIME column, each one becomes a row of the final CSV
+    holding its own values and the latest values of every other source at
+    that time (an as-of join), so only one row per source is kept in memory
+    and the final CSV is complete as soon as the last row is added.
+
+    The header of the final CSV holds the columns of every source, so rows
+    are kept in memory until each of the expected sources has sent one (or
+    max_pending rows are waiting) and the header is written once. A source
+    sending its first row after that can not be merged, add raises a
+    ValueError and the temp CSVs have to be merged with merge_temp_csvs.
+
+    save_filepath:      Filepath of the final CSV
+    sources:            Sources the header waits for eg. [DATA, BATTERY]
+                        (None writes it with the first row)
+    max_pending:        Maximum number of rows kept in memory until the
+                        header is written
+    """
+
+    def __init__(self, save_filepath, sources=None, max_pending=1000):
+        self.SAVE_FILEPATH = save_filepath
+        self._EXPECTED = set(sources or [])
+        self._MAX_PENDING = max_pending
+
+        # {source: (position of its first column, its columns)}
+        self._SOURCES = {}
+        self._COLUMNS = []
+
+        # Latest value of every column, the as-of state of the merge
+        self._LATEST = []
+        self.rows = 0
+
+        # Rows waiting for the header
+        self._PENDING = []
+
+        self._file = None
+        self._writer = None
+
+    def add_source(self, source, fieldnames):
+        """ Adds the columns of a source to the right of the final CSV before
+        its first row, add does it with the columns of the first row
+        otherwise
+        source:             Source eg. DATA or BATTERY
+        fieldnames:         Columns of the source
+        """
+        if self._file is not None:
+            raise ValueError(
+                f"the header of {self.SAVE_FILEPATH} was written without the "
+                f"columns of {source}")
+
+        self._SOURCES[source] = (len(self._COLUMNS), list(fieldnames))
+        self._COLUMNS.extend(fieldnames)
+        self._LATEST.extend([''] * len(fieldnames))
+
+    def _write_header(self):
+        """ Opens the final CSV and writes its header and the rows that were
+        waiting for it, with empty values for the columns added after them
+        """
+        self._file = open(self.SAVE_FILEPATH, mode='w', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow([''] + self._COLUMNS)
+
+        width = len(self._COLUMNS) + 1
+        for row in self._PENDING:
+            self._writer.writerow(row + [''] * (width - len(row)))
+        self._PENDING = []
+
+    def add(self, source, data_dict, fieldnames=None):
+        """ Adds a row of a source to the final CSV
+        source:             Source of the row eg. DATA or BATTERY
+        data_dict:          Row as {column: value}
+        fieldnames:         Columns of the source, by default the keys of its
+                            first row (values of other columns are ignored)
+        """
+        position = self._SOURCES.get(source)
+        if position is None:
+            self.add_source(
+                source, data_dict.keys() if fieldnames is None else fieldnames)
+            position = self._SOURCES[source]
+
+        start, columns = position
+        for offset, column in enumerate(columns):
+            self._LATEST[start + offset] = data_dict.get(column, '')
+
+        row = [self.rows] + self._LATEST
+        self.rows += 1
+        if self._writer is not None:
+            self._writer.writerow(row)
+            return
+
+        self._PENDING.append(row)
+        if self._EXPECTED <= self._SOURCES.keys() or \
+                len(self._PENDING) >= self._MAX_PENDING:
+            self._write_header()
+
+    def flush(self):
+        """ Writes the buffered rows to the disk """
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self):
+        """ Closes the final CSV (creating it empty if no row was added) and
+        returns the number of rows in it """
+        if self._file is None:
+            self._write_header()
+        self._file.close()
+        return self.rows
+
+
+def merge_temp_csvs(temp_filepaths, save_filepath):
+    """ Merges temp CSVs into a final CSV in the order of their *_TIME
+    columns with a TempCSVMerger, reading one row of each temp CSV at a
+    time. Returns the number of rows saved.
+    temp_filepaths:     Example list of filepaths is [filepath1, filepath2]
+    save_filepath:      Filepath of the final CSV
+    """
+
+    def timed_rows(index, reader):
+        """ (time, index of the temp file, row) of every row of a temp CSV
+        """
+        time_column = next(
+            (column for column in reader.fieldnames or []
+             if column.endswith('_TIME')), None)
+
+        for row in reader:
+            try:
+                row_time = float(row[time_column])
+            except (KeyError, TypeError, ValueError):
+                row_time = float('inf')
+            yield row_time, index, row
+
+    merger = TempCSVMerger(save_filepath)
+    temp_files = [open(temp_filepath, newline='')
+                  for temp_filepath in temp_filepaths]
+    try:
+        # The columns of every temp CSV are known before the first row
+        readers = [csv.DictReader(temp_file) for temp_file in temp_files]
+        for index, reader in enumerate(readers):
+            merger.add_source(index, reader.fieldnames or [])
+
+        # Rows with the same time keep the order of temp_filepaths
+        for _, index, row in heapq.merge(
+                *[timed_rows(index, reader)
+                  for index, reader in enumerate(readers)]):
+            merger.add(index, row)
+    finally:
+        for temp_file in temp_files:
+            temp_file.close()
+        rows = merger.close()
+
+    return rows
+
+
+class TempCSVWriters:
+    """ Registry of long lived writers of the temporary CSV files, one per
+    (module_id_str, module_type). Each temp file is opened once and written
+    through its own buffer instead of being opened, appended to and closed
+    for every message, and the buffers are flushed every flush_interval
+    seconds. At most max_open files are kept open, the least recently used
+    one is closed (and reopened in append mode when it is needed again).
+
+    The rows of a module can also be merged into its final CSV as they are
+    written (see merge_module), so that little is left to do when its
+    recording stops.
+
+    temp_dir:           The temp directory to save the temp files
+    max_open:           Maximum number of temp files kept open at once
+    flush_interval:     Time in seconds between flushes of the open files
+                        (None only flushes when a file is closed)
+    buffer_size:        Size in bytes of the write buffer of each file
+    """
+
+    def __init__(self, temp_dir, max_open=32, flush_interval=1.0,
+                 buffer_size=65536):
+        self.TEMP_DIR = temp_dir
+        self._MAX_OPEN = max(1, max_open)
+        self._FLUSH_INTERVAL = flush_interval
+        self._BUFFER_SIZE = buffer_size
+
+        # {(module_id_str, module_type): (file, csv.DictWriter, set of the
+        # columns)} in least recently used order
+        self._WRITERS = OrderedDict()
+
+        # Fieldnames of every temp file written so far (also once closed),
+        # so that reopened files keep their columns
+        self._FIELDNAMES = {}
+        self._WARNED = set()
+
+        # {module_id_str: TempCSVMerger} of the modules merged as they go
+        self._MERGERS = {}
+        self._last_flush = time.monotonic()
+
+    def temp_filepath(self, module_id_str, module_type):
+        """ Filepath of the temp file of a module and data type """
+        temp_filename = f".~temp_{module_id_str}_{module_type}.csv"
+        return os.path.join(self.TEMP_DIR, temp_filename)
+
+    def _open(self, key, data_dict):
+        """ Opens (or reopens) the temp file of key, writing the headers if it
+        is new, and closes the least recently used file if too many are
+        open """
+        while len(self._WRITERS) >= self._MAX_OPEN:
+            _, (temp_file, _, _) = self._WRITERS.popitem(last=False)
+            temp_file.close()
+
+        # If the temporary directory does not exist, make one
+        os.makedirs(self.TEMP_DIR, exist_ok=True)
+
+        temp_filepath = self.temp_filepath(*key)
+        temp_exists = os.path.exists(temp_filepath)
+        if not temp_exists:
+            # A new recording starts with the columns of its first row
+            self._FIELDNAMES[key] = list(data_dict.keys())
+
+        temp_file = open(temp_filepath, mode='a', newline='',
+                         buffering=self._BUFFER_SIZE)
+        csv_writer = csv.DictWriter(
+            temp_file,
+            fieldnames=self._FIELDNAMES.get(key, list(data_dict.keys())),
+            extrasaction='ignore')
+
+        if not temp_exists:
+            csv_writer.writeheader()
+
+        writer = (temp_file, csv_writer, set(csv_writer.fieldnames))
+        self._WRITERS[key] = writer
+        return writer
+
+    def write(self, module_id_str, module_type, data_dict):
+        """ Appends a row to the temp file of a module and data type. Values
+        of columns that are not in the first row of the file are ignored.
+        module_id_str:      Module_id eg. M1, M2 or M3
+        module_type:        Type of the data eg. DATA or BATTERY
+        data_dict:          Row to write as {column: value}
+        """
+        key = (module_id_str, str(module_type))
+        writer = self._WRITERS.get(key)
+        if writer is None:
+            writer = self._open(key, data_dict)
+        else:
+            self._WRITERS.move_to_end(key)
+        _, csv_writer, columns = writer
+
+        if not data_dict.keys() <= columns and key not in self._WARNED:
+            self._WARNED.add(key)
+            logging.warning(
+                f"{module_id_str} {key[1]}: ignoring the columns "
+                f"{sorted(data_dict.keys() - columns)} that are not in the "
+                "temp file")
+        csv_writer.writerow(data_dict)
+
+        merger = self._MERGERS.get(module_id_str)
+        if merger is not None:
+            try:
+                merger.add(key[1], data_dict, csv_writer.fieldnames)
+            except ValueError as e:
+                # The temp files are merged when the recording stops instead
+                logging.warning(f"{module_id_str}: stopped merging, {e}")
+                self._MERGERS.pop(module_id_str).close()
+
+        if self._FLUSH_INTERVAL is not None and \
+                time.monotonic() - self._last_flush >= self._FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        """ Writes the buffered rows of every open temp file to the disk """
+        for temp_file, _, _ in self._WRITERS.values():
+            temp_file.flush()
+        for merger in self._MERGERS.values():
+            merger.flush()
+        self._last_flush = time.monotonic()
+
+    def close_module(self, module_id_str):
+        """ Closes the temp files of a module (e.g. when its recording stops)
+        so they are complete on disk, the next recording starts new files """
+        for key in [key for key in self._WRITERS if key[0] == module_id_str]:
+            temp_file, _, _ = self._WRITERS.pop(key)
+            temp_file.close()
+        for key in [key for key in self._FIELDNAMES
+                    if key[0] == module_id_str]:
+            del self._FIELDNAMES[key]
+            self._WARNED.discard(key)
+
+    def merge_module(self, module_id_str, save_filepath, sources=None,
+                     max_pending=1000):
+        """ Starts merging the rows of a module into its final CSV as they
+        are written, in the order they are written (see TempCSVMerger).
+        finish_merge returns None if a data type only sent its first row
+        after the header of the final CSV was written
+        module_id_str:      Module_id eg. M1, M2 or M3
+        save_filepath:      Filepath of the final CSV
+        sources:            Data types the header of the final CSV waits for
+                            (None waits for DATA and BATTERY)
+        max_pending:        Maximum number of rows kept in memory until the
+                            header is written
+        """
+        if sources is None:
+            sources = [str(module_type) for module_type in WirelessModuleType]
+
+        self.finish_merge(module_id_str)
+        self._MERGERS[module_id_str] = TempCSVMerger(
+            save_filepath, sources, max_pending)
+
+    def finish_merge(self, module_id_str):
+        """ Closes the final CSV of a module started with merge_module and
+        returns the number of rows in it, or None if it was not merged (eg.
+        it stopped merging, see merge_module) """
+        merger = self._MERGERS.pop(module_id_str, None)
+        if merger is None:
+            return None
+        return merger.close()
+
+    def close(self):
+        """ Closes every open temp file and final CSV """
+        while self._WRITERS:
+            _, (temp_file, _, _) = self._WRITERS.popitem(last=False)
+            temp_file.close()
+        for module_id_str in list(self._MERGERS):
+            self.finish_merge(module_id_str)
+
+    @property
+    def open_files(self):
+        """ Number of temp files currently open """
+        return len(self._WRITERS)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def parse_module_message(msg, module_id_str, module_type):
+    """ Parses the sensor or battery data of a wireless module message into
+    a dict of {<column>: <value>}, the columns are named after the module and
+    the sensor eg. M1_co2, M1_accelerometer_x or M1_percentage
     msg:                        Raw MQTT data
     module_id_str:              Module_id eg. M1, M2 or M3
-    module_start_time:          Start time of the module (datetime obj)
-    module_start_time:          Start time of the module (datetime obj)
-    temp_dir:                   The temp directory to save the temp files
+    module_type:                Type of the data, DATA or BATTERY
     """
 
     def parse_module_data():
@@ -52,46 +389,65 @@ def DataToTempCSV(msg, module_start_time, module_id_str, module_id_num, temp_dir
         data_dict[module_id_str + "_percentage"] = \
             module_data["percentage"]
 
-    def make_temp_csv():
-        """ Makes a temporary CSV file that is hidden and is in the form of
-        .~temp_<filename>.csv in the current directory"""
+    data_dict = {}  # Data to be output to a temp CSV
 
-        # If the temporary directory does not exist, make one
-        if not os.path.exists(temp_dir):
-            os.makedirs(temp_dir)
+    # Decode the data as utf-8 and load into python dict
+    module_data = msg.payload.decode("utf-8")
+    module_data = json.loads(module_data)
 
-        # Ensures that the temp file is in the same folder as the script
-        temp_filename = f".~temp_{module_id_str}_{module_type}.csv"
-        temp_filepath = os.path.join(temp_dir, temp_filename)
+    if module_type == str(WirelessModuleType.data):
+        parse_module_data()
 
-        # If the temp file does not exist write the headers for the CSV
-        temp_exists = os.path.exists(temp_filepath)
+    elif module_type == str(WirelessModuleType.battery):
+        parse_module_battery()
 
-        with open(temp_filepath, mode='a') as temp_file:
-            csv_writer = csv.DictWriter(
-                temp_file,
-                fieldnames=data_dict.keys())
+    return data_dict
 
-            if not temp_exists:
-                csv_writer.writeheader()
 
-            # Append the data onto the temporary file
-            csv_writer.writerow(data_dict)
+def DataToTempCSV(msg, module_start_time, module_id_str, module_id_num,
+                  temp_dir, writers=None, module_type=None):
+    """ Function to parse the MQTT data and convert it to a temporary
+    CSV file stored in the current derectory. Returns the parsed data (see
+    parse_module_message) with its time, None if msg is not sensor or battery
+    data
+    msg:                        Raw MQTT data
+    module_id_str:              Module_id eg. M1, M2 or M3
+    module_start_time:          Start time of the module (datetime obj)
+    module_start_time:          Start time of the module (datetime obj)
+    temp_dir:                   The temp directory to save the temp files
+    writers:                    TempCSVWriters that keeps the temp files open
+                                between messages, or ColumnStoreWriters to
+                                store the data in column stores instead (None
+                                opens and closes the temp file for this
+                                message only)
+    module_type:                Type of the data eg. DATA or BATTERY (None
+                                finds it from the topic of msg)
+    """
 
-    data_dict = {}  # Data to be output to a temp CSV
+    def make_temp_csv():
+        """ Appends the data to a temporary CSV file that is hidden and is in
+        the form of .~temp_<filename>.csv in the temp directory"""
 
-    # Decode the data as utf-8 and load into python dict
-    module_data = msg.payload.decode("utf-8")
-    module_data = json.loads(module_data)
+        if writers is None:
+            with TempCSVWriters(temp_dir) as temp_writers:
+                temp_writers.write(module_id_str, module_type, data_dict)
+        else:
+            writers.write(module_id_str, module_type, data_dict)
 
     # Determine which type of data to parse
-    if topics.WirelessModule.id(module_id_num).data == msg.topic:
-        module_type = str(WirelessModuleType.data)
-        parse_module_data()
+    if module_type is None:
+        module_topics = topics.WirelessModule.id(module_id_num)
+        if module_topics.data == msg.topic:
+            module_type = str(WirelessModuleType.data)
+        elif module_topics.battery == msg.topic:
+            module_type = str(WirelessModuleType.battery)
 
-    elif topics.WirelessModule.id(module_id_num).battery == msg.topic:
-        module_type = str(WirelessModuleType.battery)
-        parse_module_battery()
+    if module_type not in (str(WirelessModuleType.data),
+                           str(WirelessModuleType.battery)):
+        # Not sensor or battery data
+        return None
+
+    data_dict = parse_module_message(msg, module_id_str, module_type)
 
     # Find the difference in seconds to when the recording was started and
     # when the data was recieved.
@@ -102,3 +458,5 @@ def DataToTempCSV(msg, module_start_time, module_id_str, module_id_num, temp_dir
 
     # Add or create the temp CSV to store the data
     make_temp_csv()
+
+    return data_dict
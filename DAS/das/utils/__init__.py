@@ -1,4 +1,17 @@
-from .DataToTempCSV import DataToTempCSV
+from .DataToTempCSV import (
+    DataToTempCSV,
+    TempCSVMerger,
+    TempCSVWriters,
+    merge_temp_csvs,
+    parse_module_message,
+)
 from .MockSensor import MockSensor
 
-__all__ = ["DataToTempCSV", "MockSensor"]
\ No newline at end of file
+__all__ = [
+    "DataToTempCSV",
+    "MockSensor",
+    "TempCSVMerger",
+    "TempCSVWriters",
+    "merge_temp_csvs",
+    "parse_module_message",
+]
@@ -0,0 +1,300 @@
+from collections import deque
+import logging
+import os
+import queue
+import threading
+import time
+
+from das.utils.metrics import percentiles
+
+
+class BatchWriter:
+    """Write records to a file in batches from a dedicated thread.
+
+    Records are placed on a bounded in-memory queue by `put` (which never blocks) and are drained by a
+    background thread that hands them to `write_batch` in groups. A batch is written once `flush_size` records
+    have been collected or `flush_interval` seconds have passed since the first record of the batch arrived,
+    whichever comes first. After each batch the file is flushed, and it is fsynced every `fsync_interval`
+    seconds or whenever `sync` is called.
+
+    Parameters
+    ----------
+    write_batch : Callable[[list], None]
+        Function that writes a list of records to the log file
+    log_file : `File`
+        Open file object that `write_batch` writes to (flushed and fsynced by the writer thread), None if
+        `write_batch` does not write to a file
+    max_queue_size : int
+        Maximum number of records held in memory before new records are dropped
+    flush_size : int
+        Maximum number of records written per batch
+    flush_interval : float
+        Maximum time in seconds a record waits in the queue before being written
+    fsync_interval : float
+        Time in seconds between fsyncs of the log file (None only fsyncs on `sync` and `stop`)
+    fsync : Callable[[], None]
+        Function that forces the log file to disk (defaults to flushing and fsyncing log_file)
+
+    Attributes
+    ----------
+    _QUEUE : `queue.Queue`
+        Bounded queue of records waiting to be written
+    _THREAD : `threading.Thread`
+        Thread that drains _QUEUE and writes the batches
+    _stats : dict
+        Counters describing the state of the writer (see `stats`)
+    _LATENCIES : `collections.deque`
+        Flush latencies of the most recent batches in seconds
+    """
+
+    # Sentinel placed on the queue to wake the writer thread
+    _WAKE = object()
+
+    # Number of recent flush latencies kept for `latency_percentiles`
+    LATENCY_SAMPLES = 1000
+
+    def __init__(
+        self,
+        write_batch,
+        log_file,
+        max_queue_size: int = 100000,
+        flush_size: int = 500,
+        flush_interval: float = 0.5,
+        fsync_interval: float = None,
+        fsync=None,
+    ) -> None:
+        self._write_batch = write_batch
+        self._LOG_FILE = log_file
+        self._fsync_file = fsync or (
+            self._flush_and_fsync if log_file is not None else lambda: None
+        )
+        self._FLUSH_SIZE = max(1, flush_size)
+        self._FLUSH_INTERVAL = flush_interval
+        self._FSYNC_INTERVAL = fsync_interval
+
+        self._QUEUE = queue.Queue(maxsize=max_queue_size)
+        self._stopping = threading.Event()
+        self._pending_syncs = []
+        self._last_fsync = time.monotonic()
+
+        self._stats = {
+            "queued": 0,
+            "written": 0,
+            "dropped": 0,
+            "batches": 0,
+            "fsyncs": 0,
+            "errors": 0,
+            "max_queue_depth": 0,
+            "last_flush_latency": 0.0,
+            "max_flush_latency": 0.0,
+            "total_flush_latency": 0.0,
+        }
+
+        self._LATENCIES = deque(maxlen=self.LATENCY_SAMPLES)
+
+        self._THREAD = threading.Thread(
+            target=self._run, name="BatchWriter", daemon=True
+        )
+
+    @property
+    def stats(self) -> dict:
+        """A snapshot of the writer counters.
+
+        Returns
+        -------
+        dict
+            queue_depth, max_queue_depth, queued, written, dropped, batches, fsyncs, errors and the last, max and
+            mean flush latency in seconds
+        """
+        stats = dict(self._stats)
+        stats["queue_depth"] = self._QUEUE.qsize()
+        total_latency = stats.pop("total_flush_latency")
+        stats["mean_flush_latency"] = (
+            total_latency / stats["batches"] if stats["batches"] else 0.0
+        )
+        return stats
+
+    def latency_percentiles(self, quantiles=(50, 90, 99)) -> dict:
+        """Percentiles of the flush latency of the last LATENCY_SAMPLES batches in seconds, see `percentiles`."""
+        return percentiles(list(self._LATENCIES), quantiles)
+
+    def start(self) -> None:
+        """Starts the writer thread."""
+        self._THREAD.start()
+
+    def put(self, record) -> bool:
+        """Queues a record to be written without blocking the caller.
+
+        Parameters
+        ----------
+        record
+            Record passed (as part of a list) to `write_batch`
+
+        Returns
+        -------
+        bool
+            False if the queue was full and the record was dropped
+        """
+        try:
+            self._QUEUE.put_nowait(record)
+        except queue.Full:
+            if not self._stats["dropped"]:
+                logging.warning("Write queue is full, records are being dropped")
+            self._stats["dropped"] += 1
+            return False
+
+        self._stats["queued"] += 1
+        depth = self._QUEUE.qsize()
+        if depth > self._stats["max_queue_depth"]:
+            self._stats["max_queue_depth"] = depth
+        return True
+
+    def sync(self, timeout: float = None) -> bool:
+        """Creates an explicit fsync point: waits until every record queued so far is on disk.
+
+        Parameters
+        ----------
+        timeout : float
+            Maximum time in seconds to wait (None waits forever)
+
+        Returns
+        -------
+        bool
+            True if the fsync completed before the timeout
+        """
+        if not self._THREAD.is_alive():
+            return False
+
+        # The sync point travels through the queue so that every earlier record is written before it
+        sync_point = threading.Event()
+        try:
+            self._QUEUE.put(sync_point, timeout=timeout)
+        except queue.Full:
+            return False
+
+        return sync_point.wait(timeout)
+
+    def stop(self, timeout: float = None) -> None:
+        """Writes out every queued record, fsyncs the file and stops the writer thread.
+
+        Parameters
+        ----------
+        timeout : float
+            Maximum time in seconds to wait for the queue to drain (None waits forever)
+        """
+        self._stopping.set()
+        if self._THREAD.is_alive():
+            self._wake()
+            self._THREAD.join(timeout)
+
+    def _wake(self) -> None:
+        """Wakes the writer thread if it is waiting for records."""
+        try:
+            self._QUEUE.put_nowait(self._WAKE)
+        except queue.Full:
+            # The writer thread is busy draining the queue and will notice on its own
+            pass
+
+    def _run(self) -> None:
+        """Writer thread loop that collects batches, writes, flushes and fsyncs them."""
+        while True:
+            batch = self._collect_batch()
+            if batch:
+                self._write(batch)
+
+            stopping = self._stopping.is_set() and self._QUEUE.empty()
+
+            fsync_due = (
+                self._FSYNC_INTERVAL is not None
+                and time.monotonic() - self._last_fsync >= self._FSYNC_INTERVAL
+            )
+            if stopping or fsync_due or self._pending_syncs:
+                self._fsync()
+
+            if stopping:
+                return
+
+    def _collect_batch(self) -> list:
+        """Blocks until a batch is ready to be written.
+
+        Returns
+        -------
+        list
+            Up to _FLUSH_SIZE records (may be empty if the thread was woken or timed out)
+        """
+        batch = []
+        try:
+            record = self._QUEUE.get(timeout=self._FLUSH_INTERVAL)
+        except queue.Empty:
+            return batch
+
+        deadline = time.monotonic() + self._FLUSH_INTERVAL
+        while True:
+            if record is self._WAKE:
+                # Woken for stop, so write out whatever is already waiting
+                deadline = 0
+            elif isinstance(record, threading.Event):
+                # Sync point, so everything before it must be written and fsynced now
+                self._pending_syncs.append(record)
+                return batch
+            else:
+                batch.append(record)
+
+            if len(batch) >= self._FLUSH_SIZE:
+                return batch
+
+            try:
+                remaining = deadline - time.monotonic()
+                if remaining > 0 and not self._stopping.is_set():
+                    record = self._QUEUE.get(timeout=remaining)
+                else:
+                    record = self._QUEUE.get_nowait()
+            except queue.Empty:
+                return batch
+
+    def _write(self, batch: list) -> None:
+        """Writes and flushes a batch of records, keeping track of the flush latency.
+
+        Parameters
+        ----------
+        batch : list
+            Records to be written
+        """
+        start = time.perf_counter()
+        try:
+            self._write_batch(batch)
+            if self._LOG_FILE is not None:
+                self._LOG_FILE.flush()
+            self._stats["written"] += len(batch)
+
+        except Exception as e:
+            self._stats["errors"] += 1
+            logging.error(f"{type(e)}: {e}")
+
+        latency = time.perf_counter() - start
+        self._LATENCIES.append(latency)
+        self._stats["batches"] += 1
+        self._stats["last_flush_latency"] = latency
+        self._stats["total_flush_latency"] += latency
+        if latency > self._stats["max_flush_latency"]:
+            self._stats["max_flush_latency"] = latency
+
+    def _flush_and_fsync(self) -> None:
+        """Default way of forcing the log file to disk."""
+        self._LOG_FILE.flush()
+        os.fsync(self._LOG_FILE.fileno())
+
+    def _fsync(self) -> None:
+        """Forces the log file to disk and releases anyone waiting in `sync`."""
+        try:
+            self._fsync_file()
+            self._stats["fsyncs"] += 1
+
+        except Exception as e:
+            self._stats["errors"] += 1
+            logging.error(f"{type(e)}: {e}")
+
+        self._last_fsync = time.monotonic()
+        for sync_point in self._pending_syncs:
+            sync_point.set()
+        self._pending_syncs = []
@@ -0,0 +1,285 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+# Default number of rows of a chunk
+CHUNK_ROWS = 4096
+
+# Filenames of the chunks of a store, in the order they were written
+CHUNK_EXTENSION = ".npz"
+CHUNK_FILENAME = "chunk_{:06d}" + CHUNK_EXTENSION
+
+# Python types of the values stored as float64 columns (None becomes NaN)
+NUMERIC_TYPES = {int, float, bool, type(None)}
+
+
+def chunk_filepaths(path: str) -> list:
+    """Filepaths of the chunks of the store at path, in the order they were written."""
+    if not os.path.isdir(path):
+        return []
+    return [
+        os.path.join(path, filename)
+        for filename in sorted(os.listdir(path))
+        if filename.startswith("chunk_") and filename.endswith(CHUNK_EXTENSION)
+    ]
+
+
+def _column_arrays(values: list) -> tuple:
+    """Array of the values of a column and the mask of its null values (None for numeric columns, which use NaN).
+
+    Columns holding only numbers (and None) are stored as float64, any other column as unicode strings.
+    """
+    if all(type(value) in NUMERIC_TYPES for value in values):
+        return np.array(values, dtype=np.float64), None
+
+    nulls = np.array([value is None for value in values], dtype=bool)
+    strings = np.array(
+        ["" if value is None else str(value) for value in values], dtype=str
+    )
+    return strings, nulls
+
+
+class ColumnStore:
+    """Append-only columnar store of rows with a schema that can change, such as the rows of a wireless module.
+
+    Rows are kept in memory as one list per column and written out as a chunk of NumPy arrays (an uncompressed
+    `.npz` file) every `chunk_rows` rows or `flush_interval` seconds. Columns are added the first time a row holds
+    them, with null values for the earlier rows, and a row without a column holds a null value for it, so no value
+    is ever dropped. Every chunk holds its own column names, a column whose values are all null in a chunk is not
+    written to it. Chunks are written to a temporary file and renamed, so a crash only loses the rows in memory.
+    Opening an existing store appends new chunks after its chunks.
+
+    Parameters
+    ----------
+    path : str
+        Folder of the store (created if needed)
+    chunk_rows : int
+        Number of rows of a chunk
+    flush_interval : float
+        Maximum time in seconds rows are kept in memory before a (smaller) chunk is written, None only writes full
+        chunks
+
+    Attributes
+    ----------
+    rows : int
+        Number of rows in the store, including those still in memory
+    bytes_written : int
+        Size in bytes of the chunks of the store
+    _COLUMNS : dict
+        {column: list of the values of the rows in memory} in the order the columns were added
+    """
+
+    def __init__(
+        self, path: str, chunk_rows: int = CHUNK_ROWS, flush_interval: float = 60.0
+    ) -> None:
+        self.PATH = path
+        self._CHUNK_ROWS = max(1, chunk_rows)
+        self._FLUSH_INTERVAL = flush_interval
+        self._COLUMNS = {}
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+        os.makedirs(path, exist_ok=True)
+        chunks = chunk_filepaths(path)
+        self._chunks = len(chunks)
+        self.rows = 0
+        self.bytes_written = 0
+        for chunk_filepath in chunks:
+            with np.load(chunk_filepath, allow_pickle=False) as chunk:
+                self.rows += int(chunk["rows"])
+            self.bytes_written += os.path.getsize(chunk_filepath)
+
+    @property
+    def columns(self) -> list:
+        """Columns added since the store was opened, in the order they were added."""
+        return list(self._COLUMNS)
+
+    def append(self, row: dict) -> None:
+        """Appends a row.
+
+        Parameters
+        ----------
+        row : dict
+            Values of the row by column, numbers, strings, booleans or None (any other value is stored as a string)
+        """
+        columns = self._COLUMNS
+        if not row.keys() <= columns.keys():
+            for column in row:
+                if column not in columns:
+                    # Null backfill of the rows in memory, earlier chunks do not hold the column
+                    columns[column] = [None] * self._pending
+
+        for column, values in columns.items():
+            values.append(row.get(column))
+        self._pending += 1
+        self.rows += 1
+
+        if self._pending >= self._CHUNK_ROWS or (
+            self._FLUSH_INTERVAL is not None
+            and time.monotonic() - self._last_flush >= self._FLUSH_INTERVAL
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        """Writes the rows in memory as a new chunk."""
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return
+
+        names = []
+        arrays = {"rows": np.array(self._pending)}
+        for column, values in self._COLUMNS.items():
+            if all(value is None for value in values):
+                continue
+
+            index = len(names)
+            names.append(column)
+            arrays[f"values_{index}"], nulls = _column_arrays(values)
+            if nulls is not None:
+                arrays[f"nulls_{index}"] = nulls
+        arrays["columns"] = np.array(names, dtype=str)
+
+        chunk_filepath = os.path.join(self.PATH, CHUNK_FILENAME.format(self._chunks))
+        temp_filepath = chunk_filepath + ".~tmp"
+        with open(temp_filepath, "wb") as chunk_file:
+            np.savez(chunk_file, **arrays)
+        os.replace(temp_filepath, chunk_filepath)
+
+        self._chunks += 1
+        self.bytes_written += os.path.getsize(chunk_filepath)
+        for column in self._COLUMNS:
+            self._COLUMNS[column] = []
+        self._pending = 0
+
+    def close(self) -> None:
+        """Writes the rows still in memory."""
+        self.flush()
+
+    def to_dataframe(self, columns: list = None) -> pd.DataFrame:
+        """Writes the rows in memory and reads the whole store, see `read_column_store`."""
+        self.flush()
+        return read_column_store(self.PATH, columns)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_column_store(path: str, columns: list = None) -> pd.DataFrame:
+    """Reads the chunks of a `ColumnStore` into a DataFrame, without parsing any text.
+
+    Numeric columns are float64 with NaN for null values, any other column holds strings and None. A column that is
+    numeric in some chunks and not in others holds the values of both.
+
+    Parameters
+    ----------
+    path : str
+        Folder of the store
+    columns : List(str)
+        Only read these columns (None reads every column)
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row per row of the store, with the columns in the order they were added
+    """
+    wanted = None if columns is None else set(columns)
+
+    # {column: [(first row, values)]} of every chunk holding the column
+    parts = {}
+    rows = 0
+    for chunk_filepath in chunk_filepaths(path):
+        with np.load(chunk_filepath, allow_pickle=False) as chunk:
+            chunk_rows = int(chunk["rows"])
+            for index, column in enumerate(chunk["columns"].tolist()):
+                if wanted is not None and column not in wanted:
+                    continue
+
+                values = chunk[f"values_{index}"]
+                if f"nulls_{index}" in chunk.files:
+                    values = values.astype(object)
+                    values[chunk[f"nulls_{index}"]] = None
+                parts.setdefault(column, []).append((rows, values))
+        rows += chunk_rows
+
+    data = {}
+    for column, column_parts in parts.items():
+        if all(values.dtype == np.float64 for _, values in column_parts):
+            column_values = np.full(rows, np.nan)
+        else:
+            column_values = np.full(rows, None, dtype=object)
+        for start, values in column_parts:
+            column_values[start : start + len(values)] = values
+        data[column] = column_values
+
+    order = list(parts) if columns is None else [c for c in columns if c in parts]
+    return pd.DataFrame(data, columns=order, index=pd.RangeIndex(rows))
+
+
+class ColumnStoreWriters:
+    """Column stores of the wireless modules being recorded, by module_id_str.
+
+    It can be passed to `DataToTempCSV` in place of a `TempCSVWriters`: the sensor and battery rows of a module are
+    both appended to its store, each with its own *_TIME column, so the store has one row per message in the order
+    they arrived.
+
+    Parameters
+    ----------
+    chunk_rows : int
+        Number of rows of a chunk
+    flush_interval : float
+        Maximum time in seconds rows are kept in memory
+    """
+
+    def __init__(
+        self, chunk_rows: int = CHUNK_ROWS, flush_interval: float = 60.0
+    ) -> None:
+        self._CHUNK_ROWS = chunk_rows
+        self._FLUSH_INTERVAL = flush_interval
+        self._STORES = {}
+
+    def open_module(self, module_id_str: str, path: str) -> ColumnStore:
+        """Starts storing the rows of a module in the store at path."""
+        self.close_module(module_id_str)
+        store = ColumnStore(path, self._CHUNK_ROWS, self._FLUSH_INTERVAL)
+        self._STORES[module_id_str] = store
+        return store
+
+    def write(self, module_id_str: str, module_type: str, data_dict: dict) -> None:
+        """Appends a row of a module to its store (rows of modules without a store are ignored).
+
+        Parameters
+        ----------
+        module_id_str : str
+            Module_id eg. M1, M2 or M3
+        module_type : str
+            Type of the data eg. DATA or BATTERY
+        data_dict : dict
+            Row to append as {column: value}
+        """
+        store = self._STORES.get(module_id_str)
+        if store is not None:
+            store.append(data_dict)
+
+    def close_module(self, module_id_str: str) -> ColumnStore:
+        """Writes the rows of a module still in memory and stops storing them, returns its store (None if there is
+        none)."""
+        store = self._STORES.pop(module_id_str, None)
+        if store is not None:
+            store.close()
+        return store
+
+    def close(self) -> None:
+        """Closes the store of every module."""
+        for module_id_str in list(self._STORES):
+            self.close_module(module_id_str)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -1,4 +1,5 @@
 import csv
+import io
 import os
 import random
 import time
@@ -51,14 +52,52 @@ def send_fake_data(send_data_func, duration, rate, immitate_teensy=False):
         if total_time >= duration:
             break
 
+def seek_csv_time(csv_file, fieldnames, jump_ms, min_gap=4096):
+    """ Moves csv_file (opened in binary mode, positioned after the header) to the first row at or after
+        [jump_ms] with a binary search over byte offsets, as the rows are recorded in time order.
+        Only the last [min_gap] bytes are read row by row, so a jump into a long ride is O(log n) """
+    def row_time(line):
+        row = next(csv.DictReader(io.StringIO(line.decode("utf-8")), fieldnames=fieldnames))
+        return int(row["time"])
+
+    # Every row before lo is earlier than jump_ms
+    lo = csv_file.tell()
+    hi = os.fstat(csv_file.fileno()).st_size
+    while hi - lo > min_gap:
+        mid = (lo + hi) // 2
+        csv_file.seek(mid)
+        csv_file.readline()  # Skip to the start of the next row
+        row_start = csv_file.tell()
+        line = csv_file.readline()
+        if not line.strip() or row_time(line) >= jump_ms:
+            hi = mid
+        else:
+            lo = row_start + len(line)
+
+    csv_file.seek(lo)
+    while True:
+        row_start = csv_file.tell()
+        line = csv_file.readline()
+        if not line.strip() or row_time(line) >= jump_ms:
+            csv_file.seek(row_start)
+            return
+
 def send_csv_data(send_data_func, csv_path, jump, immitate_teensy=False, speedup=1):
     """ Replays a ride recorded to a csv located at csv_path. Starts from [jump] seconds
         Some fields are filled in by DAS.js, so if data will go through DAS.js (i.e. serial_test.py)
         we don't want to send that data """
-    with open(csv_path) as csv_data:
-        reader = csv.DictReader(csv_data)
+    with open(csv_path, "rb") as csv_file:
+        fieldnames = next(csv.reader([csv_file.readline().decode("utf-8")]))
 
+        # Seek straight to the jump instead of reading every row before it
         prev_time = 0
+        if jump > 0:
+            seek_csv_time(csv_file, fieldnames, jump * 1000)
+            prev_time = jump * 1000
+
+        csv_data = io.TextIOWrapper(csv_file, newline="")
+        reader = csv.DictReader(csv_data, fieldnames=fieldnames)
+
         line_count = 0
 
         for line in reader:
@@ -69,11 +108,6 @@ def send_csv_data(send_data_func, csv_path, jump, immitate_teensy=False, speedup
             # This datapoint is used a lot so let's store it
             row_time = int(line["time"])
 
-            # Skip to specified time
-            if row_time / 1000 < jump:
-                prev_time = row_time
-                continue
-
             # Pause for the time elapsed according to the csv
             time.sleep((row_time - prev_time) / 1000 / speedup)
             prev_time = row_time
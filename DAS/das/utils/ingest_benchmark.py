@@ -0,0 +1,550 @@
+from array import array
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+
+from das.utils.logger import Recorder
+from das.utils.metrics import percentiles
+from das.utils.mqtt_broker import MqttBroker
+
+# Sensors of the wireless modules with their average values, as sent by V3_fake_module
+SENSOR_AVERAGES = {
+    "steeringAngle": 10,
+    "co2": 325,
+    "temperature": 25,
+    "humidity": 85,
+    "reedVelocity": 50,
+    "reedDistance": 1000,
+    "accelerometer": {"x": 90, "y": 90, "z": 90},
+    "gyroscope": {"x": 90, "y": 90, "z": 90},
+    "gps": {
+        "speed": 50,
+        "satellites": 10,
+        "pdop": 10,
+        "latitude": -37,
+        "longitude": 145,
+        "altitude": 50,
+        "course": 0,
+        "datetime": "2017-11-28 23:55:59.342380",
+    },
+    "power": 200,
+    "cadence": 90,
+    "heartRate": 120,
+}
+
+# Onboard sensors of each module in V3_fake_module (any other module id has every sensor)
+MODULE_SENSORS = {
+    1: ["temperature", "humidity", "steeringAngle"],
+    2: ["co2", "temperature", "humidity", "accelerometer", "gyroscope"],
+    3: ["co2", "reedVelocity", "reedDistance", "gps"],
+    4: ["power", "cadence", "heartRate"],
+}
+
+# Metrics compared between runs, with whether a higher value is better
+COMPARED_METRICS = {
+    "msgs_per_s": True,
+    "end_to_end_msgs_per_s": True,
+    "p50_us": False,
+    "p99_us": False,
+    "bytes_per_message": False,
+    "dispatch_ns": False,
+}
+
+
+def _sensor_value(rng: random.Random, average):
+    """A random value within 5% of the average (sub values for dicts, strings are kept as is)."""
+    if isinstance(average, dict):
+        return {name: _sensor_value(rng, value) for name, value in average.items()}
+    if isinstance(average, str):
+        return average
+    return round(average * (1 + rng.uniform(-0.05, 0.05)), 2)
+
+
+def synthetic_messages(
+    count: int,
+    modules: list = (1, 2, 3, 4),
+    payload_size: int = None,
+    battery_every: int = 300,
+    seed: int = 0,
+) -> list:
+    """Generates paho messages shaped like the output of V3_fake_module.
+
+    Every tick each module sends one data message (with the sensors V3_fake_module gives it), and every
+    `battery_every` ticks a battery message as well. The same seed always generates the same messages, so runs on
+    different commits record exactly the same data.
+
+    Parameters
+    ----------
+    count : int
+        Number of messages
+    modules : List(int)
+        Ids of the modules sending data
+    payload_size : int
+        Pad every payload to at least this many bytes (None keeps the natural V3_fake_module sizes)
+    battery_every : int
+        Number of ticks between battery messages of each module
+    seed : int
+        Seed of the random sensor values
+
+    Returns
+    -------
+    list(`paho.mqtt.client.MQTTMessage`)
+        Messages with their topic and payload set
+    """
+    rng = random.Random(seed)
+    messages = []
+    tick = 0
+    while len(messages) < count:
+        for module_id in modules:
+            data = {
+                "module-id": module_id,
+                "sensors": [
+                    {"type": name, "value": _sensor_value(rng, SENSOR_AVERAGES[name])}
+                    for name in MODULE_SENSORS.get(module_id, list(SENSOR_AVERAGES))
+                ],
+            }
+            topics = [(f"/v3/wireless_module/{module_id}/data", data)]
+            if battery_every and tick % battery_every == 0:
+                battery = {"module-id": module_id, "percentage": _sensor_value(rng, 80)}
+                topics.append((f"/v3/wireless_module/{module_id}/battery", battery))
+
+            for topic, data in topics:
+                payload = json.dumps(data)
+                if payload_size is not None and len(payload) < payload_size:
+                    # Pad with an extra field so that the payload is still valid JSON
+                    padding = payload_size - len(payload) - len(', "padding": ""')
+                    data["padding"] = "x" * max(0, padding)
+                    payload = json.dumps(data)
+
+                message = mqtt.MQTTMessage(topic=topic.encode("utf-8"))
+                message.payload = payload.encode("utf-8")
+                messages.append(message)
+                if len(messages) == count:
+                    return messages
+        tick += 1
+
+    return messages
+
+
+def git_commit(path: str = None) -> str:
+    """Short hash of the commit checked out at path (with "-dirty" if there are uncommitted changes), None outside
+    a git repository."""
+    path = path or os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=path,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=path,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        return f"{commit}-dirty" if dirty else commit
+
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_ingest(messages: list, folder_path: str, **recorder_options) -> dict:
+    """Injects messages straight into `Recorder._on_message` and measures the cost of every call.
+
+    The recorder gets an MQTT client that is never connected, so no broker is needed and only the recorder's own
+    work (filtering, queueing, writing) is measured.
+
+    Parameters
+    ----------
+    messages : List(`paho.mqtt.client.MQTTMessage`)
+        Messages to inject, see `synthetic_messages`
+    folder_path : str
+        Folder the log is written to
+    recorder_options
+        Options passed on to the `Recorder` (log format, compression, flush size...)
+
+    Returns
+    -------
+    dict
+        messages, ingest_seconds (time spent in `_on_message`), drain_seconds (time `stop` takes to write out the
+        queue), msgs_per_s, end_to_end_msgs_per_s, p50_us, p99_us and max_us (cost of one call),
+        bytes_written, bytes_per_message and dropped
+    """
+    client = mqtt.Client()
+    recorder = Recorder(folder_path, client=client, **recorder_options)
+    recorder.start()
+
+    on_message = recorder._on_message
+    clock = time.perf_counter_ns
+    costs = array("q", bytes(8 * len(messages)))
+
+    start = clock()
+    for i, message in enumerate(messages):
+        call_start = clock()
+        on_message(client, None, message)
+        costs[i] = clock() - call_start
+    ingest_seconds = (clock() - start) / 1e9
+
+    dropped = recorder.stats["dropped"]
+    drain_start = clock()
+    recorder.stop()
+    drain_seconds = (clock() - drain_start) / 1e9
+
+    cost_percentiles = percentiles(costs, quantiles=(50, 99))
+    bytes_written = recorder._LOG_SESSION.bytes
+    return {
+        "messages": len(messages),
+        "ingest_seconds": ingest_seconds,
+        "drain_seconds": drain_seconds,
+        "msgs_per_s": len(messages) / ingest_seconds if ingest_seconds else None,
+        "end_to_end_msgs_per_s": (
+            len(messages) / (ingest_seconds + drain_seconds)
+            if ingest_seconds + drain_seconds
+            else None
+        ),
+        "p50_us": (cost_percentiles["p50"] or 0) / 1e3,
+        "p99_us": (cost_percentiles["p99"] or 0) / 1e3,
+        "max_us": (cost_percentiles["max"] or 0) / 1e3,
+        "bytes_written": bytes_written,
+        "bytes_per_message": bytes_written / len(messages) if messages else None,
+        "dropped": dropped,
+    }
+
+
+def run_broker_ingest(
+    messages: list,
+    folder_path: str,
+    qos: int = 0,
+    timeout: float = 60,
+    **recorder_options,
+) -> dict:
+    """Publishes messages through an in-process `MqttBroker` to a `Recorder` and measures the end to end rate.
+
+    Unlike `run_ingest` this includes the MQTT client of the recorder (the socket, paho's packet parsing and its
+    network thread), so it shows what the recorder sustains on a real connection. Each call is not timed.
+
+    Parameters
+    ----------
+    messages : List(`paho.mqtt.client.MQTTMessage`)
+        Messages to publish, see `synthetic_messages`
+    folder_path : str
+        Folder the log is written to
+    qos : int
+        MQTT quality of service of the publishes (the recorder subscribes with QoS 0, so only the publisher waits
+        for acknowledgements)
+    timeout : float
+        Maximum time in seconds to wait for the recorder to receive every message
+    recorder_options
+        Options passed on to the `Recorder` (log format, compression, flush size...)
+
+    Returns
+    -------
+    dict
+        The same metrics as `run_ingest`, with ingest_seconds measured from the first publish until the recorder
+        has received every message (or the timeout), None per message costs and the messages that never arrived
+        counted as dropped
+    """
+    with MqttBroker() as broker:
+        recorder = Recorder(
+            folder_path,
+            broker_address=broker.host,
+            broker_port=broker.port,
+            **recorder_options,
+        )
+        recorder.start()
+
+        connected = threading.Event()
+        publisher = mqtt.Client()
+        publisher.on_connect = lambda client, userdata, flags, rc: connected.set()
+        publisher.connect(broker.host, broker.port)
+        publisher.loop_start()
+
+        # Wait for the recorder to subscribe before publishing anything
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and not (
+            connected.is_set()
+            and (not messages or broker.subscribers(messages[0].topic))
+        ):
+            time.sleep(0.01)
+
+        start = time.perf_counter()
+        for message in messages:
+            publisher.publish(message.topic, message.payload, qos=qos)
+
+        while (
+            recorder.stats["queued"] + recorder.stats["dropped"] < len(messages)
+            and time.monotonic() < deadline + timeout
+        ):
+            time.sleep(0.001)
+        ingest_seconds = time.perf_counter() - start
+
+        publisher.loop_stop()
+        publisher.disconnect()
+
+        stats = recorder.stats
+        drain_start = time.perf_counter()
+        recorder.stop()
+        drain_seconds = time.perf_counter() - drain_start
+
+    bytes_written = recorder._LOG_SESSION.bytes
+    return {
+        "messages": len(messages),
+        "ingest_seconds": ingest_seconds,
+        "drain_seconds": drain_seconds,
+        "msgs_per_s": len(messages) / ingest_seconds if ingest_seconds else None,
+        "end_to_end_msgs_per_s": (
+            len(messages) / (ingest_seconds + drain_seconds)
+            if ingest_seconds + drain_seconds
+            else None
+        ),
+        "p50_us": None,
+        "p99_us": None,
+        "max_us": None,
+        "bytes_written": bytes_written,
+        "bytes_per_message": bytes_written / len(messages) if messages else None,
+        "dropped": len(messages) - stats["queued"],
+    }
+
+
+def run_benchmark(
+    messages: int = 100000,
+    modules: list = (1, 2, 3, 4),
+    payload_size: int = None,
+    repeat: int = 3,
+    seed: int = 0,
+    folder_path: str = None,
+    broker: bool = False,
+    qos: int = 0,
+    **recorder_options,
+) -> dict:
+    """Runs the ingest benchmark several times on the same synthetic messages.
+
+    Every run records into a new folder. The reported metrics are the medians of the runs, which are much steadier
+    than a single run, and the result also holds the settings, commit, Python version and machine so that results
+    saved on different commits can be compared with `compare_results`.
+
+    Parameters
+    ----------
+    messages : int
+        Number of messages injected per run
+    modules : List(int)
+        Ids of the fake modules sending data
+    payload_size : int
+        Pad every payload to at least this many bytes (None keeps the natural V3_fake_module sizes)
+    repeat : int
+        Number of runs
+    seed : int
+        Seed of the synthetic messages
+    folder_path : str
+        Folder the logs are written to (None uses a temporary folder that is deleted afterwards)
+    broker : bool
+        Publish the messages through an in-process broker (`run_broker_ingest`) instead of injecting them into
+        `_on_message` (`run_ingest`)
+    qos : int
+        MQTT quality of service of the publishes through the broker
+    recorder_options
+        Options passed on to the `Recorder` (log format, compression, flush size...)
+
+    Returns
+    -------
+    dict
+        settings, environment, runs (the result of every run) and the median of every metric of the runs
+    """
+    synthetic = synthetic_messages(messages, modules, payload_size, seed=seed)
+
+    runs = []
+    with tempfile.TemporaryDirectory() as temp_path:
+        for run in range(repeat):
+            run_path = os.path.join(folder_path or temp_path, f"run_{run}")
+            if broker:
+                runs.append(
+                    run_broker_ingest(synthetic, run_path, qos, **recorder_options)
+                )
+            else:
+                runs.append(run_ingest(synthetic, run_path, **recorder_options))
+
+    result = {
+        "settings": {
+            "benchmark": "ingest",
+            "messages": messages,
+            "modules": list(modules),
+            "payload_size": payload_size,
+            "repeat": repeat,
+            "seed": seed,
+            "broker": broker,
+            "qos": qos if broker else None,
+            "recorder_options": recorder_options,
+        },
+        "environment": environment(),
+        "runs": runs,
+    }
+    result.update(_medians(runs))
+    return result
+
+
+def _topic_object_dispatch(topic: str, topics) -> tuple:
+    """Dispatches a wireless module topic by comparing it with new mhp topic objects, the way
+    `mqtt_wireless_logger.on_message` did before it had a routing table (the reference of `run_dispatch_benchmark`).
+    topics is the mhp topics module.
+    """
+    module_id_num = topic.split("/")[3]
+    module_id_str = "M" + module_id_num
+    if topics.WirelessModule.id(module_id_num).start == topic:
+        return module_id_str, "start"
+    elif topics.WirelessModule.id(module_id_num).stop == topic:
+        return module_id_str, "stop"
+    elif topics.WirelessModule.id(module_id_num).data == topic:
+        return module_id_str, "data"
+    elif topics.WirelessModule.id(module_id_num).battery == topic:
+        return module_id_str, "battery"
+    return module_id_str, None
+
+
+def run_dispatch_benchmark(
+    messages: int = 100000,
+    modules: list = (1, 2, 3, 4),
+    repeat: int = 3,
+    seed: int = 0,
+) -> dict:
+    """Measures the cost of dispatching a message to its handler in `mqtt_wireless_logger`.
+
+    Every run looks up the route of the topic of every synthetic message with `mqtt_wireless_logger.route` (the
+    handlers are not called), then dispatches the same topics by comparing them with mhp topic objects as a reference.
+    The routes of the modules are worked out in the first run, the median per message cost of the runs is reported.
+
+    Parameters
+    ----------
+    messages : int
+        Number of messages dispatched per run
+    modules : List(int)
+        Ids of the fake modules sending data
+    repeat : int
+        Number of runs
+    seed : int
+        Seed of the synthetic messages
+
+    Returns
+    -------
+    dict
+        settings, environment, runs, the median dispatch_ns (routing table) and topic_objects_ns (reference) of the
+        runs in nanoseconds per message, and the speedup of the routing table
+    """
+    # Imported here as the wireless logger needs the mhp topics
+    from das import mqtt_wireless_logger
+    from mhp import topics
+
+    mqtt_topics = [
+        message.topic for message in synthetic_messages(messages, modules, seed=seed)
+    ]
+
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        for mqtt_topic in mqtt_topics:
+            mqtt_wireless_logger.route(mqtt_topic)
+        routed = time.perf_counter_ns()
+        for mqtt_topic in mqtt_topics:
+            _topic_object_dispatch(mqtt_topic, topics)
+        end = time.perf_counter_ns()
+
+        runs.append(
+            {
+                "dispatch_ns": (routed - start) / len(mqtt_topics),
+                "topic_objects_ns": (end - routed) / len(mqtt_topics),
+            }
+        )
+
+    result = {
+        "settings": {
+            "benchmark": "dispatch",
+            "messages": messages,
+            "modules": list(modules),
+            "repeat": repeat,
+            "seed": seed,
+        },
+        "environment": environment(),
+        "runs": runs,
+    }
+    result.update(_medians(runs))
+    result["speedup"] = result["topic_objects_ns"] / result["dispatch_ns"]
+    return result
+
+
+def environment() -> dict:
+    """Commit, Python version and machine a benchmark runs on, with the current time."""
+    return {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+        "time": time.time(),
+    }
+
+
+def _medians(runs: list) -> dict:
+    """Median of every metric of the runs (None if it was not measured in any run)."""
+    medians = {}
+    for metric in runs[0]:
+        values = [run[metric] for run in runs if run[metric] is not None]
+        medians[metric] = statistics.median(values) if values else None
+    return medians
+
+
+def compare_results(baseline: dict, result: dict, tolerance: float = 0.1) -> list:
+    """Compares a benchmark result with a baseline saved earlier (e.g. on the previous commit).
+
+    Parameters
+    ----------
+    baseline : dict
+        Result of `run_benchmark` (or `run_dispatch_benchmark`) to compare against
+    result : dict
+        Result of `run_benchmark` (or `run_dispatch_benchmark`) being checked
+    tolerance : float
+        Relative change of a metric in the wrong direction that counts as a regression (0.1 is 10%)
+
+    Returns
+    -------
+    list(dict)
+        metric, baseline, result, change (relative) and regression (bool) of every compared metric
+    """
+    # Settings added since the baseline was saved are not compared, so older baselines stay usable
+    baseline_settings = baseline.get("settings", {})
+    settings = result.get("settings", {})
+    if any(
+        baseline_settings[key] != settings[key]
+        for key in baseline_settings.keys() & settings.keys()
+    ):
+        raise ValueError(
+            "The baseline was run with different settings, the results are not comparable"
+        )
+
+    comparison = []
+    for metric, higher_is_better in COMPARED_METRICS.items():
+        before = baseline.get(metric)
+        after = result.get(metric)
+        if not before or after is None:
+            continue
+
+        change = (after - before) / before
+        worse = -change if higher_is_better else change
+        comparison.append(
+            {
+                "metric": metric,
+                "baseline": before,
+                "result": after,
+                "change": change,
+                "regression": worse > tolerance,
+            }
+        )
+    return comparison
@@ -0,0 +1,252 @@
+import json
+import os
+import re
+import sqlite3
+import time
+
+from das.utils.topic_filter import TopicFilter
+
+# Name of the catalog database inside a log folder
+CATALOG_FILENAME = "catalog.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sequences (
+    name TEXT PRIMARY KEY,
+    last_num INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS logs (
+    sequence TEXT NOT NULL,
+    log_num INTEGER NOT NULL,
+    filepath TEXT,
+    status TEXT NOT NULL,
+    start_time REAL,
+    duration REAL,
+    messages INTEGER,
+    bytes INTEGER,
+    topics TEXT,
+    subscriptions TEXT,
+    PRIMARY KEY (sequence, log_num)
+);
+"""
+
+# Columns returned for each log by `LogCatalog.find`
+LOG_COLUMNS = [
+    "sequence",
+    "log_num",
+    "filepath",
+    "status",
+    "start_time",
+    "duration",
+    "messages",
+    "bytes",
+    "topics",
+    "subscriptions",
+]
+
+
+class LogCatalog:
+    """Persistent catalog of the logs stored in a folder.
+
+    The catalog is a small SQLite database that hands out log numbers atomically (so several recorders can start
+    at once without scanning the folder or racing each other) and keeps metadata about every log so that logs can
+    be searched without opening them. Log numbers are allocated per sequence (e.g. "log" for N_log.csv and
+    "wireless" for N_M1.csv), the first allocation of a sequence continues on from the files already in the folder.
+
+    Parameters
+    ----------
+    folder_path : str
+        Filepath of the folder holding the logs (and the catalog database)
+    catalog_path : str
+        Filepath of the catalog database (defaults to catalog.sqlite inside folder_path)
+    """
+
+    def __init__(self, folder_path: str, catalog_path: str = None) -> None:
+        self.FOLDER_PATH = folder_path
+        self.CATALOG_PATH = catalog_path or os.path.join(folder_path, CATALOG_FILENAME)
+
+        connection = self._connect()
+        try:
+            connection.executescript(_SCHEMA)
+        finally:
+            connection.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Opens a short lived connection (safe to use from any thread or process)."""
+        # Transactions are managed explicitly (isolation_level=None) so allocations can take the write lock early
+        connection = sqlite3.connect(
+            self.CATALOG_PATH, timeout=30, isolation_level=None
+        )
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def _scan_last_num(self, pattern: str) -> int:
+        """Finds the highest log number already in the folder (only used to seed a new sequence)."""
+        last_num = 0
+        for filename in os.listdir(self.FOLDER_PATH):
+            match = re.match(pattern, filename)
+            if match:
+                last_num = max(last_num, int(match.group(1)))
+
+        return last_num
+
+    def allocate(
+        self, sequence: str = "log", seed_pattern: str = r"(\d+)_log\.", **metadata
+    ) -> int:
+        """Atomically allocates the next log number of a sequence and registers it as recording.
+
+        Parameters
+        ----------
+        sequence : str
+            Name of the number sequence
+        seed_pattern : str
+            Regular expression matching existing log filenames (group 1 is the log number), only used the first
+            time a sequence is allocated from
+        metadata
+            Initial metadata of the log, see `update`
+
+        Returns
+        -------
+        int
+            The allocated log number
+        """
+        connection = self._connect()
+        try:
+            # Take the write lock up front so that concurrent allocations are serialised
+            connection.execute("BEGIN IMMEDIATE")
+            row = connection.execute(
+                "SELECT last_num FROM sequences WHERE name = ?", (sequence,)
+            ).fetchone()
+            last_num = row["last_num"] if row else self._scan_last_num(seed_pattern)
+
+            log_num = last_num + 1
+            connection.execute(
+                "INSERT OR REPLACE INTO sequences (name, last_num) VALUES (?, ?)",
+                (sequence, log_num),
+            )
+            connection.execute(
+                "INSERT OR REPLACE INTO logs (sequence, log_num, status, start_time) VALUES (?, ?, ?, ?)",
+                (sequence, log_num, "recording", time.time()),
+            )
+            self._update(connection, sequence, log_num, metadata)
+            connection.execute("COMMIT")
+
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+        finally:
+            connection.close()
+
+        return log_num
+
+    def update(self, log_num: int, sequence: str = "log", **metadata) -> None:
+        """Updates the metadata of a log.
+
+        Parameters
+        ----------
+        log_num : int
+            Number of the log
+        sequence : str
+            Name of the number sequence the log belongs to
+        metadata
+            Any of filepath, status, start_time (unix time), duration (seconds), messages, bytes, topics (list) and
+            subscriptions (list)
+        """
+        connection = self._connect()
+        try:
+            self._update(connection, sequence, log_num, metadata)
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _update(connection, sequence: str, log_num: int, metadata: dict) -> None:
+        """Writes metadata columns of a log using an open connection."""
+        if not metadata:
+            return
+
+        unknown = set(metadata) - set(LOG_COLUMNS[2:])
+        if unknown:
+            raise ValueError(f"Unknown log metadata {sorted(unknown)}")
+
+        for key in ("topics", "subscriptions"):
+            if key in metadata and metadata[key] is not None:
+                metadata[key] = json.dumps(sorted(metadata[key]))
+
+        assignments = ", ".join(f"{key} = ?" for key in metadata)
+        connection.execute(
+            f"UPDATE logs SET {assignments} WHERE sequence = ? AND log_num = ?",
+            (*metadata.values(), sequence, log_num),
+        )
+
+    def find(
+        self,
+        sequence: str = None,
+        log_num: int = None,
+        topic: str = None,
+        since: float = None,
+        until: float = None,
+    ) -> list:
+        """Searches the catalog.
+
+        Parameters
+        ----------
+        sequence : str
+            Only return logs from this sequence
+        log_num : int
+            Only return the log with this number
+        topic : str
+            Only return logs that recorded a topic containing this string, or matching it if it is a topic filter
+            with + or # wildcards
+        since : float
+            Only return logs started at or after this unix time
+        until : float
+            Only return logs started before this unix time
+
+        Returns
+        -------
+        list(dict)
+            The matching logs ordered by start time, with topics and subscriptions as lists
+        """
+        # Wildcard topic filters are matched against the topics of each log after the query
+        topic_filter = None
+        if topic is not None and ("+" in topic or "#" in topic):
+            topic_filter = TopicFilter([topic])
+            topic = None
+
+        conditions = []
+        parameters = []
+        for column, operator, value in (
+            ("sequence", "=", sequence),
+            ("log_num", "=", log_num),
+            ("topics", "LIKE", None if topic is None else f"%{topic}%"),
+            ("start_time", ">=", since),
+            ("start_time", "<", until),
+        ):
+            if value is not None:
+                conditions.append(f"{column} {operator} ?")
+                parameters.append(value)
+
+        query = f"SELECT {', '.join(LOG_COLUMNS)} FROM logs"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY start_time, sequence, log_num"
+
+        connection = self._connect()
+        try:
+            rows = connection.execute(query, parameters).fetchall()
+        finally:
+            connection.close()
+
+        logs = []
+        for row in rows:
+            log = dict(row)
+            for key in ("topics", "subscriptions"):
+                log[key] = json.loads(log[key]) if log[key] else []
+
+            if topic_filter is not None and not any(
+                topic_filter.matches(log_topic) for log_topic in log["topics"]
+            ):
+                continue
+            logs.append(log)
+
+        return logs
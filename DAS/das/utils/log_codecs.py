@@ -0,0 +1,322 @@
+import bz2
+import gzip
+import io
+import logging
+import lzma
+import os
+import zlib
+
+
+class Codec:
+    """Base class for a log compression codec.
+
+    Compressed logs are written as a sequence of independently decompressable blocks, so a crash only loses the
+    block that was being written. A codec only has to compress one block at a time and provide a streaming
+    decompressor (with the `decompress`, `eof` and `unused_data` interface of the stdlib decompressors) that
+    stops at the end of a block.
+
+    Attributes
+    ----------
+    NAME : str
+        Name used to select the codec (e.g. Recorder(compression="gzip"))
+    EXTENSION : str
+        File extension added to compressed logs (e.g. ".gz")
+    """
+
+    NAME = None
+    EXTENSION = None
+
+    def compress(self, data: bytes) -> bytes:
+        """Compresses a block of data into a block that can be decompressed on its own."""
+        raise NotImplementedError
+
+    def decompressor(self):
+        """Creates a decompressor for a single block."""
+        raise NotImplementedError
+
+
+class GzipCodec(Codec):
+    """Gzip codec, each block is a gzip member so the whole log is also a valid .gz file."""
+
+    NAME = "gzip"
+    EXTENSION = ".gz"
+
+    def __init__(self, level: int = 6) -> None:
+        self._LEVEL = level
+
+    def compress(self, data: bytes) -> bytes:
+        return gzip.compress(data, compresslevel=self._LEVEL, mtime=0)
+
+    def decompressor(self):
+        # wbits=31 reads a single gzip member (header and trailer included)
+        return zlib.decompressobj(wbits=31)
+
+
+class Bz2Codec(Codec):
+    """Bzip2 codec, each block is a bzip2 stream so the whole log is also a valid .bz2 file."""
+
+    NAME = "bz2"
+    EXTENSION = ".bz2"
+
+    def __init__(self, level: int = 9) -> None:
+        self._LEVEL = level
+
+    def compress(self, data: bytes) -> bytes:
+        return bz2.compress(data, compresslevel=self._LEVEL)
+
+    def decompressor(self):
+        return bz2.BZ2Decompressor()
+
+
+class LzmaCodec(Codec):
+    """Xz codec, each block is a xz stream so the whole log is also a valid .xz file."""
+
+    NAME = "xz"
+    EXTENSION = ".xz"
+
+    def __init__(self, preset: int = 6) -> None:
+        self._PRESET = preset
+
+    def compress(self, data: bytes) -> bytes:
+        return lzma.compress(data, preset=self._PRESET)
+
+    def decompressor(self):
+        return lzma.LZMADecompressor()
+
+
+# Registered codecs by name
+CODECS = {}
+
+
+def register_codec(codec: Codec) -> None:
+    """Makes a codec available to `Recorder`, `Playback` and the log tools.
+
+    Parameters
+    ----------
+    codec : `Codec`
+        Codec instance with a unique NAME and EXTENSION
+    """
+    CODECS[codec.NAME] = codec
+
+
+register_codec(GzipCodec())
+register_codec(Bz2Codec())
+register_codec(LzmaCodec())
+
+
+def get_codec(name: str) -> Codec:
+    """Finds a registered codec by name."""
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise ValueError(f"Unknown codec {name}, expected one of {list(CODECS)}")
+
+
+def detect_codec(filepath: str) -> Codec:
+    """Finds the codec of a compressed log from its extension.
+
+    Returns
+    -------
+    Codec
+        The codec, or None if the file is not compressed
+    """
+    for codec in CODECS.values():
+        if filepath.endswith(codec.EXTENSION):
+            return codec
+
+    return None
+
+
+def strip_codec_extension(filepath: str) -> str:
+    """Removes the compression extension (if any) from a filepath."""
+    codec = detect_codec(filepath)
+    if codec is None:
+        return filepath
+
+    return filepath[: -len(codec.EXTENSION)]
+
+
+class CompressedFile:
+    """Append-only file that is written as independently decompressable blocks.
+
+    Writes are buffered in memory and compressed into a block once `block_size` bytes are waiting and the file is
+    flushed, or when the file is synced or closed.
+
+    Parameters
+    ----------
+    filepath : str
+        Filepath of the compressed file
+    codec : `Codec`
+        Codec used to compress each block
+    block_size : int
+        Amount of uncompressed data in bytes collected before a block is written on flush
+
+    Attributes
+    ----------
+    _FILE : `File`
+        The underlying binary file
+    _pending : list(bytes)
+        Data written since the last block
+    """
+
+    def __init__(self, filepath: str, codec: Codec, block_size: int = 65536) -> None:
+        self.name = filepath
+        self._CODEC = codec
+        self._BLOCK_SIZE = block_size
+        self._FILE = open(filepath, "ab")
+        self._pending = []
+        self._pending_size = 0
+
+    def write(self, data) -> int:
+        """Buffers data (str is encoded as utf-8) to be written in the next block."""
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+
+        self._pending.append(data)
+        self._pending_size += len(data)
+        return len(data)
+
+    def _write_block(self) -> None:
+        """Compresses everything pending into a block and appends it to the file."""
+        if not self._pending:
+            return
+
+        self._FILE.write(self._CODEC.compress(b"".join(self._pending)))
+        self._pending = []
+        self._pending_size = 0
+
+    def flush(self) -> None:
+        """Writes a block if enough data is pending and flushes the file."""
+        if self._pending_size >= self._BLOCK_SIZE:
+            self._write_block()
+        self._FILE.flush()
+
+    def sync(self) -> None:
+        """Writes everything pending as a block and forces the file to disk."""
+        self._write_block()
+        self._FILE.flush()
+        os.fsync(self._FILE.fileno())
+
+    def tell(self) -> int:
+        """Compressed size of the file so far."""
+        return self._FILE.tell()
+
+    def fileno(self) -> int:
+        return self._FILE.fileno()
+
+    def close(self) -> None:
+        """Writes everything pending as a block and closes the file."""
+        if self._FILE.closed:
+            return
+
+        self._write_block()
+        self._FILE.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class BlockReader(io.RawIOBase):
+    """Raw stream that decompresses a block compressed file.
+
+    A block cut short at the end of the file (or a corrupt block) ends the stream with a warning, so everything up
+    to the last complete block can still be read. Data is only handed out once its whole block has been
+    decompressed, so the stream always ends on a block boundary.
+    """
+
+    def __init__(self, filepath: str, codec: Codec) -> None:
+        self.name = filepath
+        self._CODEC = codec
+        self._FILE = open(filepath, "rb")
+        self._decompressor = None
+        self._buffer = bytearray()
+        self._block = bytearray()
+        self._done = False
+
+        # Offset of the end of the last complete block in the compressed file
+        self.complete_offset = 0
+        self._consumed = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._buffer and not self._done:
+            self._fill()
+
+        size = min(len(buffer), len(self._buffer))
+        buffer[:size] = self._buffer[:size]
+        del self._buffer[:size]
+        return size
+
+    def _fill(self) -> None:
+        """Decompresses the next chunk of the file into the buffer."""
+        chunk = self._FILE.read(65536)
+        if not chunk:
+            if self._decompressor is not None:
+                logging.warning(
+                    f"{self.name} ends with an incomplete block at byte {self.complete_offset}"
+                )
+            self._done = True
+            return
+
+        data = chunk
+        while data:
+            if self._decompressor is None:
+                self._decompressor = self._CODEC.decompressor()
+
+            try:
+                self._block += self._decompressor.decompress(data)
+            except (OSError, EOFError, ValueError, zlib.error, lzma.LZMAError) as e:
+                logging.warning(
+                    f"{self.name} has a corrupt block at byte {self.complete_offset}: {e}"
+                )
+                self._done = True
+                return
+
+            if self._decompressor.eof:
+                data = self._decompressor.unused_data
+                self._decompressor = None
+                self._buffer += self._block
+                self._block = bytearray()
+                self.complete_offset = self._consumed + len(chunk) - len(data)
+            else:
+                data = b""
+
+        self._consumed += len(chunk)
+
+    def close(self) -> None:
+        self._FILE.close()
+        super().close()
+
+
+def open_compressed(filepath: str, mode: str = "rb", codec: Codec = None):
+    """Opens a block compressed file for reading.
+
+    Parameters
+    ----------
+    filepath : str
+        Filepath of the compressed file
+    mode : str
+        "rb" for a binary stream or "r" for a text stream
+    codec : `Codec`
+        Codec of the file (detected from the extension if not given)
+
+    Returns
+    -------
+    `File`
+        Readable file object of the decompressed data
+    """
+    if codec is None:
+        codec = detect_codec(filepath)
+        if codec is None:
+            raise ValueError(f"{filepath} does not have a compressed file extension")
+
+    stream = io.BufferedReader(BlockReader(filepath, codec))
+    if mode == "rb":
+        return stream
+
+    return io.TextIOWrapper(stream, encoding="utf-8", newline="")
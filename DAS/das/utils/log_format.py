@@ -0,0 +1,587 @@
+import csv
+import io
+import logging
+import os
+import struct
+import zlib
+
+from das.utils.log_codecs import CompressedFile, detect_codec, open_compressed
+
+CsvConfig = {
+    "delimiter": ",",
+    "quotechar": "`",
+    "quoting": csv.QUOTE_ALL,
+    "skipinitialspace": True,
+    "fieldnames": ["time_delta", "mqtt_topic", "message"],
+}
+
+# Binary log layout
+# -----------------
+# The file starts with BINARY_MAGIC followed by a sequence of records:
+#   u32 body length | body | u32 crc32 of body
+# The first byte of the body is the record type:
+#   TOPIC:   u16 topic id | utf-8 topic string
+#            Interns a topic into the dictionary table, written the first time the topic is seen
+#   MESSAGE: i64 nanoseconds since the previous message | u16 topic id | raw payload bytes
+# All integers are little endian.
+BINARY_MAGIC = b"MHPLOG\x01\n"
+RECORD_HEADER = struct.Struct("<I")
+RECORD_CRC = struct.Struct("<I")
+TOPIC_RECORD = struct.Struct("<BH")
+MESSAGE_RECORD = struct.Struct("<BqH")
+RECORD_TYPE_TOPIC = 1
+RECORD_TYPE_MESSAGE = 2
+
+# Supported log formats and the file extension used for each one
+LOG_FORMATS = {"csv": "csv", "binary": "bin"}
+
+# Extension of the sidecar time index written next to a log (e.g. 1_log.csv.idx), see `das.utils.log_index`
+INDEX_EXTENSION = ".idx"
+
+
+class CsvLogWriter:
+    """Write (time_delta, mqtt_topic, message) records to a csv log.
+
+    Parameters
+    ----------
+    log_file : `File`
+        Log file opened in text mode
+    """
+
+    def __init__(self, log_file) -> None:
+        self._WRITER = csv.DictWriter(
+            log_file,
+            delimiter=CsvConfig["delimiter"],
+            quotechar=CsvConfig["quotechar"],
+            quoting=CsvConfig["quoting"],
+            fieldnames=CsvConfig["fieldnames"],
+        )
+
+    def write_header(self) -> None:
+        """Writes the csv headers, must be called once on a new log file."""
+        self._WRITER.writeheader()
+
+    def write_records(self, records: list) -> None:
+        """Writes a list of (time_delta, mqtt_topic, message) records, bytes messages are decoded as utf-8."""
+        rows = []
+        for time_delta, mqtt_topic, message in records:
+            if isinstance(message, bytes):
+                message = message.decode("utf-8", errors="replace")
+
+            rows.append(
+                {"time_delta": time_delta, "mqtt_topic": mqtt_topic, "message": message}
+            )
+
+        self._WRITER.writerows(rows)
+
+
+class BinaryLogWriter:
+    """Write (time_delta, mqtt_topic, message) records to a binary log.
+
+    Parameters
+    ----------
+    log_file : `File`
+        Log file opened in binary mode
+
+    Attributes
+    ----------
+    _topic_ids : dict
+        Topics that have been interned so far, mapped to their topic id
+    _previous_ns : int
+        Time delta of the previous message in nanoseconds
+    """
+
+    def __init__(self, log_file) -> None:
+        self._LOG_FILE = log_file
+        self._topic_ids = {}
+        self._previous_ns = 0
+
+    def write_header(self) -> None:
+        """Writes the file signature, must be called once on a new log file."""
+        self._LOG_FILE.write(BINARY_MAGIC)
+
+    def write_records(self, records: list) -> None:
+        """Writes a list of (time_delta, mqtt_topic, message) records, str messages are encoded as utf-8."""
+        chunks = []
+        for time_delta, mqtt_topic, message in records:
+            topic_id = self._topic_ids.get(mqtt_topic)
+            if topic_id is None:
+                topic_id = len(self._topic_ids)
+                if topic_id > 0xFFFF:
+                    raise ValueError("Binary logs support at most 65536 topics")
+
+                self._topic_ids[mqtt_topic] = topic_id
+                chunks.append(
+                    _pack_record(
+                        TOPIC_RECORD.pack(RECORD_TYPE_TOPIC, topic_id)
+                        + mqtt_topic.encode("utf-8")
+                    )
+                )
+
+            if isinstance(message, str):
+                message = message.encode("utf-8")
+
+            time_ns = round(time_delta * 1e9)
+            chunks.append(
+                _pack_record(
+                    MESSAGE_RECORD.pack(
+                        RECORD_TYPE_MESSAGE, time_ns - self._previous_ns, topic_id
+                    )
+                    + message
+                )
+            )
+            self._previous_ns = time_ns
+
+        self._LOG_FILE.write(b"".join(chunks))
+
+
+def _pack_record(body: bytes) -> bytes:
+    """Adds the length prefix and the crc to a record body."""
+    return (
+        RECORD_HEADER.pack(len(body))
+        + body
+        + RECORD_CRC.pack(zlib.crc32(body) & 0xFFFFFFFF)
+    )
+
+
+def create_log_writer(log_file, log_format: str):
+    """Creates the writer for a log format.
+
+    Parameters
+    ----------
+    log_file : `File`
+        Log file opened in the mode given by `log_file_mode`
+    log_format : str
+        One of LOG_FORMATS
+
+    Returns
+    -------
+    CsvLogWriter or BinaryLogWriter
+    """
+    if log_format == "csv":
+        return CsvLogWriter(log_file)
+    elif log_format == "binary":
+        return BinaryLogWriter(log_file)
+
+    raise ValueError(
+        f"Unknown log format {log_format}, expected one of {list(LOG_FORMATS)}"
+    )
+
+
+def log_file_mode(log_format: str) -> str:
+    """The mode to open a new log file of a log format with."""
+    return "ab" if log_format == "binary" else "a"
+
+
+def open_log_file(filepath: str, mode: str = "r"):
+    """Opens a log file for reading, transparently decompressing it if it has a codec extension (e.g. .gz).
+
+    Parameters
+    ----------
+    filepath : str
+        Filepath of the log file
+    mode : str
+        "r" for text or "rb" for binary
+
+    Returns
+    -------
+    `File`
+        Readable file object
+    """
+    codec = detect_codec(filepath)
+    if codec is not None:
+        return open_compressed(filepath, mode, codec)
+
+    if mode == "rb":
+        return open(filepath, "rb")
+
+    return open(filepath, "r", newline="")
+
+
+def detect_log_format(filepath: str) -> str:
+    """Detects the format of a log file from its signature.
+
+    Parameters
+    ----------
+    filepath : str
+        Filepath of the log file
+
+    Returns
+    -------
+    str
+        One of LOG_FORMATS
+    """
+    with open_log_file(filepath, "rb") as log_file:
+        signature = log_file.read(len(BINARY_MAGIC))
+
+    return "binary" if signature == BINARY_MAGIC else "csv"
+
+
+def _ends_with_newline(filepath: str) -> bool:
+    """Whether an uncompressed log ends with a complete line (compressed logs only hold complete records)."""
+    if detect_codec(filepath) is not None:
+        return True
+
+    with open(filepath, "rb") as log_file:
+        log_file.seek(0, os.SEEK_END)
+        if log_file.tell() == 0:
+            return True
+
+        log_file.seek(-1, os.SEEK_END)
+        return log_file.read(1) == b"\n"
+
+
+def _parse_csv_record(data: bytes) -> list:
+    """Parses the raw bytes of one csv record, returning None if it is not a complete three field record."""
+    try:
+        rows = list(
+            csv.reader(
+                io.StringIO(data.decode("utf-8")),
+                delimiter=CsvConfig["delimiter"],
+                quotechar=CsvConfig["quotechar"],
+                quoting=CsvConfig["quoting"],
+                skipinitialspace=CsvConfig["skipinitialspace"],
+            )
+        )
+    except (csv.Error, UnicodeDecodeError):
+        return None
+
+    if len(rows) != 1 or len(rows[0]) != len(CsvConfig["fieldnames"]):
+        return None
+
+    return rows[0]
+
+
+def scan_csv_records(stream):
+    """Scans the raw records of a csv log along with their byte offsets, stopping at the first incomplete record.
+
+    A record is complete once it ends with a newline outside of a quoted field (quotes are balanced) and parses
+    into the three log fields. The header is returned as the first record.
+
+    Parameters
+    ----------
+    stream : `File`
+        Binary stream of the log positioned at the start of a record
+
+    Yields
+    ------
+    tuple
+        (start offset, end offset, fields) with the offsets relative to the start of the stream
+    """
+    quote = CsvConfig["quotechar"].encode("utf-8")
+    start = 0
+    offset = 0
+    record = b""
+    quotes = 0
+    for line in stream:
+        offset += len(line)
+        record += line
+        quotes += line.count(quote)
+
+        # An odd number of quotes means a quoted field continues on the next line
+        if quotes % 2 or not line.endswith(b"\n"):
+            continue
+
+        fields = _parse_csv_record(record)
+        if fields is None:
+            return
+
+        yield start, offset, fields
+        start = offset
+        record = b""
+        quotes = 0
+
+
+def scan_binary_records(
+    stream, signature: bool = True, topics: int = 0, time_ns: int = 0
+):
+    """Scans the raw records of a binary log along with their byte offsets, stopping at the first invalid record.
+
+    Parameters
+    ----------
+    stream : `File`
+        Binary stream of the log, either at the start of the file or at a record
+    signature : bool
+        Whether the stream starts with the file signature (False when resuming at a record)
+    topics : int
+        Number of topics interned before the stream position
+    time_ns : int
+        Time delta in nanoseconds of the message before the stream position
+
+    Yields
+    ------
+    tuple
+        (start offset, end offset, record type, time_ns of the last message, body) with the offsets relative to
+        the start of the stream
+    """
+    offset = 0
+    if signature:
+        offset = len(BINARY_MAGIC)
+        if stream.read(offset) != BINARY_MAGIC:
+            return
+
+    while True:
+        header = stream.read(RECORD_HEADER.size)
+        if len(header) < RECORD_HEADER.size:
+            return
+
+        (length,) = RECORD_HEADER.unpack(header)
+        body = stream.read(length)
+        crc = stream.read(RECORD_CRC.size)
+        if (
+            length == 0
+            or len(body) < length
+            or len(crc) < RECORD_CRC.size
+            or RECORD_CRC.unpack(crc)[0] != zlib.crc32(body) & 0xFFFFFFFF
+        ):
+            return
+
+        record_type = body[0]
+        if record_type == RECORD_TYPE_MESSAGE:
+            _, delta_ns, topic_id = MESSAGE_RECORD.unpack_from(body)
+            if topic_id >= topics:
+                return
+            time_ns += delta_ns
+        elif record_type == RECORD_TYPE_TOPIC:
+            topics += 1
+        else:
+            return
+
+        end = offset + RECORD_HEADER.size + length + RECORD_CRC.size
+        yield offset, end, record_type, time_ns, body
+        offset = end
+
+
+def _check_seekable(filepath: str, offset: int) -> None:
+    """Raises a ValueError when asked to start part way through a compressed log."""
+    if offset and detect_codec(filepath) is not None:
+        raise ValueError(
+            f"{filepath} is compressed and can only be read from the start"
+        )
+
+
+def read_csv_log(filepath: str, offset: int = 0):
+    """Reads a csv log one record at a time.
+
+    A row that was only partly written (e.g. after a power loss) ends the log with a warning instead of being
+    misparsed, use `das.utils.log_recovery` to truncate the file to its last complete row.
+
+    Parameters
+    ----------
+    filepath : str
+        Filepath of the csv log
+    offset : int
+        Byte offset of the row to start reading at (e.g. from a `das.utils.log_index` entry), 0 reads the whole
+        log. Only uncompressed logs can be read from an offset.
+
+    Yields
+    ------
+    tuple
+        (time_delta, mqtt_topic, message) with time_delta as a float and message as a str
+    """
+    _check_seekable(filepath, offset)
+    complete = _ends_with_newline(filepath)
+
+    # Past the header the field names have to be given
+    fieldnames = None
+    if offset:
+        # A text file can only seek to a position returned by its tell, so the byte offset is sought in binary
+        binary_file = open_log_file(filepath, "rb")
+        binary_file.seek(offset)
+        log_file = io.TextIOWrapper(binary_file, newline="")
+        fieldnames = CsvConfig["fieldnames"]
+    else:
+        log_file = open_log_file(filepath, "r")
+
+    with log_file:
+        csv_reader = csv.DictReader(
+            log_file,
+            fieldnames=fieldnames,
+            delimiter=CsvConfig["delimiter"],
+            quotechar=CsvConfig["quotechar"],
+            quoting=CsvConfig["quoting"],
+            skipinitialspace=CsvConfig["skipinitialspace"],
+        )
+
+        # Rows are yielded one behind so that the last row can be dropped if it was cut short
+        previous = None
+        try:
+            for row in csv_reader:
+                if previous is not None:
+                    yield previous
+
+                previous = (float(row["time_delta"]), row["mqtt_topic"], row["message"])
+                if previous[1] is None or previous[2] is None:
+                    raise ValueError("missing fields")
+
+        except (csv.Error, ValueError, TypeError) as e:
+            logging.warning(
+                f"{filepath} has an incomplete or corrupt row at line {csv_reader.line_num}: {e}"
+            )
+            return
+
+        if previous is None:
+            return
+
+        if complete:
+            yield previous
+        else:
+            logging.warning(f"{filepath} ends with an incomplete row, skipping it")
+
+
+def read_binary_log(
+    filepath: str, offset: int = 0, topics: list = None, time_ns: int = 0
+):
+    """Reads a binary log one record at a time.
+
+    A record with a bad crc raises a ValueError, while a record cut short at the end of the file (e.g. after a
+    power loss) is skipped with a warning.
+
+    Parameters
+    ----------
+    filepath : str
+        Filepath of the binary log
+    offset : int
+        Byte offset of the record to start reading at (e.g. from a `das.utils.log_index` entry), 0 reads the whole
+        log. Only uncompressed logs can be read from an offset.
+    topics : List(str)
+        Topics interned before the offset, in topic id order
+    time_ns : int
+        Time delta in nanoseconds of the message before the offset
+
+    Yields
+    ------
+    tuple
+        (time_delta, mqtt_topic, message) with time_delta as a float and message as bytes
+    """
+    _check_seekable(filepath, offset)
+
+    with open_log_file(filepath, "rb") as log_file:
+        if offset:
+            log_file.seek(offset)
+            topics = list(topics or [])
+        else:
+            if log_file.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+                raise ValueError(f"{filepath} is not a binary log")
+
+            topics = []
+            time_ns = 0
+            offset = len(BINARY_MAGIC)
+
+        while True:
+            header = log_file.read(RECORD_HEADER.size)
+            if not header:
+                return
+
+            body = b""
+            crc = b""
+            if len(header) == RECORD_HEADER.size:
+                (length,) = RECORD_HEADER.unpack(header)
+                body = log_file.read(length)
+                crc = log_file.read(RECORD_CRC.size)
+
+            if len(crc) < RECORD_CRC.size:
+                logging.warning(
+                    f"{filepath} ends with an incomplete record at byte {offset}"
+                )
+                return
+
+            if RECORD_CRC.unpack(crc)[0] != zlib.crc32(body) & 0xFFFFFFFF:
+                raise ValueError(f"{filepath} has a corrupt record at byte {offset}")
+
+            record_offset = offset
+            offset += RECORD_HEADER.size + len(body) + RECORD_CRC.size
+
+            record_type = body[0]
+            if record_type == RECORD_TYPE_MESSAGE:
+                _, delta_ns, topic_id = MESSAGE_RECORD.unpack_from(body)
+                time_ns += delta_ns
+                yield time_ns / 1e9, topics[topic_id], body[MESSAGE_RECORD.size :]
+
+            elif record_type == RECORD_TYPE_TOPIC:
+                _, topic_id = TOPIC_RECORD.unpack_from(body)
+                if topic_id < len(topics):
+                    # Already known when reading from an offset
+                    continue
+
+                if topic_id != len(topics):
+                    raise ValueError(
+                        f"{filepath} has an out of order topic at byte {record_offset}"
+                    )
+                topics.append(body[TOPIC_RECORD.size :].decode("utf-8"))
+
+            else:
+                raise ValueError(
+                    f"{filepath} has an unknown record type at byte {record_offset}"
+                )
+
+
+def read_log(filepath: str):
+    """Reads a log of any format one record at a time, see `read_csv_log` and `read_binary_log`."""
+    if detect_log_format(filepath) == "binary":
+        return read_binary_log(filepath)
+
+    return read_csv_log(filepath)
+
+
+def convert_log(
+    input_filepath: str,
+    output_filepath: str,
+    log_format: str,
+    batch_size: int = 1000,
+    topic_filter=None,
+) -> int:
+    """Converts a log to another format without loading it all into memory.
+
+    Parameters
+    ----------
+    input_filepath : str
+        Filepath of the log to convert (any format)
+    output_filepath : str
+        Filepath of the new log (compressed if it ends in a codec extension such as .gz)
+    log_format : str
+        Format of the new log, one of LOG_FORMATS
+    batch_size : int
+        Number of records written at a time
+    topic_filter : `TopicFilter`
+        Only convert the messages whose topic passes this filter (None converts every message)
+
+    Returns
+    -------
+    int
+        Number of messages converted
+    """
+    # The time index of a previous log with the same name would not match the new log
+    if os.path.exists(output_filepath + INDEX_EXTENSION):
+        os.remove(output_filepath + INDEX_EXTENSION)
+
+    codec = detect_codec(output_filepath)
+    if codec is not None:
+        if os.path.exists(output_filepath):
+            os.remove(output_filepath)
+        output_file = CompressedFile(output_filepath, codec)
+    else:
+        output_file = open(output_filepath, log_file_mode(log_format).replace("a", "w"))
+
+    count = 0
+    with output_file as log_file:
+        writer = create_log_writer(log_file, log_format)
+        writer.write_header()
+
+        records = read_log(input_filepath)
+        if topic_filter is not None:
+            records = topic_filter.filter_records(records)
+
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                writer.write_records(batch)
+                log_file.flush()
+                count += len(batch)
+                batch = []
+
+        writer.write_records(batch)
+        count += len(batch)
+
+    return count
@@ -0,0 +1,271 @@
+from bisect import bisect_left
+import json
+import logging
+import os
+
+from das.utils.log_codecs import detect_codec
+from das.utils.log_format import (
+    INDEX_EXTENSION,
+    RECORD_TYPE_MESSAGE,
+    RECORD_TYPE_TOPIC,
+    TOPIC_RECORD,
+    detect_log_format,
+    read_binary_log,
+    read_csv_log,
+    scan_binary_records,
+    scan_csv_records,
+)
+
+# Default amount of log time in seconds between index entries
+INDEX_INTERVAL = 1.0
+
+
+def index_path(filepath: str) -> str:
+    """Filepath of the sidecar index of a log."""
+    return filepath + INDEX_EXTENSION
+
+
+class LogIndexer:
+    """Sparse time to byte offset index of a log, built while the log is written or scanned.
+
+    An entry is added at most every `interval` seconds of log time, each entry holds the time_delta of a record,
+    the byte offset it starts at and (for binary logs) the time in nanoseconds of the message before it, which is
+    all that is needed to start reading the log at that record. Binary logs also need the topic dictionary, so
+    the topics are kept in topic id order.
+
+    Parameters
+    ----------
+    log_format : str
+        Format of the indexed log, one of LOG_FORMATS
+    interval : float
+        Minimum amount of log time in seconds between entries
+    start_time : float
+        Unix time the log was started at (None if unknown)
+
+    Attributes
+    ----------
+    entries : list(list)
+        [time_delta, offset, time_ns] entries in log order
+    topics : List(str)
+        Topics of the log in topic id order (binary logs only)
+    size : int
+        Number of bytes of the log covered by the index
+    time_ns : int
+        Time delta in nanoseconds of the last message covered by the index
+    """
+
+    def __init__(
+        self,
+        log_format: str,
+        interval: float = INDEX_INTERVAL,
+        start_time: float = None,
+    ) -> None:
+        self.LOG_FORMAT = log_format
+        self.INTERVAL = interval
+        self.START_TIME = start_time
+        self.entries = []
+        self.topics = []
+        self.size = 0
+        self.time_ns = 0
+        self._topic_ids = set()
+        self._next_time_delta = None
+
+    def add(self, time_delta: float, offset: int, time_ns: int = 0) -> None:
+        """Adds an entry for the record at offset if the previous entry is at least `interval` seconds older.
+
+        Parameters
+        ----------
+        time_delta : float
+            Time delta of the record
+        offset : int
+            Byte offset of the start of the record
+        time_ns : int
+            Time delta in nanoseconds of the message before the record (binary logs only)
+        """
+        if self._next_time_delta is None or time_delta >= self._next_time_delta:
+            self.entries.append([time_delta, offset, time_ns])
+            self._next_time_delta = time_delta + self.INTERVAL
+
+    def add_topics(self, topics) -> None:
+        """Adds topics in the order they were first written (binary logs only)."""
+        for topic in topics:
+            if topic not in self._topic_ids:
+                self._topic_ids.add(topic)
+                self.topics.append(topic)
+
+    def save(self, filepath: str) -> None:
+        """Atomically writes the index to the sidecar file of a log.
+
+        Parameters
+        ----------
+        filepath : str
+            Filepath of the indexed log
+        """
+        index = {
+            "log_format": self.LOG_FORMAT,
+            "interval": self.INTERVAL,
+            "start_time": self.START_TIME,
+            "size": self.size,
+            "time_ns": self.time_ns,
+            "topics": self.topics,
+            "entries": self.entries,
+        }
+
+        temp_path = index_path(filepath) + ".tmp"
+        with open(temp_path, "w") as index_file:
+            json.dump(index, index_file)
+        os.replace(temp_path, index_path(filepath))
+
+    @classmethod
+    def load(cls, filepath: str):
+        """Loads the sidecar index of a log.
+
+        Returns
+        -------
+        LogIndexer
+            The index, or None if the log has no readable index
+        """
+        try:
+            with open(index_path(filepath), "r") as index_file:
+                index = json.load(index_file)
+
+            indexer = cls(index["log_format"], index["interval"], index["start_time"])
+            indexer.entries = index["entries"]
+            indexer.size = index["size"]
+            indexer.time_ns = index["time_ns"]
+            indexer.add_topics(index["topics"])
+
+        except (OSError, ValueError, KeyError) as e:
+            if os.path.exists(index_path(filepath)):
+                logging.warning(f"Ignoring unreadable index of {filepath}: {e}")
+            return None
+
+        if indexer.entries:
+            indexer._next_time_delta = indexer.entries[-1][0] + indexer.INTERVAL
+        return indexer
+
+    def scan(self, filepath: str) -> None:
+        """Extends the index over the part of a log written since it was last indexed, in one streaming pass.
+
+        Parameters
+        ----------
+        filepath : str
+            Filepath of the (uncompressed) log
+        """
+        size = self.size
+        with open(filepath, "rb") as log_file:
+            log_file.seek(size)
+
+            if self.LOG_FORMAT == "binary":
+                records = scan_binary_records(
+                    log_file,
+                    signature=size == 0,
+                    topics=len(self.topics),
+                    time_ns=self.time_ns,
+                )
+                for start, end, record_type, time_ns, body in records:
+                    if record_type == RECORD_TYPE_MESSAGE:
+                        self.add(time_ns / 1e9, size + start, self.time_ns)
+                        self.time_ns = time_ns
+                    elif record_type == RECORD_TYPE_TOPIC:
+                        self.add_topics([body[TOPIC_RECORD.size :].decode("utf-8")])
+                    self.size = size + end
+
+            else:
+                for start, end, fields in scan_csv_records(log_file):
+                    # The first record of the file is the header
+                    if size + start > 0:
+                        try:
+                            self.add(float(fields[0]), size + start)
+                        except ValueError:
+                            break
+                    self.size = size + end
+
+
+def load_index(filepath: str, interval: float = INDEX_INTERVAL):
+    """Loads the index of a log, building or extending it (and saving the sidecar) when needed.
+
+    An index saved while recording stays valid for the part of the log it covers, so after a crash only the rest
+    of the log is scanned.
+
+    Parameters
+    ----------
+    filepath : str
+        Filepath of the log
+    interval : float
+        Amount of log time in seconds between entries of a newly built index
+
+    Returns
+    -------
+    LogIndexer
+        The index, or None for compressed logs (which can only be read from the start)
+    """
+    if detect_codec(filepath) is not None:
+        return None
+
+    size = os.path.getsize(filepath)
+    indexer = LogIndexer.load(filepath)
+
+    # A log that shrank (e.g. it was recovered or rewritten) is indexed from scratch
+    if indexer is None or indexer.size > size:
+        indexer = LogIndexer(detect_log_format(filepath), interval)
+
+    if indexer.size < size:
+        indexer.scan(filepath)
+        try:
+            indexer.save(filepath)
+        except OSError as e:
+            logging.info(f"Could not save the index of {filepath}: {e}")
+
+    return indexer
+
+
+def read_log_range(
+    filepath: str, start_time_delta: float = None, end_time_delta: float = None
+):
+    """Reads the records of a log between two time deltas, seeking to the start with the log index.
+
+    Parameters
+    ----------
+    filepath : str
+        Filepath of the log
+    start_time_delta : float
+        Time delta of the first record to read (None reads from the start)
+    end_time_delta : float
+        Time delta of the last record to read (None reads to the end)
+
+    Yields
+    ------
+    tuple
+        (time_delta, mqtt_topic, message) records, see `das.utils.log_format.read_log`
+    """
+    log_format = detect_log_format(filepath)
+    entry = None
+    indexer = None
+    if start_time_delta is not None:
+        indexer = load_index(filepath)
+
+    if indexer is not None:
+        # The last entry strictly before the start, so records with the same time_delta are not skipped
+        position = bisect_left(indexer.entries, [start_time_delta]) - 1
+        if position >= 0:
+            entry = indexer.entries[position]
+
+    if entry is None:
+        records = (
+            read_binary_log(filepath)
+            if log_format == "binary"
+            else read_csv_log(filepath)
+        )
+    elif log_format == "binary":
+        records = read_binary_log(filepath, entry[1], indexer.topics, entry[2])
+    else:
+        records = read_csv_log(filepath, entry[1])
+
+    for record in records:
+        if start_time_delta is not None and record[0] < start_time_delta:
+            continue
+        if end_time_delta is not None and record[0] > end_time_delta:
+            return
+
+        yield record
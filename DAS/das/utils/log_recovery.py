@@ -0,0 +1,171 @@
+import io
+import json
+import logging
+import os
+
+from das.utils.log_codecs import BlockReader, detect_codec
+from das.utils.log_format import (
+    BINARY_MAGIC,
+    CsvConfig,
+    RECORD_TYPE_MESSAGE,
+    detect_log_format,
+    scan_binary_records,
+    scan_csv_records,
+)
+
+
+def _scan_csv(stream) -> tuple:
+    """Finds the end of the last complete record of a csv log in a single streaming pass.
+
+    Returns
+    -------
+    tuple
+        (offset after the last complete record, number of messages, time_delta of the last message)
+    """
+    valid_offset = 0
+    messages = 0
+    last_time_delta = None
+    for start, end, fields in scan_csv_records(stream):
+        if start == 0:
+            # The first record has to be the header
+            if fields != CsvConfig["fieldnames"]:
+                break
+        else:
+            try:
+                last_time_delta = float(fields[0])
+            except ValueError:
+                break
+            messages += 1
+
+        valid_offset = end
+
+    return valid_offset, messages, last_time_delta
+
+
+def _scan_binary(stream) -> tuple:
+    """Finds the end of the last complete record of a binary log in a single streaming pass.
+
+    Returns
+    -------
+    tuple
+        (offset after the last complete record, number of messages, time_delta of the last message)
+    """
+    if stream.peek(len(BINARY_MAGIC))[: len(BINARY_MAGIC)] != BINARY_MAGIC:
+        return 0, 0, None
+
+    valid_offset = len(BINARY_MAGIC)
+    messages = 0
+    last_time_delta = None
+    for _, end, record_type, time_ns, _ in scan_binary_records(stream):
+        if record_type == RECORD_TYPE_MESSAGE:
+            last_time_delta = time_ns / 1e9
+            messages += 1
+        valid_offset = end
+
+    return valid_offset, messages, last_time_delta
+
+
+def recover_log(filepath: str, dry_run: bool = False) -> dict:
+    """Truncates a log to its last complete record, e.g. after a power loss during recording.
+
+    The log is scanned once as a stream (it is never loaded into memory), so this works on multi-GB logs. Csv and
+    binary logs are cut after their last complete and valid record, compressed logs are cut after their last
+    complete block.
+
+    Parameters
+    ----------
+    filepath : str
+        Filepath of the log
+    dry_run : bool
+        Only report what would be lost without changing the file
+
+    Returns
+    -------
+    dict
+        Report with the filepath, log_format, total_bytes, valid_bytes, lost_bytes, messages (kept),
+        last_time_delta and truncated
+    """
+    log_format = detect_log_format(filepath)
+    total_bytes = os.path.getsize(filepath)
+    scan = _scan_binary if log_format == "binary" else _scan_csv
+
+    codec = detect_codec(filepath)
+    if codec is not None:
+        reader = BlockReader(filepath, codec)
+        with io.BufferedReader(reader) as stream:
+            _, messages, last_time_delta = scan(stream)
+
+            # Drain whatever the scan did not read to find the end of the last complete block
+            while stream.read(65536):
+                pass
+            valid_bytes = reader.complete_offset
+    else:
+        with open(filepath, "rb") as stream:
+            valid_bytes, messages, last_time_delta = scan(stream)
+
+    report = {
+        "filepath": filepath,
+        "log_format": log_format,
+        "total_bytes": total_bytes,
+        "valid_bytes": valid_bytes,
+        "lost_bytes": total_bytes - valid_bytes,
+        "messages": messages,
+        "last_time_delta": last_time_delta,
+        "truncated": False,
+    }
+
+    if valid_bytes < total_bytes and not dry_run:
+        os.truncate(filepath, valid_bytes)
+        report["truncated"] = True
+        logging.warning(
+            f"Truncated {filepath} to {valid_bytes} bytes, {total_bytes - valid_bytes} bytes were lost"
+        )
+
+    return report
+
+
+def recover_session(filepath: str, dry_run: bool = False) -> list:
+    """Recovers every segment of a session and rewrites its manifest with the recovered sizes and counts.
+
+    Parameters
+    ----------
+    filepath : str
+        Filepath of the session manifest (N_log.json) or of a single log file
+    dry_run : bool
+        Only report what would be lost without changing any file
+
+    Returns
+    -------
+    list(dict)
+        One report per log file, see `recover_log`
+    """
+    if not filepath.endswith(".json"):
+        return [recover_log(filepath, dry_run)]
+
+    with open(filepath, "r") as manifest_file:
+        manifest = json.load(manifest_file)
+
+    folder_path = os.path.dirname(filepath)
+    reports = []
+    for segment in manifest["segments"]:
+        segment_path = os.path.join(folder_path, segment["filename"])
+        if not os.path.exists(segment_path):
+            logging.warning(f"Segment {segment_path} is missing")
+            continue
+
+        report = recover_log(segment_path, dry_run)
+        reports.append(report)
+
+        segment["messages"] = report["messages"]
+        segment["bytes"] = report["valid_bytes"]
+        if report["last_time_delta"] is not None:
+            segment["end_time_delta"] = report["last_time_delta"]
+
+    if not dry_run:
+        manifest["recovered"] = True
+        temp_path = filepath + ".tmp"
+        with open(temp_path, "w") as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
+        os.replace(temp_path, filepath)
+
+    return reports
@@ -0,0 +1,496 @@
+from datetime import datetime
+import heapq
+import json
+import logging
+from operator import itemgetter
+import os
+import re
+
+from das.utils.log_catalog import CATALOG_FILENAME, LogCatalog
+from das.utils.log_codecs import CompressedFile, get_codec
+from das.utils.log_index import LogIndexer, read_log_range
+from das.utils.log_format import (
+    LOG_FORMATS,
+    create_log_writer,
+    log_file_mode,
+)
+
+
+class LogSession:
+    """The log file(s) of one recording, optionally rolled into segments.
+
+    Without any segment limits the session is a single N_log.<ext> file (the classic layout). With a limit the
+    session is written to N_log.000.<ext>, N_log.001.<ext>, ... and described by a N_log.json manifest that lists
+    every segment with its time range, message count and size. The manifest is rewritten every time a segment is
+    rolled so that a crash only loses the segment being written.
+
+    Parameters
+    ----------
+    folder_path : str
+        Filepath of the folder where the logs are to be stored
+    log_num : int
+        Number of the log, used to name the files
+    log_format : str
+        On-disk format of the log, one of LOG_FORMATS
+    segment_size : int
+        Roll to a new segment once the current one holds this many bytes (checked after each write)
+    segment_duration : float
+        Roll to a new segment once the current one spans this many seconds
+    segment_topics : List(str)
+        Roll to a new segment before any message on these topics (e.g. the DAS start and stop topics)
+    compression : str
+        Name of a registered codec (e.g. "gzip") to compress the log with, None writes an uncompressed log
+    compression_block_size : int
+        Amount of uncompressed data in bytes collected into each independently decompressable block
+
+    Attributes
+    ----------
+    SEGMENTED : bool
+        Whether the session is split into segments (and has a manifest)
+    _segments : list(dict)
+        Manifest entries of the segments written so far, the last one is the current segment
+    _LOG_FILE : `File` or `CompressedFile`
+        Open file of the current segment
+    _LOG_FILE_WRITER : `CsvLogWriter` or `BinaryLogWriter`
+        Writer for the current segment
+    _INDEXER : `LogIndexer`
+        Sparse time index of the current segment, saved next to it on checkpoints and when it is closed (None for
+        compressed logs, which can only be read from the start)
+    """
+
+    def __init__(
+        self,
+        folder_path: str,
+        log_num: int,
+        log_format: str = "csv",
+        segment_size: int = None,
+        segment_duration: float = None,
+        segment_topics: list = None,
+        compression: str = None,
+        compression_block_size: int = 65536,
+    ) -> None:
+        if log_format not in LOG_FORMATS:
+            raise ValueError(
+                f"Unknown log format {log_format}, expected one of {list(LOG_FORMATS)}"
+            )
+
+        self.FOLDER_PATH = folder_path
+        self.LOG_NUM = log_num
+        self.LOG_FORMAT = log_format
+        self._SEGMENT_SIZE = segment_size
+        self._SEGMENT_DURATION = segment_duration
+        self._SEGMENT_TOPICS = frozenset(segment_topics or ())
+        self._CODEC = get_codec(compression) if compression else None
+        self._COMPRESSION_BLOCK_SIZE = compression_block_size
+        self.SEGMENTED = bool(segment_size or segment_duration or self._SEGMENT_TOPICS)
+
+        self._START_TIME = datetime.now().isoformat()
+        self._topics = set()
+        self._segments = []
+        self._LOG_FILE = None
+        self._open_segment()
+
+    @property
+    def name(self) -> str:
+        """Filepath of the session, the manifest if segmented otherwise the log file."""
+        if self.SEGMENTED:
+            return self.manifest_path
+
+        return self._LOG_FILE.name
+
+    @property
+    def manifest_path(self) -> str:
+        """Filepath of the session manifest."""
+        return os.path.join(self.FOLDER_PATH, f"{self.LOG_NUM}_log.json")
+
+    @property
+    def segments(self) -> list:
+        """Manifest entries of the segments written so far."""
+        return [dict(segment) for segment in self._segments]
+
+    @property
+    def messages(self) -> int:
+        """Number of messages written to the session."""
+        return sum(segment["messages"] for segment in self._segments)
+
+    @property
+    def bytes(self) -> int:
+        """Size of the session on disk in bytes (excluding the manifest)."""
+        return sum(segment["bytes"] for segment in self._segments)
+
+    @property
+    def topics(self) -> set:
+        """Every topic written to the session."""
+        return set(self._topics)
+
+    def _segment_filename(self, index: int) -> str:
+        """Filename of a segment (or of the whole log when not segmented)."""
+        extension = LOG_FORMATS[self.LOG_FORMAT]
+        if self._CODEC is not None:
+            extension += self._CODEC.EXTENSION
+        if not self.SEGMENTED:
+            return f"{self.LOG_NUM}_log.{extension}"
+
+        return f"{self.LOG_NUM}_log.{index:03d}.{extension}"
+
+    def _open_segment(self) -> None:
+        """Closes the current segment (if any) and opens the next one."""
+        if self._LOG_FILE is not None:
+            self._close_segment()
+
+        filename = self._segment_filename(len(self._segments))
+        filepath = os.path.join(self.FOLDER_PATH, filename)
+        if self._CODEC is not None:
+            self._LOG_FILE = CompressedFile(
+                filepath, self._CODEC, self._COMPRESSION_BLOCK_SIZE
+            )
+        else:
+            self._LOG_FILE = open(filepath, log_file_mode(self.LOG_FORMAT))
+        self._LOG_FILE_WRITER = create_log_writer(self._LOG_FILE, self.LOG_FORMAT)
+        self._LOG_FILE_WRITER.write_header()
+
+        self._INDEXER = None
+        if self._CODEC is None:
+            self._INDEXER = LogIndexer(
+                self.LOG_FORMAT,
+                start_time=datetime.fromisoformat(self._START_TIME).timestamp(),
+            )
+
+        self._segments.append(
+            {
+                "filename": filename,
+                "start_time_delta": None,
+                "end_time_delta": None,
+                "messages": 0,
+                "bytes": 0,
+            }
+        )
+
+        if self.SEGMENTED:
+            logging.info(f"Recording to segment {filename}")
+            self._write_manifest()
+
+    def _close_segment(self) -> None:
+        """Closes the file of the current segment and records its final size."""
+        self._LOG_FILE.close()
+        self._segments[-1]["bytes"] = os.path.getsize(self._LOG_FILE.name)
+        self._save_index()
+
+    def _should_roll(self, time_delta: float, mqtt_topic: str) -> bool:
+        """Whether a new segment has to be started before writing a record."""
+        segment = self._segments[-1]
+        if not segment["messages"]:
+            return False
+
+        if mqtt_topic in self._SEGMENT_TOPICS:
+            return True
+
+        if (
+            self._SEGMENT_DURATION is not None
+            and time_delta - segment["start_time_delta"] >= self._SEGMENT_DURATION
+        ):
+            return True
+
+        return self._SEGMENT_SIZE is not None and segment["bytes"] >= self._SEGMENT_SIZE
+
+    def write_records(self, records: list) -> None:
+        """Writes a list of (time_delta, mqtt_topic, message) records, rolling to new segments as needed.
+
+        Parameters
+        ----------
+        records : list(tuple)
+            Records to be written in time order
+        """
+        if not self.SEGMENTED:
+            self._write_chunk(records)
+            return
+
+        chunk = []
+        for record in records:
+            if self._should_roll(record[0], record[1]):
+                self._write_chunk(chunk)
+                chunk = []
+                self._open_segment()
+
+            chunk.append(record)
+
+            # The first record of a segment decides when a duration based roll happens
+            segment = self._segments[-1]
+            if segment["start_time_delta"] is None:
+                segment["start_time_delta"] = record[0]
+            segment["messages"] += 1
+
+        self._write_chunk(chunk)
+
+    def _write_chunk(self, records: list) -> None:
+        """Writes records to the current segment and updates its manifest entry."""
+        if not records:
+            return
+
+        segment = self._segments[-1]
+        if self._INDEXER is not None:
+            # Everything needed to start reading at the first record of the chunk
+            previous_ns = (
+                round(segment["end_time_delta"] * 1e9)
+                if segment["end_time_delta"] is not None
+                else 0
+            )
+            self._INDEXER.add(records[0][0], self._LOG_FILE.tell(), previous_ns)
+            if self.LOG_FORMAT == "binary":
+                self._INDEXER.add_topics(record[1] for record in records)
+
+        self._LOG_FILE_WRITER.write_records(records)
+        self._topics.update(record[1] for record in records)
+
+        if not self.SEGMENTED:
+            if segment["start_time_delta"] is None:
+                segment["start_time_delta"] = records[0][0]
+            segment["messages"] += len(records)
+
+        segment["end_time_delta"] = records[-1][0]
+        segment["bytes"] = self._LOG_FILE.tell()
+
+    def _write_manifest(self, complete: bool = False) -> None:
+        """Atomically rewrites the session manifest."""
+        manifest = {
+            "log_num": self.LOG_NUM,
+            "log_format": self.LOG_FORMAT,
+            "compression": self._CODEC.NAME if self._CODEC is not None else None,
+            "start_time": self._START_TIME,
+            "complete": complete,
+            "segments": self._segments,
+        }
+
+        temp_path = self.manifest_path + ".tmp"
+        with open(temp_path, "w") as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
+        os.replace(temp_path, self.manifest_path)
+
+    def flush(self) -> None:
+        """Flushes the current segment (compressed logs only write a block once enough data is waiting)."""
+        self._LOG_FILE.flush()
+
+    def sync(self) -> None:
+        """Writes out everything buffered (as a block for compressed logs) and fsyncs the current segment."""
+        if self._CODEC is not None:
+            self._LOG_FILE.sync()
+        else:
+            self._LOG_FILE.flush()
+            os.fsync(self._LOG_FILE.fileno())
+
+    def checkpoint(self) -> None:
+        """Syncs the current segment and saves its progress in the manifest.
+
+        After a checkpoint everything written so far survives a power loss, and `recover_session` only has to
+        repair the tail of the current segment.
+        """
+        self.sync()
+        self._save_index()
+        if self.SEGMENTED:
+            self._write_manifest()
+
+    def _save_index(self) -> None:
+        """Saves the index of the current segment up to what has been written so far."""
+        if self._INDEXER is None:
+            return
+
+        segment = self._segments[-1]
+        self._INDEXER.size = segment["bytes"]
+        if segment["end_time_delta"] is not None:
+            self._INDEXER.time_ns = round(segment["end_time_delta"] * 1e9)
+
+        try:
+            self._INDEXER.save(self._LOG_FILE.name)
+        except OSError as e:
+            logging.error(f"{type(e)}: {e}")
+
+    def fileno(self) -> int:
+        """File descriptor of the current segment (so the session can be fsynced)."""
+        return self._LOG_FILE.fileno()
+
+    def close(self) -> None:
+        """Closes the current segment and completes the manifest."""
+        self._close_segment()
+        if self.SEGMENTED:
+            self._write_manifest(complete=True)
+
+
+def read_manifest(filepath: str) -> dict:
+    """Reads a session manifest.
+
+    Parameters
+    ----------
+    filepath : str
+        Filepath of the N_log.json manifest
+
+    Returns
+    -------
+    dict
+        The manifest with the segment filenames replaced by full filepaths
+    """
+    with open(filepath, "r") as manifest_file:
+        manifest = json.load(manifest_file)
+
+    folder_path = os.path.dirname(filepath)
+    for segment in manifest["segments"]:
+        segment["filepath"] = os.path.join(folder_path, segment["filename"])
+
+    return manifest
+
+
+def read_session(
+    filepath: str, start_time_delta: float = None, end_time_delta: float = None
+):
+    """Reads a whole session one record at a time, streaming across its segments.
+
+    Parameters
+    ----------
+    filepath : str
+        Filepath of a session manifest (N_log.json) or of a single log file
+    start_time_delta : float
+        Time delta of the first record to read, segments that end before it are skipped and the first segment is
+        entered through its index (None reads from the start)
+    end_time_delta : float
+        Time delta of the last record to read (None reads to the end)
+
+    Yields
+    ------
+    tuple
+        (time_delta, mqtt_topic, message) records, see `das.utils.log_format.read_log`
+    """
+    if not filepath.endswith(".json"):
+        yield from read_log_range(filepath, start_time_delta, end_time_delta)
+        return
+
+    for segment in read_manifest(filepath)["segments"]:
+        if (
+            start_time_delta is not None
+            and segment["end_time_delta"] is not None
+            and segment["end_time_delta"] < start_time_delta
+        ):
+            continue
+
+        if (
+            end_time_delta is not None
+            and segment["start_time_delta"] is not None
+            and segment["start_time_delta"] > end_time_delta
+        ):
+            return
+
+        if not os.path.exists(segment["filepath"]):
+            logging.warning(f"Segment {segment['filepath']} is missing, skipping it")
+            continue
+
+        yield from read_log_range(segment["filepath"], start_time_delta, end_time_delta)
+
+
+def _shift_records(records, offset: float):
+    """Adds a clock offset to the time_delta of each record."""
+    for time_delta, mqtt_topic, message in records:
+        yield time_delta + offset, mqtt_topic, message
+
+
+def merge_sessions(
+    filepaths: list,
+    offsets: list = None,
+    start_time_delta: float = None,
+    end_time_delta: float = None,
+):
+    """Reads several logs or sessions as one stream ordered by time.
+
+    The logs are streamed through a heap based k-way merge, so only one record per log is held in memory and
+    merging N logs costs O(total records * log N). Records with equal times keep the order of the filepaths.
+
+    Parameters
+    ----------
+    filepaths : List(str)
+        Filepaths of the logs or session manifests, each one ordered by time
+    offsets : List(float)
+        Clock offset in seconds added to the time_delta of each log (e.g. to line up logs recorded on different
+        devices), None uses no offsets
+    start_time_delta : float
+        Merged time of the first record to read (None reads from the start)
+    end_time_delta : float
+        Merged time of the last record to read (None reads to the end)
+
+    Returns
+    -------
+    iterator(tuple)
+        (time_delta, mqtt_topic, message) records with the offsets applied
+    """
+    offsets = offsets or [0.0] * len(filepaths)
+    if len(offsets) != len(filepaths):
+        raise ValueError(
+            f"Got {len(offsets)} offsets for {len(filepaths)} logs, expected one per log"
+        )
+
+    streams = []
+    for filepath, offset in zip(filepaths, offsets):
+        records = read_session(
+            filepath,
+            None if start_time_delta is None else start_time_delta - offset,
+            None if end_time_delta is None else end_time_delta - offset,
+        )
+        streams.append(_shift_records(records, offset) if offset else records)
+
+    if len(streams) == 1:
+        return streams[0]
+
+    return heapq.merge(*streams, key=itemgetter(0))
+
+
+def start_time_offsets(filepaths: list) -> list:
+    """Clock offsets that line logs up by the wall clock time they were started at, see `merge_sessions`.
+
+    Parameters
+    ----------
+    filepaths : List(str)
+        Filepaths of the logs or session manifests
+
+    Returns
+    -------
+    List(float)
+        Offset of each log in seconds, relative to the log that was started first
+    """
+    start_times = []
+    for filepath in filepaths:
+        start_time = session_start_time(filepath)
+        if start_time is None:
+            raise ValueError(f"The start time of {filepath} is unknown")
+        start_times.append(start_time)
+
+    first = min(start_times)
+    return [start_time - first for start_time in start_times]
+
+
+def session_start_time(filepath: str) -> float:
+    """Finds the wall clock time a session or log was started at.
+
+    The start time is taken from the session manifest, the index saved while recording or the log catalog in the
+    same folder, in that order.
+
+    Parameters
+    ----------
+    filepath : str
+        Filepath of a session manifest (N_log.json) or of a single log file
+
+    Returns
+    -------
+    float
+        Unix time of time_delta 0, or None if it is unknown
+    """
+    if filepath.endswith(".json"):
+        return datetime.fromisoformat(read_manifest(filepath)["start_time"]).timestamp()
+
+    indexer = LogIndexer.load(filepath)
+    if indexer is not None and indexer.START_TIME is not None:
+        return indexer.START_TIME
+
+    folder_path = os.path.dirname(os.path.abspath(filepath))
+    match = re.match(r"(\d+)_log\.", os.path.basename(filepath))
+    if match and os.path.exists(os.path.join(folder_path, CATALOG_FILENAME)):
+        logs = LogCatalog(folder_path).find(sequence="log", log_num=int(match.group(1)))
+        if logs:
+            return logs[0]["start_time"]
+
+    return None
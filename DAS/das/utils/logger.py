@@ -1,19 +1,30 @@
+from collections import deque
+from datetime import datetime
 from pathlib import Path
 import paho.mqtt.client as mqtt
-import csv
+import json
 import time
-import os
 import asyncio
 import logging
-import re
+import threading
+from array import array
 
-CsvConfig = {
-    "delimiter": ",",
-    "quotechar": "`",
-    "quoting": csv.QUOTE_ALL,
-    "skipinitialspace": True,
-    "fieldnames": ["time_delta", "mqtt_topic", "message"],
-}
+from das.utils.batch_writer import BatchWriter
+from das.utils.log_catalog import LogCatalog
+from das.utils.log_format import CsvConfig
+from das.utils.log_session import (
+    LogSession,
+    merge_sessions,
+    session_start_time,
+    start_time_offsets,
+)
+from das.utils.metrics import percentiles
+from das.utils.playback_sinks import MqttSink, as_sink
+from das.utils.playback_timing import PlaybackTiming
+from das.utils.pre_trigger import PreTriggerBuffer
+from das.utils.recorder_metrics import RecorderMetrics
+from das.utils.recorder_sinks import RecorderSink
+from das.utils.topic_filter import TopicFilter
 
 # Set logging to output all info by default (with a space for clarity)
 logging.basicConfig(format="%(levelname)s: %(message)s", level=logging.WARNING)
@@ -30,23 +41,92 @@ class Recorder:
         A list containing the topic strings that are to be subscribed to
     broker_address : str
         The IP address that the MQTT broker lives on
+    broker_port : int
+        The port of the MQTT broker
     verbose : bool
         Specifies whether the incoming MQTT data and warnings are printed
+    flush_size : int
+        Maximum number of messages written to the log file in one batch
+    flush_interval : float
+        Maximum time in seconds a message waits in memory before it is written to the log file
+    fsync_interval : float
+        Time in seconds between checkpoints (None only checkpoints on `sync` and `stop`). A checkpoint fsyncs the
+        log, saves the segment manifest and updates the catalog, so a power loss only loses what was written since
+    max_queue_size : int
+        Maximum number of messages waiting to be written before incoming messages are dropped
+    log_format : str
+        On-disk format of the log, either "csv" (N_log.csv) or the compact "binary" (N_log.bin)
+    segment_size : int
+        Roll the log into a new segment once the current one reaches this many bytes
+    segment_duration : float
+        Roll the log into a new segment once the current one spans this many seconds
+    segment_topics : List(str)
+        Roll the log into a new segment before any message on these topics (e.g. DAS start/stop)
+    compression : str
+        Compress the log with a registered codec such as "gzip" (None writes an uncompressed log)
+    compression_block_size : int
+        Amount of uncompressed data in bytes per compressed block, at most one block is lost on a crash
+    catalog_path : str
+        Filepath of the catalog that allocates log numbers and stores log metadata (defaults to catalog.sqlite
+        inside csv_folder_path)
+    exclude_topics : List(str)
+        Topic filters (with + and # wildcards) of messages that are dropped by the client instead of being logged,
+        e.g. to subscribe to "#" but leave out a chatty module
+    sinks : List(`RecorderSink`)
+        Extra outputs fed with every recorded message, such as a `LogSink` (a copy of the log in another format), a
+        `RingSink` or a `CallbackSink`. Each sink has its own writer thread and stats (see `sink_stats`).
+    trigger_topics : List(str)
+        Topic filters that trigger the recording (None records from `start`). Once started, the recorder keeps the
+        latest messages in a pre-trigger buffer and only starts writing the log, beginning with the buffered
+        messages, when a message on one of these topics (e.g. the DAS start) arrives.
+    pre_trigger_seconds : float
+        Number of seconds of messages kept before the trigger
+    pre_trigger_bytes : int
+        Maximum size in bytes of the payloads kept before the trigger, allocated up front
+    client : `paho.mqtt.client`
+        Connected MQTT client shared with the caller (None connects a new client to broker_address). The caller
+        keeps the network loop running, subscribes to the topics and passes the messages on to `_on_message`, so
+        that recordings can be started and stopped without reconnecting (see `RecorderDaemon`).
+    metrics_topic : str
+        Topic the live metrics (see `metrics`) are published on while recording (None does not publish them),
+        messages on it are neither logged nor counted
+    metrics_interval : float
+        Time in seconds between metrics messages, also the minimum period the message rates are averaged over
 
     Attributes
     ----------
     TOPICS : List(str)
         List of topic names
+    _FILTER : `TopicFilter`
+        Filter of the excluded topics (None if no topics are excluded)
     _recording : bool
         Whether the Recorder object is currently recording or not
     _START_TIME : `time`
         The current time used to produce time deltas
-    _LOG_FILE : `File`
-        Open log file object that can be written to
-    _LOG_FILE_WRITER : `csv.DictWriter`
-        Csv writter object that is used to write the data to the _LOG_FILE file
+    _CATALOG : `LogCatalog`
+        Catalog that the log number was allocated from and that the log metadata is saved in
+    _LOG_NUM : int
+        Number of the log
+    _LOG_SESSION : `LogSession`
+        Log file (or segments and manifest) that the data is written to in the selected log format
+    _BATCH_WRITER : `BatchWriter`
+        Queue and writer thread that writes the incoming messages to _LOG_SESSION in batches
+    _SINKS : List(tuple)
+        (`RecorderSink`, `BatchWriter`) pairs of the extra outputs
+    _TRIGGER : `TopicFilter`
+        Filter of the topics that trigger the recording (None without a trigger)
+    _PRE_TRIGGER : `PreTriggerBuffer`
+        Messages received since `start` while waiting for the trigger (None without a trigger)
+    _triggered : bool
+        Whether messages are written to the log (always True without a trigger)
     _CLIENT : `paho.mqtt.client`
         MQTT client that connects to the broker and recives the messages
+    _OWNS_CLIENT : bool
+        Whether _CLIENT was connected by the recorder (and is stopped with it)
+    _METRICS : `RecorderMetrics`
+        Message counters of each topic
+    _METRICS_THREAD : `threading.Thread`
+        Thread that publishes the metrics on metrics_topic (None if they are not published)
     """
 
     def __init__(
@@ -54,12 +134,52 @@ class Recorder:
         csv_folder_path: str,
         topics: list = ["#"],
         broker_address: str = "localhost",
+        broker_port: int = 1883,
         verbose: bool = False,
+        flush_size: int = 500,
+        flush_interval: float = 0.5,
+        fsync_interval: float = None,
+        max_queue_size: int = 100000,
+        log_format: str = "csv",
+        segment_size: int = None,
+        segment_duration: float = None,
+        segment_topics: list = None,
+        compression: str = None,
+        compression_block_size: int = 65536,
+        catalog_path: str = None,
+        exclude_topics: list = None,
+        sinks: list = None,
+        trigger_topics: list = None,
+        pre_trigger_seconds: float = 10.0,
+        pre_trigger_bytes: int = 8 * 1024 * 1024,
+        client=None,
+        metrics_topic: str = None,
+        metrics_interval: float = 5.0,
     ) -> None:
         # The logger object can subscribe to many topics (if none are selected then it will subscribe to all)
         self.TOPICS = topics
+        self._FILTER = TopicFilter(exclude=exclude_topics) if exclude_topics else None
+
+        # Until a trigger arrives the messages only go into a bounded buffer
+        self._TRIGGER = None
+        self._PRE_TRIGGER = None
+        self._TRIGGER_LOCK = threading.Lock()
+        self._triggered = True
+        if trigger_topics:
+            self._TRIGGER = TopicFilter(trigger_topics)
+            self._PRE_TRIGGER = PreTriggerBuffer(
+                max_seconds=pre_trigger_seconds, max_bytes=pre_trigger_bytes
+            )
+            self._triggered = False
         self._START_TIME = time.monotonic()
 
+        # Counted as the messages arrive, the metrics are worked out when they are read
+        self._METRICS = RecorderMetrics(metrics_interval)
+        self._METRICS_TOPIC = metrics_topic
+        self._METRICS_INTERVAL = metrics_interval
+        self._METRICS_THREAD = None
+        self._METRICS_STOP = threading.Event()
+
         # If set to verbose print info messages
         if verbose:
             logging.getLogger().setLevel(logging.INFO)
@@ -67,56 +187,103 @@ class Recorder:
         # Create csv_folder_path folder if none exists
         Path(csv_folder_path).mkdir(parents=True, exist_ok=True)
 
-        # Create the csv log and csv writter
-        self._create_log_file(csv_folder_path)
+        # Create the log (with headers for csv or the signature for binary logs)
+        self._create_log_file(
+            csv_folder_path,
+            log_format,
+            segment_size=segment_size,
+            segment_duration=segment_duration,
+            segment_topics=segment_topics,
+            compression=compression,
+            compression_block_size=compression_block_size,
+            catalog_path=catalog_path,
+        )
+
+        # Messages are written to the log file from a separate thread so that a slow disk never stalls the MQTT
+        # network thread
+        self._BATCH_WRITER = BatchWriter(
+            self._write_records,
+            self._LOG_SESSION,
+            max_queue_size=max_queue_size,
+            flush_size=flush_size,
+            flush_interval=flush_interval,
+            fsync_interval=fsync_interval,
+            fsync=self._checkpoint,
+        )
+        self._BATCH_WRITER.start()
+
+        # Every extra sink gets its own queue and thread so that a slow sink never holds up the others
+        self._SINKS = []
+        try:
+            for sink in sinks or []:
+                if not isinstance(sink, RecorderSink):
+                    raise TypeError(f"{type(sink)} is not a RecorderSink")
+                sink.open(csv_folder_path, self._LOG_NUM)
+
+                sink_writer = BatchWriter(
+                    sink.write,
+                    None,
+                    max_queue_size=max_queue_size,
+                    flush_size=flush_size,
+                    flush_interval=flush_interval,
+                    fsync_interval=fsync_interval,
+                    fsync=sink.sync,
+                )
+                sink_writer.start()
+                self._SINKS.append((sink, sink_writer))
 
-        # Add headers for csv
-        self._LOG_FILE_WRITER.writeheader()
+        except Exception:
+            self._close_sinks()
+            self._BATCH_WRITER.stop()
+            self._LOG_SESSION.close()
+            raise
 
         # Do not start logging when object is created (wait for start method)
         self._recording = False
 
+        # A shared client is already connected and run by its owner
+        self._OWNS_CLIENT = client is None
+        if client is not None:
+            self._CLIENT = client
+            return
+
         # Connect to MQTT broker
         self._CLIENT = mqtt.Client()
         self._CLIENT.on_connect = self._on_connect
         self._CLIENT.on_message = self._on_message
-        self._CLIENT.connect(broker_address)
+        self._CLIENT.connect(broker_address, broker_port)
         self._CLIENT.loop_start()  # Threaded execution loop
 
-    def _create_log_file(self, csv_folder_path: str) -> None:
-        """Generates a log file ready to be written in.
+    def _create_log_file(
+        self,
+        csv_folder_path: str,
+        log_format: str = "csv",
+        catalog_path: str = None,
+        **segment_options,
+    ) -> None:
+        """Generates a log file (or a segmented session) ready to be written in and registers it in the catalog.
 
         Parameters
         ----------
         csv_folder_path : str
             Filepath of the folder where the logs are to be stored
+        log_format : str
+            On-disk format of the log, one of LOG_FORMATS
+        catalog_path : str
+            Filepath of the log catalog (defaults to catalog.sqlite in csv_folder_path)
+        segment_options
+            Segment and compression options passed on to `LogSession`
         """
 
-        # Name the csv log file xxxx_log.csv where xxxx is a number
-        previous_log_num = 0
-        for filename in os.listdir(csv_folder_path):
-            try:
-                # Regular expression that extracts the decimal log number (group 1)
-                current_log_num = int(re.search("(\d*)_log.csv", filename).group(1))
-                if current_log_num > previous_log_num:
-                    previous_log_num = current_log_num
-
-            except AttributeError:
-                logging.warning(f"{filename} should not be in {csv_folder_path}")
-
-            except Exception as e:
-                logging.error(f"{type(e)}: {e}")
+        # Name the log file xxxx_log.csv (or xxxx_log.bin, xxxx_log.json...) where xxxx is a number handed out by
+        # the catalog, so that recorders starting at the same time never get the same number
+        self._CATALOG = LogCatalog(csv_folder_path, catalog_path)
+        self._LOG_NUM = self._CATALOG.allocate("log", subscriptions=self.TOPICS)
 
-        # Create the new log file and name it one more than the previous
-        filename = f"{previous_log_num + 1}_log.csv"
-        self._LOG_FILE = open(os.path.join(csv_folder_path, filename), "a")
-        self._LOG_FILE_WRITER = csv.DictWriter(
-            self._LOG_FILE,
-            delimiter=CsvConfig["delimiter"],
-            quotechar=CsvConfig["quotechar"],
-            quoting=CsvConfig["quoting"],
-            fieldnames=CsvConfig["fieldnames"],
+        self._LOG_SESSION = LogSession(
+            csv_folder_path, self._LOG_NUM, log_format, **segment_options
         )
+        self._CATALOG.update(self._LOG_NUM, filepath=self._LOG_SESSION.name)
 
     def _on_connect(self, client, userdata, flags, rc) -> None:
         """Callback function for MQTT broker on connection."""
@@ -140,153 +307,844 @@ class Recorder:
     def _on_message(self, client, userdata, msg) -> None:
         """Callback function for MQTT broker on message that logs the incoming MQTT message."""
         if self._recording:
-            try:
-                self.log(msg.topic, msg.payload.decode("utf-8"))
-
-            except Exception as e:
-                logging.error(f"{type(e)}: {e}")
+            # The recorder's own metrics come back when their topic is subscribed to (e.g. with #)
+            if msg.topic == self._METRICS_TOPIC:
+                return
+            if self._FILTER is not None and not self._FILTER.matches(msg.topic):
+                return
+            self.log(msg.topic, msg.payload)
 
-    def log(self, mqtt_topic: str, message: str) -> None:
-        """Logs the time delta and message data to self._LOG_FILE in the csv format.
+    def log(self, mqtt_topic: str, message) -> None:
+        """Queues the time delta and message data to be written to the log.
 
         Parameters
         ----------
         mqtt_topic : str
             Incoming topic to be recorded
-        message : str
-            Corresponding message to be recorded
+        message : str or bytes
+            Corresponding message to be recorded (bytes are decoded as utf-8 when written)
         """
         time_delta = time.monotonic() - self._START_TIME
+        record = (time_delta, mqtt_topic, message)
+        self._METRICS.record(time_delta, mqtt_topic, message)
+
+        if not self._triggered:
+            with self._TRIGGER_LOCK:
+                if not self._triggered:
+                    if not self._TRIGGER.matches(mqtt_topic):
+                        self._PRE_TRIGGER.append(time_delta, mqtt_topic, message)
+                        return
+                    self._flush_pre_trigger()
+
+        self._put(record)
+
+    def _put(self, record: tuple) -> None:
+        """Queues a record for the log and every sink (the same record is shared by all of them)."""
+        self._BATCH_WRITER.put(record)
+        for _, sink_writer in self._SINKS:
+            sink_writer.put(record)
+
+    def _flush_pre_trigger(self) -> None:
+        """Queues the buffered messages ahead of everything else and starts writing the log (holding the lock)."""
+        records = self._PRE_TRIGGER.drain()
+        logging.info(f"Recording triggered with {len(records)} buffered messages")
+        for record in records:
+            self._put(record)
+        self._triggered = True
+
+    def trigger(self) -> None:
+        """Starts writing the log (beginning with the pre-trigger buffer) without waiting for a trigger topic."""
+        with self._TRIGGER_LOCK:
+            if not self._triggered:
+                self._flush_pre_trigger()
+
+    @property
+    def triggered(self) -> bool:
+        """Whether the log is being written (False while waiting for a trigger topic)."""
+        return self._triggered
+
+    def _write_records(self, records: list) -> None:
+        """Writes a batch of queued records to the log (runs on the writer thread).
+
+        Parameters
+        ----------
+        records : list(tuple)
+            Queued (time_delta, mqtt_topic, message) records
+        """
+        if logging.getLogger().isEnabledFor(logging.INFO):
+            for time_delta, mqtt_topic, message in records:
+                logging.info(
+                    f"{round(time_delta, 5): <10} | {mqtt_topic: <50} | {message}"
+                )
+
+        self._LOG_SESSION.write_records(records)
+
+    def _checkpoint(self) -> None:
+        """Saves the log to disk and records the progress in the catalog (runs on the writer thread)."""
+        self._LOG_SESSION.checkpoint()
 
-        # Write data to csv file
         try:
-            self._LOG_FILE_WRITER.writerow(
-                {
-                    "time_delta": time_delta,
-                    "mqtt_topic": mqtt_topic,
-                    "message": message,
-                }
+            self._CATALOG.update(
+                self._LOG_NUM,
+                duration=time.monotonic() - self._START_TIME,
+                messages=self._LOG_SESSION.messages,
+                bytes=self._LOG_SESSION.bytes,
             )
-            logging.info(f"{round(time_delta, 5): <10} | {mqtt_topic: <50} | {message}")
 
         except Exception as e:
             logging.error(f"{type(e)}: {e}")
 
+    @property
+    def log_filepath(self) -> str:
+        """Filepath of the log, or of its manifest if it is segmented."""
+        return self._LOG_SESSION.name
+
+    @property
+    def stats(self) -> dict:
+        """Counters of the background writer (queue depth, drops, flush latency etc.), see `BatchWriter.stats`."""
+        return self._BATCH_WRITER.stats
+
+    @property
+    def sink_stats(self) -> dict:
+        """Counters of the writer of each extra sink by sink name, see `BatchWriter.stats`."""
+        return {sink.name: sink_writer.stats for sink, sink_writer in self._SINKS}
+
+    def metrics(self) -> dict:
+        """Live metrics of the recording, the same as are published on metrics_topic.
+
+        Returns
+        -------
+        dict
+            messages, bytes, msgs_per_s and bytes_per_s in total and for each topic (topics), the seconds since the
+            last message of each wireless module by module id (modules), the log, its file_size in bytes, the
+            queue_depth, max_queue_depth, written and dropped messages of the writer, the write_latency_ms
+            percentiles of the last batches, whether the recorder is triggered, the uptime in seconds and the time
+            (unix time) of the metrics
+        """
+        now = time.monotonic() - self._START_TIME
+        metrics = self._METRICS.snapshot(now)
+
+        stats = self._BATCH_WRITER.stats
+        latency = self._BATCH_WRITER.latency_percentiles()
+        metrics.update(
+            {
+                "log": self._LOG_SESSION.name,
+                "file_size": self._LOG_SESSION.bytes,
+                "queue_depth": stats["queue_depth"],
+                "max_queue_depth": stats["max_queue_depth"],
+                "written": stats["written"],
+                "dropped": stats["dropped"],
+                "write_latency_ms": {
+                    key: None if value is None else value * 1000
+                    for key, value in latency.items()
+                },
+                "triggered": self._triggered,
+                "uptime": now,
+                "time": time.time(),
+            }
+        )
+        return metrics
+
+    def _publish_metrics(self) -> None:
+        """Publishes the metrics on the metrics topic every metrics_interval seconds until stopped (runs on
+        _METRICS_THREAD)."""
+        while not self._METRICS_STOP.wait(self._METRICS_INTERVAL):
+            try:
+                self._CLIENT.publish(self._METRICS_TOPIC, json.dumps(self.metrics()))
+
+            except Exception as e:
+                logging.error(f"{type(e)}: {e}")
+
+    def sync(self, timeout: float = None) -> bool:
+        """Explicit checkpoint that blocks until every message logged so far is saved to disk.
+
+        Parameters
+        ----------
+        timeout : float
+            Maximum time in seconds to wait (None waits forever)
+
+        Returns
+        -------
+        bool
+            True if the data was saved before the timeout
+        """
+        synced = self._BATCH_WRITER.sync(timeout)
+        for _, sink_writer in self._SINKS:
+            synced = sink_writer.sync(timeout) and synced
+        return synced
+
+    def _close_sinks(self) -> None:
+        """Writes out what is queued for each sink and closes it."""
+        for sink, sink_writer in self._SINKS:
+            sink_writer.stop()
+            try:
+                sink.close()
+
+            except Exception as e:
+                logging.error(f"{type(e)}: {e}")
+
     def start(self) -> None:
-        """Starts the MQTT logging."""
+        """Starts the MQTT logging (or starts filling the pre-trigger buffer when there are trigger topics)."""
         self._recording = True
         logging.info(f"Logging started!")
 
+        if self._METRICS_TOPIC is not None and self._METRICS_THREAD is None:
+            self._METRICS_THREAD = threading.Thread(
+                target=self._publish_metrics, name="RecorderMetrics", daemon=True
+            )
+            self._METRICS_THREAD.start()
+
     def stop(self) -> None:
         """Graceful exit for closing the file and stopping the MQTT client."""
         self._recording = False
-        self._CLIENT.loop_stop()
-        self._LOG_FILE.close()
-        logging.info(f"Data saved in {self._LOG_FILE.name}")
+        if self._METRICS_THREAD is not None:
+            self._METRICS_STOP.set()
+            self._METRICS_THREAD.join()
+        if self._OWNS_CLIENT:
+            self._CLIENT.loop_stop()
+
+        # Write out anything that is still queued before closing the file
+        self._BATCH_WRITER.stop()
+        self._LOG_SESSION.close()
+        logging.info(f"Data saved in {self._LOG_SESSION.name}")
+        self._close_sinks()
+
+        # Save a summary of the log so it can be searched without opening it
+        try:
+            self._CATALOG.update(
+                self._LOG_NUM,
+                status="complete",
+                duration=time.monotonic() - self._START_TIME,
+                messages=self._LOG_SESSION.messages,
+                bytes=self._LOG_SESSION.bytes,
+                topics=self._LOG_SESSION.topics,
+            )
+
+        except Exception as e:
+            logging.error(f"{type(e)}: {e}")
 
 
 class Playback:
     """Playback MQTT messages from log files in realtime or faster.
 
+    The log is streamed rather than loaded, only a small window of upcoming rows is held in memory, so memory use
+    stays flat regardless of the length of the log.
+
+    The messages are published to the MQTT broker unless a sink is given, in which case they are delivered straight
+    into Python (a callable, an asyncio queue or any `PlaybackSink`) without a broker. Together with a
+    `VirtualClock` a log can then be reprocessed as fast as the sink consumes it.
+
     Parameters
     ----------
-    filepath : str
-        Filepath of the log file for playback
+    filepath : str or List(str)
+        Filepath of the log file for playback (csv or binary), or of a session manifest (N_log.json) to play
+        all of its segments as one stream. A list of logs is merged into one stream ordered by time.
     broker_address : str
         The IP address that the MQTT broker lives on
+    broker_port : int
+        The port of the MQTT broker
     verbose : bool
         Specifies whether the outgoing MQTT data and warnings are printed
+    lookahead : int
+        Maximum number of upcoming rows read ahead of their publish time
+    start : float or `datetime`
+        Start playing at this time_delta in seconds or wall clock time (None plays from the start). The log is
+        entered through its time index instead of being read from the start.
+    end : float or `datetime`
+        Stop playing after this time_delta in seconds or wall clock time (None plays to the end)
+    offsets : List(float) or str
+        Clock offset in seconds added to the time_delta of each log when several logs are played, or "start_time"
+        to line the logs up by the wall clock time they were started at (None uses no offsets)
+    topics : List(str)
+        Only play the messages on these topic filters, with + and # wildcards (None plays every topic)
+    exclude_topics : List(str)
+        Do not play the messages on these topic filters, even if they are in topics
+    control_topic : str
+        Base topic of the control plane (None disables it). While playing, messages on CONTROL_TOPIC/pause,
+        CONTROL_TOPIC/resume, CONTROL_TOPIC/seek (payload: time_delta in seconds) and CONTROL_TOPIC/speed (payload:
+        speed multiplier) control the playback, and its state is published on CONTROL_TOPIC/status
+    status_interval : float
+        Time in seconds between status messages while playing (they are also sent after every command)
+    sink : `PlaybackSink`, callable or `asyncio.Queue`
+        Deliver the messages here instead of publishing them to the broker (None publishes them). No broker
+        connection is made unless a control_topic is also given.
 
     Attributes
     ----------
-    _BROKER_ADDRESS: bool
-        The IP address of the MQTT broker
+    _FILEPATHS : List(str)
+        Filepaths of the log files or session manifests
+    _OFFSETS : List(float)
+        Clock offset of each log in seconds
+    _START : float
+        Time delta the playback starts at (None for the start of the log)
+    _END : float
+        Time delta the playback ends at (None for the end of the log)
+    _LOOKAHEAD : int
+        Maximum number of rows buffered ahead of their publish time
+    _FILTER : `TopicFilter`
+        Filter of the topics to play (None plays every topic)
+    _CONTROL_TOPIC : str
+        Base topic of the control plane (None if disabled)
+    _STATUS_INTERVAL : float
+        Time in seconds between status messages
+    _COMMANDS : `collections.deque`
+        (command, value) pairs waiting to be applied by the playback scheduler
+    _LOOP : `asyncio.AbstractEventLoop`
+        Event loop of the running playback (None when not playing)
+    _WAKER : `asyncio.Future`
+        Future the playback scheduler is sleeping on, resolved early to apply a command
+    _SINK : `PlaybackSink`
+        Destination of the played messages
+    _CONNECTED : `threading.Event`
+        Set once the broker has accepted the connection
     _CLIENT : `paho.mqtt.client`
-        MQTT client that connects to the broker and recives the messages
-    _log_data: list(dict)
-        A list of all of the rows in the log file stored in dict format
+        MQTT client that connects to the broker and recives the messages (None without a broker)
     """
 
     def __init__(
-        self, filepath: str, broker_address: str = "localhost", verbose: bool = False
+        self,
+        filepath,
+        broker_address: str = "localhost",
+        broker_port: int = 1883,
+        verbose: bool = False,
+        lookahead: int = 1000,
+        start=None,
+        end=None,
+        offsets=None,
+        topics: list = None,
+        exclude_topics: list = None,
+        control_topic: str = None,
+        status_interval: float = 1.0,
+        sink=None,
     ) -> None:
 
         # If set to verbose print info messages
         if verbose:
             logging.getLogger().setLevel(logging.INFO)
 
-        # Read in data from log file and save each row in _log_data list
-        log_file = open(filepath, "r")
-        csv_reader = csv.DictReader(
-            log_file,
-            delimiter=CsvConfig["delimiter"],
-            quotechar=CsvConfig["quotechar"],
-            quoting=CsvConfig["quoting"],
-            skipinitialspace=CsvConfig["skipinitialspace"],
-        )
+        # The logs are read lazily when played (csv or binary, detected from the file)
+        filepaths = [filepath] if isinstance(filepath, (str, Path)) else filepath
+        self._FILEPATHS = [str(path) for path in filepaths]
+        for filepath in self._FILEPATHS:
+            if not Path(filepath).exists():
+                raise FileNotFoundError(f"{filepath} does not exist")
 
-        self._log_data = []
-        for row in csv_reader:
-            # Convert time delta to float
-            row["time_delta"] = float(row["time_delta"])
-            self._log_data.append(row)
+        if offsets == "start_time":
+            offsets = start_time_offsets(self._FILEPATHS)
+        self._OFFSETS = list(offsets) if offsets else [0.0] * len(self._FILEPATHS)
+        self._LOOKAHEAD = max(1, lookahead)
+        self._START = self._to_time_delta(start)
+        self._END = self._to_time_delta(end)
 
-        # Connect to MQTT broker
-        self._CLIENT = mqtt.Client()
-        self._CLIENT.on_connect = self._on_connect
-        self._CLIENT.connect(broker_address)
+        self._FILTER = None
+        if topics or exclude_topics:
+            self._FILTER = TopicFilter(topics, exclude_topics)
+
+        # Commands can arrive from any thread (e.g. the MQTT network thread) and are applied by the scheduler
+        self._CONTROL_TOPIC = control_topic.rstrip("/") if control_topic else None
+        self._STATUS_INTERVAL = status_interval
+        self._COMMANDS = deque()
+        self._LOOP = None
+        self._WAKER = None
+
+        # Connect to MQTT broker (only needed to publish the messages or for the control plane)
+        self._CONNECTED = threading.Event()
+        self._CLIENT = None
+        if sink is None or self._CONTROL_TOPIC is not None:
+            self._CLIENT = mqtt.Client()
+            self._CLIENT.on_connect = self._on_connect
+            if self._CONTROL_TOPIC is not None:
+                for command in ("pause", "resume", "seek", "speed"):
+                    self._CLIENT.message_callback_add(
+                        f"{self._CONTROL_TOPIC}/{command}", self._on_control_message
+                    )
+            self._CLIENT.connect(broker_address, broker_port)
+
+        self._SINK = MqttSink(self._CLIENT) if sink is None else as_sink(sink)
+
+    def _to_time_delta(self, value) -> float:
+        """Converts a wall clock time (`datetime`) into a time_delta of the logs, other values are returned as is."""
+        if not isinstance(value, datetime):
+            return value
+
+        # The first log sets the wall clock time of the merged stream
+        start_time = session_start_time(self._FILEPATHS[0])
+        if start_time is None:
+            raise ValueError(
+                f"The start time of {self._FILEPATHS[0]} is unknown, use a time delta instead"
+            )
+
+        return value.timestamp() - start_time + self._OFFSETS[0]
+
+    def _read_rows(self, start: float = None):
+        """Streams the rows to play from start (defaults to the playback start), merging the logs by time when there
+        are several."""
+        if start is None:
+            start = self._START
+        rows = merge_sessions(self._FILEPATHS, self._OFFSETS, start, self._END)
+        if self._FILTER is not None:
+            rows = self._FILTER.filter_records(rows)
+        return rows
 
     def _on_connect(self, client, userdata, flags, rc) -> None:
         """Callback function for MQTT broker on connection."""
 
         if rc == 0:
             logging.info("Connection Successful!")
+            self._CONNECTED.set()
         else:
             raise ConnectionError(
                 "Connection was unsuccessful, check that the broker IP is corrrect"
             )
 
-    def play(self, speed: float = 1) -> None:
+        if self._CONTROL_TOPIC is not None:
+            try:
+                self._CLIENT.subscribe(f"{self._CONTROL_TOPIC}/+")
+                logging.info(f"Subscribed to: {self._CONTROL_TOPIC}/+")
+
+            except Exception as e:
+                logging.error(f"{type(e)}: {e}")
+
+    def _on_control_message(self, client, userdata, msg) -> None:
+        """Callback function for MQTT broker on message that passes a control command to the playback."""
+        command = msg.topic.rsplit("/", 1)[-1]
+        try:
+            if command == "pause":
+                self.pause()
+            elif command == "resume":
+                self.resume()
+            elif command == "seek":
+                self.seek(float(msg.payload))
+            elif command == "speed":
+                self.set_speed(float(msg.payload))
+
+        except Exception as e:
+            logging.error(f"{type(e)}: {e}")
+
+    def _command(self, command: str, value=None) -> None:
+        """Queues a control command and wakes the playback scheduler so it is applied straight away."""
+        self._COMMANDS.append((command, value))
+
+        loop = self._LOOP
+        if loop is not None:
+            try:
+                loop.call_soon_threadsafe(self._wake)
+            except RuntimeError:
+                # The playback finished in the meantime
+                pass
+
+    def _wake(self) -> None:
+        """Ends the current sleep of the playback scheduler (runs on the event loop)."""
+        if self._WAKER is not None and not self._WAKER.done():
+            self._WAKER.set_result(None)
+
+    async def _sleep(self, timeout: float = None) -> None:
+        """Sleeps for timeout seconds (None sleeps until woken), or until a control command arrives."""
+        loop = asyncio.get_running_loop()
+        self._WAKER = loop.create_future()
+        if self._COMMANDS:
+            # A command arrived before the waker was in place
+            return
+
+        handle = None
+        if timeout is not None:
+            handle = loop.call_later(timeout, self._wake)
+        try:
+            await self._WAKER
+        finally:
+            if handle is not None:
+                handle.cancel()
+
+    def pause(self) -> None:
+        """Pauses the playback (can be called from any thread)."""
+        self._command("pause")
+
+    def resume(self) -> None:
+        """Resumes a paused playback (can be called from any thread)."""
+        self._command("resume")
+
+    def seek(self, position) -> None:
+        """Moves the playback to a position, entering the log through its time index (can be called from any thread).
+
+        Parameters
+        ----------
+        position : float or `datetime`
+            Time delta in seconds or wall clock time to continue playing from
+        """
+        self._command("seek", self._to_time_delta(position))
+
+    def set_speed(self, speed: float) -> None:
+        """Changes the speed of the playback from the current position (can be called from any thread).
+
+        Parameters
+        ----------
+        speed : float
+            Speed multiplier, a higher value means faster
+        """
+        if speed <= 0:
+            raise ValueError(f"The playback speed must be positive, not {speed}")
+        self._command("speed", speed)
+
+    def _publish_status(self, state: str, position: float, speed: float) -> None:
+        """Publishes the playback state and position on the status topic."""
+        try:
+            self._CLIENT.publish(
+                f"{self._CONTROL_TOPIC}/status",
+                json.dumps({"state": state, "position": position, "speed": speed}),
+            )
+
+        except Exception as e:
+            logging.error(f"{type(e)}: {e}")
+
+    def play(
+        self,
+        speed: float = 1,
+        timing: bool = False,
+        timing_csv: str = None,
+        clock=None,
+    ) -> dict:
         """Play the logged data at a certain speed using an async function.
 
         Parameters
         ----------
         speed : float
             Speed multiplier to determine how fast to send out the data. A higher value means faster.
+        timing : bool
+            Measure the intended against the actual publish time of every message, see `PlaybackTiming`
+        timing_csv : str
+            Filepath of a csv to write the timing of every message to (implies timing)
+        clock : `VirtualClock`
+            Simulated clock to play against instead of waiting in real time (None plays in real time)
+
+        Returns
+        -------
+        dict
+            Timing summary (see `PlaybackTiming.summary`) if timing was measured, otherwise None
+        """
+        # Run the event loop to issue out all of the MQTT publishes
+        return asyncio.run(self.play_async(speed, timing, timing_csv, clock))
+
+    async def play_async(
+        self,
+        speed: float = 1,
+        timing: bool = False,
+        timing_csv: str = None,
+        clock=None,
+    ) -> dict:
+        """Play the logged data on the running event loop, see `play`.
+
+        Use this to play into an asyncio queue that is consumed on the same event loop.
         """
 
         logging.info(f"⚡ Playback initiated at {speed}x speed ⚡")
 
-        # Run the event loop to issue out all of the MQTT publishes
-        asyncio.run(self._publish(speed))
+        playback_timing = None
+        if timing or timing_csv:
+            playback_timing = PlaybackTiming(timing_csv)
+
+        # The network loop has to run to receive control commands
+        if self._CONTROL_TOPIC is not None:
+            self._CLIENT.loop_start()
+
+        try:
+            await self._publish(speed, playback_timing, clock)
+        finally:
+            if self._CONTROL_TOPIC is not None:
+                self._CLIENT.loop_stop()
+            if playback_timing is not None:
+                playback_timing.close()
+
+        if playback_timing is None:
+            return None
+
+        logging.info(f"Playback timing:\n{playback_timing.format_summary()}")
+        return playback_timing.summary()
 
-    async def _publish(self, speed) -> None:
-        """Async function that collects all the necessary publish functions and gathers them to then be run by the
-        event loop.
+    def messages(self, speed: float = None):
+        """Streams the messages to play as a generator of (time_delta, mqtt_topic, message).
+
+        Parameters
+        ----------
+        speed : float
+            Speed multiplier the messages are yielded at, waiting until each one is due (None yields them as fast
+            as they are read)
+        """
+        rows = self._read_rows()
+        if speed is None:
+            yield from rows
+            return
+
+        start_time = time.perf_counter() - (self._START or 0) / speed
+        for row in rows:
+            delay = start_time + row[0] / speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            yield row
+
+    def play_max_rate(
+        self, qos: int = 0, max_inflight: int = 100, ack_timeout: float = 30
+    ) -> dict:
+        """Publish the logged data as fast as the broker accepts it, ignoring the recorded timing.
+
+        At most `max_inflight` messages are waiting for the broker at any time (PUBACK for QoS 1, PUBCOMP for
+        QoS 2, or the socket write for QoS 0), so the publish rate is limited by the broker and the network rather
+        than by the log.
+
+        Parameters
+        ----------
+        qos : int
+            MQTT quality of service of the publishes (0, 1 or 2)
+        max_inflight : int
+            Maximum number of publishes that have not been acknowledged yet
+        ack_timeout : float
+            Maximum time in seconds to wait for an acknowledgement before giving up
+
+        Returns
+        -------
+        dict
+            Report with the messages, bytes, errors, duration (s), msgs_per_s, bytes_per_s and the publish to
+            acknowledgement latency percentiles in ms (latency_ms)
+        """
+        if self._CLIENT is None:
+            raise ValueError("Max rate playback needs a broker, not a sink")
+
+        logging.info(
+            f"⚡ Playback initiated at max rate (QoS {qos}, {max_inflight} in flight) ⚡"
+        )
+
+        window = threading.BoundedSemaphore(max_inflight)
+        lock = threading.Lock()
+        send_times = {}
+        early_acks = {}
+        latencies = array("d")
+
+        def _on_publish(client, userdata, mid):
+            ack_time = time.perf_counter()
+            with lock:
+                send_time = send_times.pop(mid, None)
+                if send_time is None:
+                    # Acknowledged before publish returned the message id
+                    early_acks[mid] = ack_time
+                    return
+                latencies.append(ack_time - send_time)
+            window.release()
+
+        self._CLIENT.on_publish = _on_publish
+        self._CLIENT.max_inflight_messages_set(max_inflight)
+        self._CLIENT.loop_start()
+        if not self._CONNECTED.wait(ack_timeout):
+            self._CLIENT.loop_stop()
+            raise ConnectionError("Could not connect to the MQTT broker")
+
+        messages = 0
+        size = 0
+        errors = 0
+        start_time = time.perf_counter()
+        try:
+            for _, mqtt_topic, message in self._read_rows():
+                if not window.acquire(timeout=ack_timeout):
+                    raise TimeoutError(
+                        f"No acknowledgement from the broker for {ack_timeout}s"
+                    )
+
+                send_time = time.perf_counter()
+                info = self._CLIENT.publish(mqtt_topic, message, qos=qos)
+                if info.rc != mqtt.MQTT_ERR_SUCCESS:
+                    errors += 1
+                    window.release()
+                    continue
+
+                with lock:
+                    ack_time = early_acks.pop(info.mid, None)
+                    if ack_time is None:
+                        send_times[info.mid] = send_time
+                    else:
+                        latencies.append(ack_time - send_time)
+                if ack_time is not None:
+                    window.release()
+
+                messages += 1
+                size += len(
+                    message.encode("utf-8") if isinstance(message, str) else message
+                )
+
+            # Wait for the messages still in flight
+            for _ in range(max_inflight):
+                if not window.acquire(timeout=ack_timeout):
+                    raise TimeoutError(
+                        f"No acknowledgement from the broker for {ack_timeout}s"
+                    )
+
+        except TimeoutError as e:
+            logging.error(f"{type(e)}: {e}")
+            errors += len(send_times)
+
+        finally:
+            duration = time.perf_counter() - start_time
+            self._CLIENT.loop_stop()
+            self._CLIENT.on_publish = None
+
+        report = {
+            "messages": messages,
+            "bytes": size,
+            "errors": errors,
+            "duration": duration,
+            "msgs_per_s": messages / duration if duration > 0 else 0,
+            "bytes_per_s": size / duration if duration > 0 else 0,
+            "latency_ms": percentiles(latency * 1000 for latency in latencies),
+        }
+        logging.info(f"Playback report: {report}")
+        return report
+
+    async def _publish(self, speed, playback_timing=None, clock=None) -> None:
+        """Async function that streams the log and publishes each row at its scheduled time.
+
+        Each row is due at an absolute deadline (the playback start time plus its scaled time_delta), so sleep
+        inaccuracies never accumulate. A single loop tops up a bounded window of upcoming rows while waiting and
+        publishes every due row in log order, which keeps the order of rows with equal timestamps stable.
+
+        Control commands wake the loop from its sleep. A pause or speed change moves the start time so the position
+        in the log carries on from where it was, and a seek re-enters the log through its time index.
 
         Parameters
         ----------
         speed : float
             Speed multiplier to determine how fast to send out the data. A higher value means faster.
+        playback_timing : `PlaybackTiming`
+            Records the intended and actual publish time of every message (None does not measure)
+        clock : `VirtualClock`
+            Simulated clock to play against (None plays in real time)
         """
+        loop = asyncio.get_running_loop()
+        if clock is None:
+            now_time = loop.time
+            sleep = self._sleep
+        else:
+            now_time = clock.time
+            sleep = clock.sleep
+        publish = self._SINK.publish
 
-        async def _publish_aux(row):
-            scaled_sleep = row["time_delta"] / speed
-            await asyncio.sleep(scaled_sleep)
+        rows = self._read_rows()
+        upcoming = deque()
+        exhausted = False
 
-            logging.info(
-                f"{round(row['time_delta'], 5): <10} | {round(scaled_sleep, 5): <10} | {row['mqtt_topic']: <50} | {row['message']}"
-            )
+        # The first row played (at the start time_delta) is published straight away
+        playback_start = now_time()
+        start_time = playback_start - (self._START or 0) / speed
 
-            try:
-                self._CLIENT.publish(row["mqtt_topic"], row["message"])
+        # Position in the log while paused (None while playing)
+        paused_at = None
+        next_status = playback_start if self._CONTROL_TOPIC is not None else None
 
-            except Exception as e:
-                logging.error(f"{type(e)}: {e}")
+        self._LOOP = loop
+        try:
+            while True:
+                # Apply the control commands that arrived since the last iteration
+                while self._COMMANDS:
+                    command, value = self._COMMANDS.popleft()
+                    now = now_time()
+                    position = (
+                        paused_at
+                        if paused_at is not None
+                        else (now - start_time) * speed
+                    )
+
+                    if command == "pause":
+                        paused_at = position
+                    elif command == "resume" and paused_at is not None:
+                        start_time = now - paused_at / speed
+                        paused_at = None
+                    elif command == "speed":
+                        speed = value
+                        if paused_at is None:
+                            start_time = now - position / speed
+                    elif command == "seek":
+                        rows = self._read_rows(value)
+                        upcoming.clear()
+                        exhausted = False
+                        if paused_at is None:
+                            start_time = now - value / speed
+                        else:
+                            paused_at = value
+
+                    logging.info(
+                        f"Playback {command} {value if value is not None else ''}"
+                    )
+                    if next_status is not None:
+                        next_status = now
+
+                # Read ahead (without ever holding more than the lookahead window)
+                while not exhausted and len(upcoming) < self._LOOKAHEAD:
+                    try:
+                        upcoming.append(next(rows))
+                    except StopIteration:
+                        exhausted = True
+
+                now = now_time()
+                if next_status is not None and now >= next_status:
+                    if paused_at is not None:
+                        self._publish_status("paused", paused_at, speed)
+                    else:
+                        self._publish_status(
+                            "playing", (now - start_time) * speed, speed
+                        )
+                    next_status = now + self._STATUS_INTERVAL
+
+                status_delay = None if next_status is None else next_status - now
+                if paused_at is not None:
+                    # Wait in real time for the next command, even with a virtual clock
+                    await self._sleep(None if clock is not None else status_delay)
+                    continue
+
+                if not upcoming:
+                    break
+
+                time_delta, mqtt_topic, message = upcoming[0]
+                scaled_sleep = time_delta / speed
+                delay = start_time + scaled_sleep - now
+                if delay > 0:
+                    if status_delay is not None:
+                        delay = min(delay, status_delay)
+                    await sleep(delay)
+                    continue
+
+                # Publish every row that is now due
+                while upcoming and start_time + upcoming[0][0] / speed <= now:
+                    time_delta, mqtt_topic, message = upcoming.popleft()
+
+                    if logging.getLogger().isEnabledFor(logging.INFO):
+                        logging.info(
+                            f"{round(time_delta, 5): <10} | {round(time_delta / speed, 5): <10} | {mqtt_topic: <50} | {message}"
+                        )
+
+                    try:
+                        result = publish(time_delta, mqtt_topic, message)
+                        if result is not None:
+                            await result
+
+                        # Timed once the publish returned, so its own cost counts as lag
+                        if playback_timing is not None:
+                            playback_timing.record(
+                                time_delta,
+                                mqtt_topic,
+                                start_time + time_delta / speed - playback_start,
+                                now_time() - playback_start,
+                            )
+
+                    except Exception as e:
+                        logging.error(f"{type(e)}: {e}")
+
+                    if self._COMMANDS:
+                        # React to a command without finishing the burst
+                        break
+
+        finally:
+            self._LOOP = None
+            self._WAKER = None
 
-        publish_queue = []
-        for row in self._log_data:
-            publish_queue.append(_publish_aux(row))
+            result = self._SINK.close()
+            if result is not None:
+                await result
 
-        # Load all async operation at the start using gather
-        await asyncio.gather(*publish_queue, return_exceptions=True)
+        if next_status is not None:
+            self._publish_status("finished", (now_time() - start_time) * speed, speed)
@@ -0,0 +1,52 @@
+import math
+import os
+import time
+
+
+def percentiles(values, quantiles=(50, 90, 99)) -> dict:
+    """Computes percentiles with the nearest rank method.
+
+    Parameters
+    ----------
+    values : iterable(float)
+        Samples, in any order
+    quantiles : iterable(float)
+        Percentiles to compute (0 to 100)
+
+    Returns
+    -------
+    dict
+        {"p50": ..., "p90": ..., "p99": ..., "max": ...} with None values if there are no samples
+    """
+    ordered = sorted(values)
+    result = {}
+    for quantile in quantiles:
+        key = f"p{quantile:g}"
+        if not ordered:
+            result[key] = None
+            continue
+
+        rank = max(1, math.ceil(quantile / 100 * len(ordered)))
+        result[key] = ordered[rank - 1]
+
+    result["max"] = ordered[-1] if ordered else None
+    return result
+
+
+def process_usage() -> dict:
+    """Resource use of this process, without any extra dependencies.
+
+    Returns
+    -------
+    dict
+        cpu_time (seconds of CPU used by every thread so far) and rss_bytes (resident memory, None where
+        /proc is not available)
+    """
+    rss_bytes = None
+    try:
+        with open("/proc/self/statm") as statm:
+            rss_bytes = int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+
+    return {"cpu_time": time.process_time(), "rss_bytes": rss_bytes}
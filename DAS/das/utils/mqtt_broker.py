@@ -0,0 +1,406 @@
+import itertools
+import logging
+import socket
+import socketserver
+import struct
+import threading
+
+from das.utils.topic_filter import TopicFilter
+
+# MQTT control packet types
+CONNECT = 1
+CONNACK = 2
+PUBLISH = 3
+PUBACK = 4
+PUBREC = 5
+PUBREL = 6
+PUBCOMP = 7
+SUBSCRIBE = 8
+SUBACK = 9
+UNSUBSCRIBE = 10
+UNSUBACK = 11
+PINGREQ = 12
+PINGRESP = 13
+DISCONNECT = 14
+
+# Highest QoS the broker delivers with, subscriptions asking for more are granted this
+MAX_QOS = 1
+
+
+def _encode_length(length: int) -> bytes:
+    """Encodes the remaining length of a packet as an MQTT variable byte integer."""
+    encoded = bytearray()
+    while True:
+        byte = length % 128
+        length //= 128
+        encoded.append(byte | 0x80 if length else byte)
+        if not length:
+            return bytes(encoded)
+
+
+def _encode_string(value) -> bytes:
+    """Encodes a str or bytes with its 2 byte length prefix."""
+    if isinstance(value, str):
+        value = value.encode("utf-8")
+    return struct.pack("!H", len(value)) + value
+
+
+def _packet(packet_type: int, flags: int = 0, body: bytes = b"") -> bytes:
+    """Builds a packet from its type, fixed header flags and the rest of the packet."""
+    return bytes([packet_type << 4 | flags]) + _encode_length(len(body)) + body
+
+
+def _read_string(data: bytes, position: int) -> tuple:
+    """Reads a length prefixed string, returning the bytes and the position after it."""
+    (length,) = struct.unpack_from("!H", data, position)
+    start = position + 2
+    return data[start : start + length], start + length
+
+
+class _Connection(socketserver.BaseRequestHandler):
+    """One client connection of the `MqttBroker`, handled on its own thread.
+
+    Attributes
+    ----------
+    client_id : str
+        Client identifier sent in the CONNECT packet
+    _routes : tuple
+        All of the subscribed topic filters compiled into one `TopicFilter` (None without any), and the (maximum QoS, `TopicFilter`)
+        of each subscribed topic filter. It is replaced rather than changed, so publishers on other threads always
+        see a consistent copy.
+    _SEND_LOCK : `threading.Lock`
+        Serialises the writes to the socket, which come from every publisher's thread
+    """
+
+    def setup(self) -> None:
+        self.client_id = None
+        self._routes = (None, {})
+        self._SEND_LOCK = threading.Lock()
+        self._PACKET_IDS = itertools.cycle(range(1, 65536))
+        self._will = None
+        self._reader = self.request.makefile("rb")
+
+    def send(self, packet: bytes) -> None:
+        """Writes a packet to the client (from any thread), a closed connection is ignored."""
+        try:
+            with self._SEND_LOCK:
+                self.request.sendall(packet)
+        except OSError:
+            pass
+
+    def close(self) -> None:
+        """Closes the connection, the reading thread then finishes."""
+        try:
+            self.request.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    @property
+    def subscriptions(self) -> dict:
+        """Maximum QoS of each subscribed topic filter."""
+        return {topic_filter: qos for topic_filter, (qos, _) in self._routes[1].items()}
+
+    def matching_qos(self, topic: str) -> int:
+        """Maximum QoS of the subscriptions matching topic (None if it is not subscribed to)."""
+        any_filter, filters = self._routes
+        if any_filter is None or not any_filter.matches(topic):
+            return None
+        return max(qos for qos, single in filters.values() if single.matches(topic))
+
+    def deliver(self, topic: str, payload: bytes, qos: int, retain: bool = False):
+        """Sends a PUBLISH to the client."""
+        body = _encode_string(topic)
+        if qos:
+            body += struct.pack("!H", next(self._PACKET_IDS))
+        self.send(_packet(PUBLISH, qos << 1 | int(retain), body + payload))
+
+    def _read_packet(self) -> tuple:
+        """Reads the next packet, returning (type, flags, body) or None once the connection is closed."""
+        header = self._reader.read(1)
+        if not header:
+            return None
+
+        length = 0
+        multiplier = 1
+        while True:
+            byte = self._reader.read(1)
+            if not byte:
+                return None
+            length += (byte[0] & 0x7F) * multiplier
+            if not byte[0] & 0x80:
+                break
+            multiplier *= 128
+
+        body = self._reader.read(length)
+        if len(body) < length:
+            return None
+        return header[0] >> 4, header[0] & 0x0F, body
+
+    def handle(self) -> None:
+        broker = self.server.broker
+        clean_exit = False
+        try:
+            packet = self._read_packet()
+            if packet is None or packet[0] != CONNECT:
+                return
+            self._connect(packet[2])
+
+            while True:
+                packet = self._read_packet()
+                if packet is None:
+                    break
+
+                packet_type, flags, body = packet
+                if packet_type == PUBLISH:
+                    self._publish(flags, body)
+                elif packet_type == PUBREL:
+                    self.send(_packet(PUBCOMP, 0, body[:2]))
+                elif packet_type == SUBSCRIBE:
+                    self._subscribe(body)
+                elif packet_type == UNSUBSCRIBE:
+                    self._unsubscribe(body)
+                elif packet_type == PINGREQ:
+                    self.send(_packet(PINGRESP))
+                elif packet_type == DISCONNECT:
+                    clean_exit = True
+                    break
+                # PUBACK, PUBREC and PUBCOMP from the client need no answer
+
+        except (OSError, struct.error, ValueError, IndexError) as e:
+            logging.error(f"{type(e)}: {e}")
+
+        finally:
+            self._reader.close()
+            broker._remove(self)
+            if self._will is not None and not clean_exit:
+                broker.publish(*self._will)
+
+    def _connect(self, body: bytes) -> None:
+        """Handles the CONNECT packet: stores the will and accepts the client."""
+        _, position = _read_string(body, 0)  # Protocol name (MQTT or MQIsdp)
+        flags = body[position + 1]
+        position += 4  # Protocol level, connect flags and keep alive
+        client_id, position = _read_string(body, position)
+
+        if flags & 0x04:
+            will_topic, position = _read_string(body, position)
+            will_payload, position = _read_string(body, position)
+            self._will = (
+                will_topic.decode("utf-8"),
+                will_payload,
+                flags >> 3 & 0x03,
+                bool(flags & 0x20),
+            )
+
+        self.client_id = client_id.decode("utf-8") or f"das-broker-{id(self)}"
+        self.server.broker._add(self)
+        self.send(_packet(CONNACK, 0, b"\x00\x00"))
+
+    def _publish(self, flags: int, body: bytes) -> None:
+        """Handles a PUBLISH from the client: acknowledges it and routes it to the subscribers."""
+        qos = flags >> 1 & 0x03
+        topic, position = _read_string(body, 0)
+        packet_id = body[position : position + 2]
+        if qos:
+            position += 2
+
+        self.server.broker.publish(
+            topic.decode("utf-8"), body[position:], qos, bool(flags & 0x01)
+        )
+        if qos == 1:
+            self.send(_packet(PUBACK, 0, packet_id))
+        elif qos == 2:
+            self.send(_packet(PUBREC, 0, packet_id))
+
+    def _subscribe(self, body: bytes) -> None:
+        """Handles a SUBSCRIBE: acknowledges it and sends the matching retained messages."""
+        packet_id = body[:2]
+        position = 2
+        granted = bytearray()
+        filters = dict(self._routes[1])
+        new_filters = []
+        while position < len(body):
+            topic_filter, position = _read_string(body, position)
+            topic_filter = topic_filter.decode("utf-8")
+            qos = min(body[position], MAX_QOS)
+            position += 1
+
+            try:
+                single = TopicFilter([topic_filter])
+            except ValueError:
+                granted.append(0x80)
+                continue
+            filters[topic_filter] = (qos, single)
+            new_filters.append((qos, single))
+            granted.append(qos)
+
+        self._routes = (TopicFilter(list(filters)) if filters else None, filters)
+        self.send(_packet(SUBACK, 0, packet_id + bytes(granted)))
+
+        for topic, (payload, retained_qos) in self.server.broker.retained_messages():
+            for qos, single in new_filters:
+                if single.matches(topic):
+                    self.deliver(topic, payload, min(qos, retained_qos), retain=True)
+                    break
+
+    def _unsubscribe(self, body: bytes) -> None:
+        """Handles an UNSUBSCRIBE."""
+        position = 2
+        filters = dict(self._routes[1])
+        while position < len(body):
+            topic_filter, position = _read_string(body, position)
+            filters.pop(topic_filter.decode("utf-8"), None)
+
+        self._routes = (TopicFilter(list(filters)) if filters else None, filters)
+        self.send(_packet(UNSUBACK, 0, body[:2]))
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class MqttBroker:
+    """Lightweight MQTT 3.1.1 broker that runs inside the Python process, for tests and benchmarks.
+
+    Clients (e.g. a `Recorder` or a `Playback`) connect to it over a local socket like any other broker, so nothing
+    outside the process is needed and results do not depend on a public broker or the network. It supports
+    subscriptions with + and # wildcards, retained messages, will messages and QoS 0 and 1 (QoS 2 publishes are
+    accepted with the full handshake, subscriptions are granted at most QoS 1). There is no authentication, no
+    persistent sessions and messages in flight are not retried, it is not meant to replace a real broker.
+
+    Parameters
+    ----------
+    host : str
+        Address to listen on
+    port : int
+        Port to listen on (0 picks a free port, see `port`)
+
+    Attributes
+    ----------
+    retained : dict
+        Retained (payload, qos) by topic
+    received : int
+        Number of messages published to the broker
+    delivered : int
+        Number of messages sent to subscribers
+    _CONNECTIONS : dict
+        Connected clients by client id
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.retained = {}
+        self.received = 0
+        self.delivered = 0
+        self._CONNECTIONS = {}
+        self._LOCK = threading.Lock()
+
+        self._SERVER = _Server((host, port), _Connection)
+        self._SERVER.broker = self
+        self._THREAD = threading.Thread(
+            target=self._SERVER.serve_forever, name="MqttBroker", daemon=True
+        )
+
+    @property
+    def host(self) -> str:
+        """Address the broker listens on."""
+        return self._SERVER.server_address[0]
+
+    @property
+    def port(self) -> int:
+        """Port the broker listens on."""
+        return self._SERVER.server_address[1]
+
+    @property
+    def clients(self) -> list:
+        """Client ids of the connected clients."""
+        with self._LOCK:
+            return list(self._CONNECTIONS)
+
+    def start(self) -> "MqttBroker":
+        """Starts accepting connections."""
+        self._THREAD.start()
+        return self
+
+    def stop(self) -> None:
+        """Stops the broker and closes every connection."""
+        self._SERVER.shutdown()
+        self._SERVER.server_close()
+        with self._LOCK:
+            connections = list(self._CONNECTIONS.values())
+        for connection in connections:
+            connection.close()
+
+    def __enter__(self) -> "MqttBroker":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def subscribers(self, topic: str) -> list:
+        """Client ids of the connected clients subscribed to topic."""
+        with self._LOCK:
+            connections = list(self._CONNECTIONS.values())
+        return [
+            connection.client_id
+            for connection in connections
+            if connection.matching_qos(topic) is not None
+        ]
+
+    def retained_messages(self) -> list:
+        """(topic, (payload, qos)) of every retained message."""
+        with self._LOCK:
+            return list(self.retained.items())
+
+    def _add(self, connection: _Connection) -> None:
+        """Registers a connected client, a client that reconnects with the same id replaces the old connection."""
+        with self._LOCK:
+            previous = self._CONNECTIONS.get(connection.client_id)
+            self._CONNECTIONS[connection.client_id] = connection
+        if previous is not None:
+            previous.close()
+
+    def _remove(self, connection: _Connection) -> None:
+        """Forgets a disconnected client."""
+        with self._LOCK:
+            if self._CONNECTIONS.get(connection.client_id) is connection:
+                del self._CONNECTIONS[connection.client_id]
+
+    def publish(
+        self, topic: str, payload=b"", qos: int = 0, retain: bool = False
+    ) -> None:
+        """Routes a message to every matching subscription (also used for messages from clients).
+
+        Parameters
+        ----------
+        topic : str
+            Topic of the message
+        payload : str or bytes
+            Payload of the message
+        qos : int
+            QoS the message was published with (delivered with at most the QoS of each subscription)
+        retain : bool
+            Keep the message for future subscribers (an empty payload clears the retained message)
+        """
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+
+        with self._LOCK:
+            self.received += 1
+            if retain:
+                if payload:
+                    self.retained[topic] = (payload, min(qos, MAX_QOS))
+                else:
+                    self.retained.pop(topic, None)
+            connections = list(self._CONNECTIONS.values())
+
+        delivered = 0
+        for connection in connections:
+            subscribed_qos = connection.matching_qos(topic)
+            if subscribed_qos is not None:
+                connection.deliver(topic, payload, min(qos, subscribed_qos))
+                delivered += 1
+
+        if delivered:
+            with self._LOCK:
+                self.delivered += delivered
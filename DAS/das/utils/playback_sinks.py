@@ -0,0 +1,135 @@
+from abc import ABC, abstractmethod
+import asyncio
+
+
+class PlaybackSink(ABC):
+    """Destination of the messages played by `Playback`.
+
+    `publish` and `close` may return an awaitable (e.g. to wait for room in a bounded queue), which the playback
+    awaits before carrying on. Anything else they return is ignored.
+    """
+
+    @abstractmethod
+    def publish(self, time_delta: float, mqtt_topic: str, message):
+        """Delivers one message.
+
+        Parameters
+        ----------
+        time_delta : float
+            Time delta of the message in the log
+        mqtt_topic : str
+            Topic of the message
+        message : str or bytes
+            Payload of the message
+        """
+
+    def close(self):
+        """Called once the playback has finished."""
+        return None
+
+
+class MqttSink(PlaybackSink):
+    """Publishes the messages to an MQTT broker.
+
+    Parameters
+    ----------
+    client : `paho.mqtt.client`
+        Connected MQTT client
+    qos : int
+        MQTT quality of service of the publishes
+    """
+
+    def __init__(self, client, qos: int = 0) -> None:
+        self._CLIENT = client
+        self._QOS = qos
+
+    def publish(self, time_delta: float, mqtt_topic: str, message) -> None:
+        self._CLIENT.publish(mqtt_topic, message, qos=self._QOS)
+
+
+class PlaybackCallbackSink(PlaybackSink):
+    """Calls a function with the (time_delta, mqtt_topic, message) of every message.
+
+    Parameters
+    ----------
+    callback : callable
+        Function called for every message, a coroutine function is awaited
+    """
+
+    def __init__(self, callback) -> None:
+        self._CALLBACK = callback
+
+    def publish(self, time_delta: float, mqtt_topic: str, message):
+        return self._CALLBACK(time_delta, mqtt_topic, message)
+
+
+class QueueSink(PlaybackSink):
+    """Puts the (time_delta, mqtt_topic, message) of every message on an asyncio queue.
+
+    A bounded queue applies backpressure, the playback waits for the consumer whenever the queue is full.
+
+    Parameters
+    ----------
+    queue : `asyncio.Queue`
+        Queue read by the consumer (on the event loop of the playback)
+    end_marker
+        Item put on the queue once the playback has finished (None does not put one)
+    """
+
+    def __init__(self, queue: asyncio.Queue, end_marker=None) -> None:
+        self.QUEUE = queue
+        self._END_MARKER = end_marker
+
+    def publish(self, time_delta: float, mqtt_topic: str, message):
+        item = (time_delta, mqtt_topic, message)
+        try:
+            self.QUEUE.put_nowait(item)
+        except asyncio.QueueFull:
+            return self.QUEUE.put(item)
+
+    def close(self):
+        if self._END_MARKER is not None:
+            return self.QUEUE.put(self._END_MARKER)
+
+
+def as_sink(sink) -> PlaybackSink:
+    """Wraps an asyncio queue or a callable into a `PlaybackSink`, sinks are returned as is."""
+    if isinstance(sink, PlaybackSink):
+        return sink
+    if isinstance(sink, asyncio.Queue):
+        return QueueSink(sink)
+    if callable(sink):
+        return PlaybackCallbackSink(sink)
+
+    raise TypeError(f"{type(sink)} can not be used as a playback sink")
+
+
+class VirtualClock:
+    """Simulated clock for a playback that never waits in real time.
+
+    Sleeping moves the clock forward straight away, so a log is replayed as fast as the sinks consume it while the
+    clock still reads the time each message would have been published at (scaled by the playback speed).
+
+    Parameters
+    ----------
+    start : float
+        Time the clock starts at in seconds
+
+    Attributes
+    ----------
+    now : float
+        Current time of the clock in seconds
+    """
+
+    def __init__(self, start: float = 0.0) -> None:
+        self.now = start
+
+    def time(self) -> float:
+        """Current time of the clock in seconds."""
+        return self.now
+
+    async def sleep(self, delay: float) -> None:
+        """Moves the clock forward by delay seconds, only giving other tasks a chance to run."""
+        if delay is not None and delay > 0:
+            self.now += delay
+        await asyncio.sleep(0)
@@ -0,0 +1,158 @@
+from bisect import bisect_left
+import csv
+import math
+
+# Upper edges in ms of the lag histogram buckets (the last bucket holds everything above the last edge)
+LAG_BUCKETS_MS = [0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]
+
+
+class PlaybackTiming:
+    """Measures how faithfully a playback follows the timing of the log.
+
+    For every message the intended publish time (from its time_delta and the playback speed) is compared with
+    the time it was actually published. The lag is collected into a fixed histogram and running sums, so the
+    memory use does not grow with the length of the log, and can optionally be streamed to a csv for plotting.
+
+    Parameters
+    ----------
+    csv_path : str
+        Filepath of a csv to write every message's timing to (None does not write one)
+
+    Attributes
+    ----------
+    messages : int
+        Number of messages measured
+    histogram : list(int)
+        Number of messages per lag bucket, see LAG_BUCKETS_MS
+    """
+
+    def __init__(self, csv_path: str = None) -> None:
+        self.messages = 0
+        self.histogram = [0] * (len(LAG_BUCKETS_MS) + 1)
+        self._min_lag = math.inf
+        self._max_lag = -math.inf
+        self._last_lag = None
+
+        # Running sums for the mean, standard deviation and the least squares fit of lag against time
+        self._sum_lag = 0.0
+        self._sum_lag_squared = 0.0
+        self._sum_time = 0.0
+        self._sum_time_squared = 0.0
+        self._sum_time_lag = 0.0
+
+        self._CSV_FILE = None
+        self._CSV_WRITER = None
+        if csv_path is not None:
+            self._CSV_FILE = open(csv_path, "w", newline="")
+            self._CSV_WRITER = csv.writer(self._CSV_FILE)
+            self._CSV_WRITER.writerow(
+                ["time_delta", "mqtt_topic", "intended", "actual", "lag_ms"]
+            )
+
+    def record(
+        self, time_delta: float, mqtt_topic: str, intended: float, actual: float
+    ) -> None:
+        """Records the timing of one published message.
+
+        Parameters
+        ----------
+        time_delta : float
+            Time delta of the message in the log
+        mqtt_topic : str
+            Topic of the message
+        intended : float
+            Time in seconds since the start of the playback the message was due
+        actual : float
+            Time in seconds since the start of the playback the message was published
+        """
+        lag = (actual - intended) * 1000
+        self.messages += 1
+        self._last_lag = lag
+        self._min_lag = min(self._min_lag, lag)
+        self._max_lag = max(self._max_lag, lag)
+        self._sum_lag += lag
+        self._sum_lag_squared += lag * lag
+        self._sum_time += intended
+        self._sum_time_squared += intended * intended
+        self._sum_time_lag += intended * lag
+
+        self.histogram[bisect_left(LAG_BUCKETS_MS, lag)] += 1
+
+        if self._CSV_WRITER is not None:
+            self._CSV_WRITER.writerow(
+                [
+                    time_delta,
+                    mqtt_topic,
+                    f"{intended:.6f}",
+                    f"{actual:.6f}",
+                    f"{lag:.3f}",
+                ]
+            )
+
+    def summary(self) -> dict:
+        """Summary of the lag of the messages published so far.
+
+        Returns
+        -------
+        dict
+            messages, mean/std (the jitter)/min/max/last lag in ms, drift in ms of lag gained per minute of
+            playback (from a least squares fit) and the histogram as {"<=1ms": count, ..., ">1000ms": count}
+        """
+        n = self.messages
+        summary = {"messages": n}
+        if n == 0:
+            return summary
+
+        mean = self._sum_lag / n
+        variance = max(0.0, self._sum_lag_squared / n - mean * mean)
+        time_variance = self._sum_time_squared / n - (self._sum_time / n) ** 2
+        drift = 0.0
+        if time_variance > 0:
+            covariance = self._sum_time_lag / n - (self._sum_time / n) * mean
+            drift = covariance / time_variance * 60
+
+        labels = [f"<={edge:g}ms" for edge in LAG_BUCKETS_MS] + [
+            f">{LAG_BUCKETS_MS[-1]:g}ms"
+        ]
+        summary.update(
+            {
+                "mean_lag_ms": mean,
+                "jitter_ms": math.sqrt(variance),
+                "min_lag_ms": self._min_lag,
+                "max_lag_ms": self._max_lag,
+                "last_lag_ms": self._last_lag,
+                "drift_ms_per_min": drift,
+                "histogram": dict(zip(labels, self.histogram)),
+            }
+        )
+        return summary
+
+    def format_summary(self) -> str:
+        """Summary as printable text, see `format_timing_summary`."""
+        return format_timing_summary(self.summary())
+
+    def close(self) -> None:
+        """Closes the timing csv (if any)."""
+        if self._CSV_FILE is not None:
+            self._CSV_FILE.close()
+
+
+def format_timing_summary(summary: dict) -> str:
+    """Formats a `PlaybackTiming.summary` as printable text with a bar chart of the lag histogram."""
+    if summary["messages"] == 0:
+        return "No messages were published"
+
+    lines = [
+        f"{summary['messages']} messages | lag mean {summary['mean_lag_ms']:.3f}ms | "
+        f"jitter {summary['jitter_ms']:.3f}ms | min {summary['min_lag_ms']:.3f}ms | "
+        f"max {summary['max_lag_ms']:.3f}ms",
+        f"Drift {summary['drift_ms_per_min']:+.3f}ms per minute, "
+        f"lag at the end {summary['last_lag_ms']:.3f}ms",
+    ]
+
+    largest = max(summary["histogram"].values())
+    for label, count in summary["histogram"].items():
+        bar = "#" * round(40 * count / largest) if largest else ""
+        lines.append(f"{label: >9} | {count: >9} | {bar}")
+
+    return "\n".join(lines)
@@ -0,0 +1,178 @@
+from array import array
+
+
+class PreTriggerBuffer:
+    """Bounded ring buffer of the most recent messages, kept while waiting for a trigger.
+
+    All of the memory is allocated up front: the payloads are copied into one circular bytearray and the time,
+    topic, position and length of each message are kept in fixed size arrays. Once any limit is reached the oldest
+    messages are discarded, so the memory use never grows however long the buffer waits. Topics are stored once
+    each and referred to by number.
+
+    Parameters
+    ----------
+    max_seconds : float
+        Messages older than this many seconds (relative to the newest message) are discarded (None keeps them
+        until a size limit is reached)
+    max_bytes : int
+        Size of the payload storage in bytes
+    max_records : int
+        Maximum number of messages held
+
+    Attributes
+    ----------
+    dropped : int
+        Number of messages discarded to stay within the limits
+    _PAYLOADS : bytearray
+        Circular storage of the payloads
+    _TIMES : `array`
+        Time delta of each slot
+    _STARTS : `array`
+        Position of the payload of each slot in _PAYLOADS
+    _LENGTHS : `array`
+        Length of the payload of each slot
+    _TOPIC_IDS : `array`
+        Topic number of each slot
+    """
+
+    def __init__(
+        self,
+        max_seconds: float = 10.0,
+        max_bytes: int = 8 * 1024 * 1024,
+        max_records: int = 100000,
+    ) -> None:
+        self._MAX_SECONDS = max_seconds
+        self._MAX_BYTES = max_bytes
+        self._MAX_RECORDS = max_records
+
+        self._PAYLOADS = bytearray(max_bytes)
+        self._TIMES = array("d", bytes(8 * max_records))
+        self._STARTS = array("q", bytes(8 * max_records))
+        self._LENGTHS = array("q", bytes(8 * max_records))
+        self._TOPIC_IDS = array("l", bytes(array("l").itemsize * max_records))
+
+        self._topics = []
+        self._topic_ids = {}
+
+        # Slot of the oldest message, number of messages and where the next payload is written
+        self._first = 0
+        self._count = 0
+        self._head = 0
+        self._used_bytes = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def bytes(self) -> int:
+        """Size of the payloads held in bytes."""
+        return self._used_bytes
+
+    def _discard_oldest(self) -> None:
+        """Discards the oldest message."""
+        self._used_bytes -= self._LENGTHS[self._first]
+        self._first = (self._first + 1) % self._MAX_RECORDS
+        self._count -= 1
+        self.dropped += 1
+
+    def append(self, time_delta: float, mqtt_topic: str, message) -> None:
+        """Adds a message, discarding the oldest messages to make room.
+
+        Parameters
+        ----------
+        time_delta : float
+            Time delta of the message
+        mqtt_topic : str
+            Topic of the message
+        message : str or bytes
+            Payload of the message (str is stored as utf-8)
+        """
+        if isinstance(message, str):
+            message = message.encode("utf-8")
+
+        length = len(message)
+        if length > self._MAX_BYTES:
+            # Could never fit, so it is dropped rather than emptying the buffer
+            self.dropped += 1
+            return
+
+        while self._count and (
+            self._count == self._MAX_RECORDS
+            or self._used_bytes + length > self._MAX_BYTES
+        ):
+            self._discard_oldest()
+        if self._count == 0:
+            self._head = 0
+
+        # The payload wraps around to the start of the storage if it does not fit at the end
+        start = self._head
+        end = start + length
+        if end <= self._MAX_BYTES:
+            self._PAYLOADS[start:end] = message
+        else:
+            split = self._MAX_BYTES - start
+            self._PAYLOADS[start:] = message[:split]
+            self._PAYLOADS[: length - split] = message[split:]
+        self._head = end % self._MAX_BYTES if self._MAX_BYTES else 0
+
+        topic_id = self._topic_ids.get(mqtt_topic)
+        if topic_id is None:
+            topic_id = self._topic_ids[mqtt_topic] = len(self._topics)
+            self._topics.append(mqtt_topic)
+
+        slot = (self._first + self._count) % self._MAX_RECORDS
+        self._TIMES[slot] = time_delta
+        self._STARTS[slot] = start
+        self._LENGTHS[slot] = length
+        self._TOPIC_IDS[slot] = topic_id
+        self._count += 1
+        self._used_bytes += length
+
+        # Drop the messages that are older than the time window
+        if self._MAX_SECONDS is not None:
+            oldest_allowed = time_delta - self._MAX_SECONDS
+            while self._count > 1 and self._TIMES[self._first] < oldest_allowed:
+                self._discard_oldest()
+
+    def _payload(self, slot: int) -> bytes:
+        """Copy of the payload of a slot."""
+        start = self._STARTS[slot]
+        end = start + self._LENGTHS[slot]
+        if end <= self._MAX_BYTES:
+            return bytes(self._PAYLOADS[start:end])
+
+        return bytes(self._PAYLOADS[start:]) + bytes(
+            self._PAYLOADS[: end - self._MAX_BYTES]
+        )
+
+    def drain(self) -> list:
+        """Removes and returns every message held, oldest first.
+
+        Returns
+        -------
+        list(tuple)
+            (time_delta, mqtt_topic, message) records with the payloads as bytes
+        """
+        records = []
+        for i in range(self._count):
+            slot = (self._first + i) % self._MAX_RECORDS
+            records.append(
+                (
+                    self._TIMES[slot],
+                    self._topics[self._TOPIC_IDS[slot]],
+                    self._payload(slot),
+                )
+            )
+
+        self.clear()
+        return records
+
+    def clear(self) -> None:
+        """Discards every message held (the payload storage stays allocated)."""
+        self._topics = []
+        self._topic_ids = {}
+        self._first = 0
+        self._count = 0
+        self._head = 0
+        self._used_bytes = 0
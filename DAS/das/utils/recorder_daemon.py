@@ -0,0 +1,291 @@
+import json
+import logging
+import queue
+import signal
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+
+from das.utils.logger import Recorder
+from das.utils.metrics import process_usage
+from das.utils.topic_filter import TopicFilter
+
+
+class RecorderDaemon:
+    """Long running recorder that starts and stops a `Recorder` session whenever a start or stop topic arrives.
+
+    The daemon holds a single MQTT connection for its whole life and every session shares it, so nothing is lost
+    to reconnecting between sessions. The main thread blocks on a queue of commands filled by the MQTT network
+    thread instead of spinning, and wakes up every `status_interval` seconds to publish its state with the CPU and
+    memory use of the process. SIGTERM and SIGINT only set a flag (taking a lock inside a signal handler could
+    deadlock), which is noticed within SIGNAL_CHECK_INTERVAL seconds.
+
+    Parameters
+    ----------
+    csv_folder_path : str
+        Filepath of the folder where the logs are to be stored
+    topics : List(str)
+        A list containing the topic strings that are recorded
+    broker_address : str
+        The IP address that the MQTT broker lives on
+    broker_port : int
+        The port of the MQTT broker
+    start_topics : List(str)
+        Topic filters that start a new session (the message itself is the first one recorded)
+    stop_topics : List(str)
+        Topic filters that stop the current session (the message itself is the last one recorded)
+    status_topic : str
+        Topic the daemon state is published on (None does not publish it), messages on it are never recorded
+    status_interval : float
+        Time in seconds between status messages
+    record_on_start : bool
+        Start a session straight away instead of waiting for a start topic
+    verbose : bool
+        Specifies whether the incoming MQTT data and warnings are printed
+    recorder_options
+        Options passed on to every `Recorder` (log format, segments, compression, sinks...)
+
+    Attributes
+    ----------
+    sessions : int
+        Number of sessions recorded so far
+    _COMMANDS : `queue.Queue`
+        (command, message) pairs waiting for the main thread
+    _SESSION : `Recorder`
+        Recorder of the current session (None while idle)
+    _CLIENT : `paho.mqtt.client`
+        MQTT client shared by every session
+    """
+
+    # Longest time in seconds the main thread blocks before checking for a shutdown signal
+    SIGNAL_CHECK_INTERVAL = 0.5
+
+    def __init__(
+        self,
+        csv_folder_path: str,
+        topics: list = ["#"],
+        broker_address: str = "localhost",
+        broker_port: int = 1883,
+        start_topics: list = None,
+        stop_topics: list = None,
+        status_topic: str = "/v3/recorder/status",
+        status_interval: float = 5.0,
+        record_on_start: bool = False,
+        verbose: bool = False,
+        **recorder_options,
+    ) -> None:
+        self.CSV_FOLDER_PATH = csv_folder_path
+        self.TOPICS = topics
+        self._START_FILTER = TopicFilter(start_topics) if start_topics else None
+        self._STOP_FILTER = TopicFilter(stop_topics) if stop_topics else None
+        self._STATUS_TOPIC = status_topic
+        self._STATUS_INTERVAL = status_interval
+        self._RECORD_ON_START = record_on_start
+        self._VERBOSE = verbose
+        self._RECORDER_OPTIONS = recorder_options
+
+        if verbose:
+            logging.getLogger().setLevel(logging.INFO)
+
+        self.sessions = 0
+        self._COMMANDS = queue.Queue()
+        self._SESSION = None
+        self._SESSION_LOCK = threading.Lock()
+        self._START_TIME = time.monotonic()
+        self._last_usage = None
+        self._shutdown_requested = False
+
+        # One connection for the life of the daemon
+        self._CLIENT = mqtt.Client()
+        self._CLIENT.on_connect = self._on_connect
+        self._CLIENT.on_message = self._on_message
+        self._CLIENT.connect(broker_address, broker_port)
+
+    def _on_connect(self, client, userdata, flags, rc) -> None:
+        """Callback function for MQTT broker on connection."""
+
+        if rc == 0:
+            logging.info("Connection Successful!")
+        else:
+            raise ConnectionError(
+                "Connection was unsuccessful, check that the broker IP is corrrect"
+            )
+
+        # Subscribe to the recorded topics and to the start and stop topics (also on reconnects)
+        try:
+            topics = list(self.TOPICS)
+            for topic_filter in (self._START_FILTER, self._STOP_FILTER):
+                if topic_filter is not None:
+                    topics.extend(topic_filter.INCLUDE)
+
+            for topic in dict.fromkeys(topics):
+                self._CLIENT.subscribe(topic)
+                logging.info(f"Subscribed to: {topic}")
+
+        except Exception as e:
+            logging.error(f"{type(e)}: {e}")
+
+    def _on_message(self, client, userdata, msg) -> None:
+        """Callback function for MQTT broker on message that records the message or queues a start/stop."""
+        # The daemon's own status comes back when its topic is subscribed to (e.g. with #), it is not recorded
+        if msg.topic == self._STATUS_TOPIC:
+            return
+
+        if self._START_FILTER is not None and self._START_FILTER.matches(msg.topic):
+            self._COMMANDS.put(("start", msg))
+            return
+        if self._STOP_FILTER is not None and self._STOP_FILTER.matches(msg.topic):
+            self._COMMANDS.put(("stop", msg))
+            return
+
+        with self._SESSION_LOCK:
+            if self._SESSION is not None:
+                self._SESSION._on_message(client, userdata, msg)
+
+    def start_session(self, msg=None) -> None:
+        """Starts a new session (unless one is already running).
+
+        Parameters
+        ----------
+        msg : `paho.mqtt.client.MQTTMessage`
+            Message that started the session, recorded as its first message
+        """
+        with self._SESSION_LOCK:
+            if self._SESSION is not None:
+                logging.info("Already recording")
+            else:
+                self._SESSION = Recorder(
+                    self.CSV_FOLDER_PATH,
+                    topics=self.TOPICS,
+                    verbose=self._VERBOSE,
+                    client=self._CLIENT,
+                    **self._RECORDER_OPTIONS,
+                )
+                self._SESSION.start()
+                self.sessions += 1
+                logging.info(f"Session started in {self._SESSION.log_filepath}")
+
+            if msg is not None:
+                self._SESSION.log(msg.topic, msg.payload)
+
+    def stop_session(self, msg=None) -> None:
+        """Stops the current session (if any) and saves its log.
+
+        Parameters
+        ----------
+        msg : `paho.mqtt.client.MQTTMessage`
+            Message that stopped the session, recorded as its last message
+        """
+        with self._SESSION_LOCK:
+            session = self._SESSION
+            if session is None:
+                return
+
+            if msg is not None:
+                session.log(msg.topic, msg.payload)
+            self._SESSION = None
+
+        # Draining the queue can take a while, so it is done without holding up the network thread
+        session.stop()
+
+    def shutdown(self) -> None:
+        """Asks the daemon to stop its session and exit (can be called from any thread)."""
+        self._COMMANDS.put(("shutdown", None))
+
+    def _handle_signal(self, signum, frame) -> None:
+        """Signal handler for a clean shutdown on SIGTERM and SIGINT."""
+        self._shutdown_requested = True
+
+    def status(self) -> dict:
+        """Current state of the daemon.
+
+        Returns
+        -------
+        dict
+            state ("recording" or "idle"), log (filepath of the current log), sessions, uptime (s), cpu_percent
+            (of one core, since the previous status), rss_bytes and the writer stats of the current session
+        """
+        now = time.monotonic()
+        usage = process_usage()
+        cpu_percent = None
+        if self._last_usage is not None and now > self._last_usage[0]:
+            cpu_percent = (
+                100
+                * (usage["cpu_time"] - self._last_usage[1]["cpu_time"])
+                / (now - self._last_usage[0])
+            )
+        self._last_usage = (now, usage)
+
+        session = self._SESSION
+        return {
+            "state": "idle" if session is None else "recording",
+            "log": None if session is None else session.log_filepath,
+            "sessions": self.sessions,
+            "uptime": now - self._START_TIME,
+            "cpu_percent": cpu_percent,
+            "rss_bytes": usage["rss_bytes"],
+            "writer": None if session is None else session.stats,
+        }
+
+    def _publish_status(self) -> None:
+        """Publishes the state of the daemon on the status topic."""
+        if self._STATUS_TOPIC is None:
+            return
+
+        try:
+            self._CLIENT.publish(self._STATUS_TOPIC, json.dumps(self.status()))
+
+        except Exception as e:
+            logging.error(f"{type(e)}: {e}")
+
+    def run(self, duration: float = None) -> None:
+        """Runs the daemon until `shutdown` (or SIGTERM/SIGINT when run on the main thread).
+
+        Parameters
+        ----------
+        duration : float
+            Shut down after this many seconds (None runs until shut down)
+        """
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                signal.signal(signum, self._handle_signal)
+
+        self._CLIENT.loop_start()
+        if self._RECORD_ON_START:
+            self.start_session()
+
+        end_time = None if duration is None else time.monotonic() + duration
+        next_status = time.monotonic()
+        try:
+            while not self._shutdown_requested:
+                now = time.monotonic()
+                if now >= next_status:
+                    self._publish_status()
+                    next_status = now + self._STATUS_INTERVAL
+                if end_time is not None and now >= end_time:
+                    break
+
+                # Sleep until the next command, status message or the end
+                timeout = min(next_status - now, self.SIGNAL_CHECK_INTERVAL)
+                if end_time is not None:
+                    timeout = min(timeout, end_time - now)
+                try:
+                    command, msg = self._COMMANDS.get(timeout=max(0, timeout))
+                except queue.Empty:
+                    continue
+
+                if command == "shutdown":
+                    break
+                if command == "start":
+                    self.start_session(msg)
+                elif command == "stop":
+                    self.stop_session(msg)
+                next_status = time.monotonic()
+
+        finally:
+            logging.info("Shutting down")
+            self.stop_session()
+            self._publish_status()
+            self._CLIENT.loop_stop()
+            self._CLIENT.disconnect()
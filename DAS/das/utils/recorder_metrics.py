@@ -0,0 +1,129 @@
+import re
+import threading
+
+# Topics of the wireless modules, the first group is the module id
+MODULE_TOPIC = re.compile(r"^/v3/wireless_module/([^/]+)/")
+
+
+class RecorderMetrics:
+    """Live message counters of a `Recorder`, per topic.
+
+    Counting a message only takes a dictionary lookup and a few additions without any lock (it is done on the MQTT
+    network thread for every message), all of the rates and per module values are worked out when the metrics are
+    read. A count can be off by one if `record` is called from several threads at the same time, which is fine for
+    monitoring. Rates are averaged over the last completed interval of at least `interval` seconds, so anyone can
+    read them at any time without disturbing the others.
+
+    Parameters
+    ----------
+    interval : float
+        Minimum time in seconds the rates are averaged over
+    start : float
+        Time the counting starts at (in the clock of the times passed to `record`)
+
+    Attributes
+    ----------
+    _TOPICS : dict
+        [messages, bytes, time of the last message] of each topic
+    _LOCK : `threading.Lock`
+        Held while the metrics are read (not while counting)
+    _previous : tuple
+        (time, {topic: (messages, bytes)}) at the start of the current interval
+    _rates : dict
+        (msgs/s, bytes/s) of each topic over the last completed interval
+    """
+
+    def __init__(self, interval: float = 5.0, start: float = 0.0) -> None:
+        self._INTERVAL = interval
+        self._TOPICS = {}
+        self._LOCK = threading.Lock()
+        self._previous = (start, {})
+        self._rates = {}
+
+    def record(self, time: float, mqtt_topic: str, message) -> None:
+        """Counts a message (the size of str payloads is counted in characters).
+
+        Parameters
+        ----------
+        time : float
+            Time the message arrived
+        mqtt_topic : str
+            Topic of the message
+        message : str or bytes
+            Payload of the message
+        """
+        entry = self._TOPICS.get(mqtt_topic)
+        if entry is None:
+            entry = self._TOPICS[mqtt_topic] = [0, 0, time]
+        entry[0] += 1
+        entry[1] += len(message)
+        entry[2] = time
+
+    def _update_rates(self, now: float, entries: dict) -> None:
+        """Starts a new interval once the current one is long enough (holding the lock)."""
+        previous_time, previous_counts = self._previous
+        elapsed = now - previous_time
+        if elapsed < self._INTERVAL or elapsed <= 0:
+            return
+
+        rates = {}
+        counts = {}
+        for mqtt_topic, (messages, size, _) in entries.items():
+            previous_messages, previous_size = previous_counts.get(mqtt_topic, (0, 0))
+            rates[mqtt_topic] = (
+                (messages - previous_messages) / elapsed,
+                (size - previous_size) / elapsed,
+            )
+            counts[mqtt_topic] = (messages, size)
+
+        self._rates = rates
+        self._previous = (now, counts)
+
+    def snapshot(self, now: float) -> dict:
+        """Current counters and rates.
+
+        Parameters
+        ----------
+        now : float
+            Current time (in the clock of the times passed to `record`)
+
+        Returns
+        -------
+        dict
+            messages, bytes, msgs_per_s and bytes_per_s in total and for each topic (topics), and the seconds since
+            the last message of each wireless module by module id (modules)
+        """
+        # Copying the dictionary is atomic, so new topics can keep arriving while it is read
+        entries = {
+            mqtt_topic: tuple(entry)
+            for mqtt_topic, entry in self._TOPICS.copy().items()
+        }
+        with self._LOCK:
+            self._update_rates(now, entries)
+            rates = self._rates
+
+        topics = {}
+        modules = {}
+        for mqtt_topic, (messages, size, last_time) in entries.items():
+            msgs_per_s, bytes_per_s = rates.get(mqtt_topic, (0.0, 0.0))
+            topics[mqtt_topic] = {
+                "messages": messages,
+                "bytes": size,
+                "msgs_per_s": msgs_per_s,
+                "bytes_per_s": bytes_per_s,
+            }
+
+            match = MODULE_TOPIC.match(mqtt_topic)
+            if match:
+                module_id = match.group(1)
+                since_last = now - last_time
+                modules[module_id] = min(modules.get(module_id, since_last), since_last)
+
+        return {
+            "messages": sum(topic["messages"] for topic in topics.values()),
+            "bytes": sum(topic["bytes"] for topic in topics.values()),
+            "msgs_per_s": sum(topic["msgs_per_s"] for topic in topics.values()),
+            "bytes_per_s": sum(topic["bytes_per_s"] for topic in topics.values()),
+            "topics": topics,
+            "modules": modules,
+        }
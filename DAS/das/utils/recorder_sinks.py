@@ -0,0 +1,175 @@
+from abc import ABC, abstractmethod
+from collections import deque
+from itertools import islice
+import os
+import threading
+
+from das.utils.log_codecs import get_codec
+from das.utils.log_format import LOG_FORMATS
+from das.utils.log_session import LogSession
+
+
+class RecorderSink(ABC):
+    """Extra output of a `Recorder`, fed with the same records as the main log.
+
+    Every sink gets its own queue and writer thread (a `BatchWriter`), so a slow sink only drops its own records
+    and never holds up the MQTT network thread, the main log or the other sinks.
+
+    Attributes
+    ----------
+    name : str
+        Name of the sink in `Recorder.sink_stats`
+    """
+
+    name = "sink"
+
+    def open(self, folder_path: str, log_num: int) -> None:
+        """Called once the recorder has its log number, before any record is written.
+
+        Parameters
+        ----------
+        folder_path : str
+            Folder of the recorder's logs
+        log_num : int
+            Number of the recorder's log
+        """
+        pass
+
+    @abstractmethod
+    def write(self, records: list) -> None:
+        """Writes a batch of (time_delta, mqtt_topic, message) records (runs on the sink's writer thread)."""
+
+    def sync(self) -> None:
+        """Saves everything written so far, called on checkpoints (runs on the sink's writer thread)."""
+        pass
+
+    def close(self) -> None:
+        """Called once the recorder has stopped and every record has been written."""
+        pass
+
+
+class LogSink(RecorderSink):
+    """Writes a second copy of the log, e.g. a binary log next to the csv.
+
+    Parameters
+    ----------
+    log_format : str
+        On-disk format of the copy, one of LOG_FORMATS
+    folder_path : str
+        Folder to write the copy to (None uses the recorder's folder). The copy uses the recorder's log number, so
+        a segmented copy of a segmented recorder needs its own folder (both manifests are named N_log.json).
+    session_options
+        Segment and compression options passed on to `LogSession`
+
+    Attributes
+    ----------
+    _LOG_SESSION : `LogSession`
+        Log file (or segments and manifest) of the copy
+    """
+
+    def __init__(
+        self, log_format: str = "binary", folder_path: str = None, **session_options
+    ) -> None:
+        if log_format not in LOG_FORMATS:
+            raise ValueError(
+                f"Unknown log format {log_format}, expected one of {list(LOG_FORMATS)}"
+            )
+
+        self.LOG_FORMAT = log_format
+        self._FOLDER_PATH = folder_path
+        self._SESSION_OPTIONS = session_options
+        self._LOG_SESSION = None
+        self.name = f"log ({log_format})"
+
+    def open(self, folder_path: str, log_num: int) -> None:
+        folder_path = self._FOLDER_PATH or folder_path
+        os.makedirs(folder_path, exist_ok=True)
+
+        # Never append to the recorder's own log or replace its manifest (same folder and log number). This is
+        # checked before the session is made, as making it opens its first segment and writes its manifest.
+        extension = LOG_FORMATS[self.LOG_FORMAT]
+        compression = self._SESSION_OPTIONS.get("compression")
+        if compression:
+            extension += get_codec(compression).EXTENSION
+        segmented = any(
+            self._SESSION_OPTIONS.get(option)
+            for option in ("segment_size", "segment_duration", "segment_topics")
+        )
+        if segmented:
+            filenames = [f"{log_num}_log.json", f"{log_num}_log.000.{extension}"]
+        else:
+            filenames = [f"{log_num}_log.{extension}"]
+        for filename in filenames:
+            filepath = os.path.join(folder_path, filename)
+            if os.path.exists(filepath):
+                raise FileExistsError(f"{filepath} is already being written")
+
+        self._LOG_SESSION = LogSession(
+            folder_path, log_num, self.LOG_FORMAT, **self._SESSION_OPTIONS
+        )
+        self.name = self._LOG_SESSION.name
+
+    def write(self, records: list) -> None:
+        self._LOG_SESSION.write_records(records)
+
+    def sync(self) -> None:
+        self._LOG_SESSION.checkpoint()
+
+    def close(self) -> None:
+        if self._LOG_SESSION is not None:
+            self._LOG_SESSION.close()
+
+
+class RingSink(RecorderSink):
+    """Keeps the most recent records in memory, e.g. for a live view of the last few seconds.
+
+    Parameters
+    ----------
+    max_records : int
+        Number of records kept, older records are discarded
+    name : str
+        Name of the sink in the stats
+    """
+
+    def __init__(self, max_records: int = 10000, name: str = "ring") -> None:
+        self._RECORDS = deque(maxlen=max_records)
+        self._LOCK = threading.Lock()
+        self.name = name
+
+    def write(self, records: list) -> None:
+        with self._LOCK:
+            self._RECORDS.extend(records)
+
+    def records(self, count: int = None) -> list:
+        """The most recent records, oldest first.
+
+        Parameters
+        ----------
+        count : int
+            Maximum number of records returned (None returns every record held)
+        """
+        with self._LOCK:
+            if count is None or count >= len(self._RECORDS):
+                return list(self._RECORDS)
+            return list(islice(self._RECORDS, len(self._RECORDS) - count, None))
+
+
+class CallbackSink(RecorderSink):
+    """Calls a function with the (time_delta, mqtt_topic, message) of every record, on the sink's own thread.
+
+    Parameters
+    ----------
+    callback : callable
+        Function called for every record
+    name : str
+        Name of the sink in the stats (defaults to the name of the function)
+    """
+
+    def __init__(self, callback, name: str = None) -> None:
+        self._CALLBACK = callback
+        self.name = name or getattr(callback, "__name__", "callback")
+
+    def write(self, records: list) -> None:
+        callback = self._CALLBACK
+        for time_delta, mqtt_topic, message in records:
+            callback(time_delta, mqtt_topic, message)
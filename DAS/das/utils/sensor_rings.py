@@ -0,0 +1,322 @@
+import math
+import threading
+import time
+
+import numpy as np
+
+# Default number of samples kept per sensor channel
+RING_CAPACITY = 3600
+
+# Python types of the sensor values kept in the rings (any other value, e.g. a GPS datetime string, is skipped)
+NUMERIC_TYPES = (int, float, bool)
+
+
+class SensorRing:
+    """Fixed size ring buffer of the latest (time, value) samples of one sensor channel, backed by NumPy arrays.
+
+    Appending and reading the latest sample are O(1). The samples are kept in the order they were appended, which
+    is time order, so a time window is found with a binary search and copied out in O(log n + k) for k samples.
+
+    Parameters
+    ----------
+    capacity : int
+        Number of samples kept, the oldest sample is overwritten once the ring is full
+
+    Attributes
+    ----------
+    count : int
+        Number of samples in the ring
+    _TIMES : numpy.ndarray
+        Times of the samples
+    _VALUES : numpy.ndarray
+        Values of the samples
+    _LOCK : `threading.Lock`
+        Held while the ring is appended to or read
+    _next : int
+        Position the next sample is written at
+    """
+
+    def __init__(self, capacity: int = RING_CAPACITY) -> None:
+        self.CAPACITY = max(1, capacity)
+        self._TIMES = np.empty(self.CAPACITY)
+        self._VALUES = np.empty(self.CAPACITY)
+        self._LOCK = threading.Lock()
+        self._next = 0
+        self.count = 0
+
+    def append(self, sample_time: float, value: float) -> None:
+        """Adds a sample, sample_time should not be older than the latest sample."""
+        with self._LOCK:
+            position = self._next
+            self._TIMES[position] = sample_time
+            self._VALUES[position] = value
+            self._next = (position + 1) % self.CAPACITY
+            if self.count < self.CAPACITY:
+                self.count += 1
+
+    def latest(self) -> tuple:
+        """(time, value) of the latest sample, None if the ring is empty."""
+        with self._LOCK:
+            if not self.count:
+                return None
+            position = self._next - 1
+            return float(self._TIMES[position]), float(self._VALUES[position])
+
+    def window(self, start: float = -math.inf, end: float = math.inf) -> tuple:
+        """Samples from start to end (both included).
+
+        Parameters
+        ----------
+        start : float
+            Time of the oldest sample returned
+        end : float
+            Time of the newest sample returned
+
+        Returns
+        -------
+        (numpy.ndarray, numpy.ndarray)
+            Times and values of the samples, oldest first
+        """
+        with self._LOCK:
+            # Once the ring is full the oldest samples are at the write position
+            if self.count < self.CAPACITY:
+                segments = [(0, self.count)]
+            else:
+                segments = [(self._next, self.CAPACITY), (0, self._next)]
+
+            slices = []
+            for first, last in segments:
+                times = self._TIMES[first:last]
+                slices.append(
+                    slice(
+                        first + np.searchsorted(times, start, side="left"),
+                        first + np.searchsorted(times, end, side="right"),
+                    )
+                )
+            return (
+                np.concatenate([self._TIMES[part] for part in slices]),
+                np.concatenate([self._VALUES[part] for part in slices]),
+            )
+
+    def downsample(self, start: float, end: float, buckets: int) -> dict:
+        """Min, max and mean of the samples in equal time buckets from start to end, in one pass over the window.
+
+        Parameters
+        ----------
+        start : float
+            Start time of the first bucket
+        end : float
+            End time of the last bucket
+        buckets : int
+            Number of buckets
+
+        Returns
+        -------
+        dict
+            time (start of the bucket), min, max, mean and count of every bucket holding samples, as arrays
+        """
+        times, values = self.window(start, end)
+        edges = np.linspace(start, end, max(1, buckets) + 1)
+
+        # The last bucket includes its end time
+        positions = np.searchsorted(times, edges[:-1], side="left")
+        counts = np.diff(np.append(positions, len(times)))
+        filled = counts > 0
+        starts = positions[filled]
+
+        if not len(starts):
+            empty = np.empty(0)
+            return {
+                "time": empty,
+                "min": empty,
+                "max": empty,
+                "mean": empty,
+                "count": empty,
+            }
+
+        return {
+            "time": edges[:-1][filled],
+            "min": np.minimum.reduceat(values, starts),
+            "max": np.maximum.reduceat(values, starts),
+            "mean": np.add.reduceat(values, starts) / counts[filled],
+            "count": counts[filled],
+        }
+
+
+class SensorRings:
+    """Live `SensorRing` of every sensor channel of the wireless modules, by the flattened channel name that
+    `DataToTempCSV` uses for its columns (`M<id>_<type>` or `M<id>_<type>_<sub>`, e.g. M2_co2 or M3_gps_speed).
+
+    Parameters
+    ----------
+    capacity : int
+        Number of samples kept per channel
+
+    Attributes
+    ----------
+    _RINGS : dict
+        {channel: `SensorRing`}
+    _LOCK : `threading.Lock`
+        Held while a ring is added
+    """
+
+    def __init__(self, capacity: int = RING_CAPACITY) -> None:
+        self.CAPACITY = capacity
+        self._RINGS = {}
+        self._LOCK = threading.Lock()
+
+    def record(self, sample_time: float, data_dict: dict) -> None:
+        """Adds the numeric values of a parsed wireless module message to the rings of their channels.
+
+        Parameters
+        ----------
+        sample_time : float
+            Unix time the message arrived
+        data_dict : dict
+            {channel: value} as parsed by `parse_module_message` (the *_TIME columns are skipped)
+        """
+        for channel, value in data_dict.items():
+            if not isinstance(value, NUMERIC_TYPES) or channel.endswith("_TIME"):
+                continue
+
+            ring = self._RINGS.get(channel)
+            if ring is None:
+                with self._LOCK:
+                    ring = self._RINGS.setdefault(channel, SensorRing(self.CAPACITY))
+            ring.append(sample_time, value)
+
+    def channels(self) -> list:
+        """Names of the channels with samples, sorted."""
+        return sorted(self._RINGS.copy())
+
+    def ring(self, channel: str) -> SensorRing:
+        """Ring of a channel, raises a KeyError if the channel has no samples."""
+        try:
+            return self._RINGS[channel]
+        except KeyError:
+            raise KeyError(f"No samples of channel {channel}") from None
+
+    def latest(self, channel: str) -> tuple:
+        """(time, value) of the latest sample of a channel."""
+        return self.ring(channel).latest()
+
+    def window(
+        self,
+        channel: str,
+        seconds: float = None,
+        start: float = None,
+        end: float = None,
+        now: float = None,
+    ) -> tuple:
+        """Samples of a channel in a time window.
+
+        Parameters
+        ----------
+        channel : str
+            Name of the channel, e.g. M2_co2
+        seconds : float
+            Only the samples of the last `seconds` seconds before now (overrides start)
+        start : float
+            Unix time of the oldest sample (None from the oldest sample kept)
+        end : float
+            Unix time of the newest sample (None up to the latest sample)
+        now : float
+            Current unix time (None uses the clock)
+
+        Returns
+        -------
+        (numpy.ndarray, numpy.ndarray)
+            Times and values of the samples, oldest first
+        """
+        start, end = self._bounds(seconds, start, end, now)
+        return self.ring(channel).window(start, end)
+
+    def downsample(
+        self,
+        channel: str,
+        buckets: int,
+        seconds: float = None,
+        start: float = None,
+        end: float = None,
+        now: float = None,
+    ) -> dict:
+        """Min, max and mean of the samples of a channel in `buckets` equal time buckets, see `SensorRing.downsample`.
+
+        The window is chosen as in `window`. Without a start it starts at the oldest sample and without an end it
+        ends at the latest sample.
+        """
+        ring = self.ring(channel)
+        start, end = self._bounds(seconds, start, end, now)
+        if math.isinf(start) or math.isinf(end):
+            times, _ = ring.window(start, end)
+            if not len(times):
+                return ring.downsample(0.0, 0.0, buckets)
+            start = times[0] if math.isinf(start) else start
+            end = times[-1] if math.isinf(end) else end
+        return ring.downsample(start, end, buckets)
+
+    @staticmethod
+    def _bounds(seconds: float, start: float, end: float, now: float) -> tuple:
+        """(start, end) of a window, infinite where it is open."""
+        if seconds is not None:
+            now = time.time() if now is None else now
+            return now - seconds, now if end is None else end
+        return (
+            -math.inf if start is None else start,
+            math.inf if end is None else end,
+        )
+
+    def query(self, request: dict, now: float = None) -> dict:
+        """Answers a query sent on the query topic of the wireless logger.
+
+        Parameters
+        ----------
+        request : dict
+            Without a channel, lists the channels. With a channel and no window (seconds, start or end), returns its
+            latest sample, otherwise the samples of the window (see `window`), downsampled if buckets is given. An id
+            is copied into the response to match it with its request.
+        now : float
+            Current unix time (None uses the clock)
+
+        Returns
+        -------
+        dict
+            channels, latest ([time, value] or None), samples ({time: [...], value: [...]}) or buckets ({time, min, max,
+            mean, count: [...]}), or error if the query failed
+        """
+        response = {"id": request.get("id")}
+        channel = request.get("channel")
+        try:
+            if channel is None:
+                response["channels"] = self.channels()
+                return response
+
+            response["channel"] = channel
+            window = {
+                key: request[key]
+                for key in ("seconds", "start", "end")
+                if request.get(key) is not None
+            }
+            if request.get("buckets"):
+                buckets = self.downsample(
+                    channel, int(request["buckets"]), now=now, **window
+                )
+                response["buckets"] = {
+                    key: array.tolist() for key, array in buckets.items()
+                }
+
+            elif window:
+                times, values = self.window(channel, now=now, **window)
+                response["samples"] = {"time": times.tolist(), "value": values.tolist()}
+
+            else:
+                latest = self.latest(channel)
+                response["latest"] = list(latest) if latest else None
+
+        except KeyError as e:
+            response["error"] = e.args[0]
+
+        except (TypeError, ValueError) as e:
+            response["error"] = f"Invalid query: {e}"
+
+        return response
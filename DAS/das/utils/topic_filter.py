@@ -0,0 +1,145 @@
+class _Node:
+    """A level of the topic filter trie."""
+
+    __slots__ = ("children", "plus", "hash", "end")
+
+    def __init__(self) -> None:
+        self.children = {}
+        self.plus = None
+        self.hash = False
+        self.end = False
+
+
+def _insert(root: _Node, pattern: str) -> None:
+    """Adds an MQTT topic filter (with + and # wildcards) to a trie."""
+    levels = pattern.split("/")
+    node = root
+    for i, level in enumerate(levels):
+        if level == "#":
+            if i != len(levels) - 1:
+                raise ValueError(
+                    f"# must be the last level of the topic filter {pattern}"
+                )
+            node.hash = True
+            return
+
+        if level == "+":
+            if node.plus is None:
+                node.plus = _Node()
+            node = node.plus
+        else:
+            if "+" in level or "#" in level:
+                raise ValueError(
+                    f"Wildcards must take up a whole level of the topic filter {pattern}"
+                )
+            node = node.children.setdefault(level, _Node())
+
+    node.end = True
+
+
+def _match(root: _Node, topic: str) -> bool:
+    """Whether a topic matches any filter of a trie, following every wildcard branch level by level."""
+    levels = topic.split("/")
+
+    # Topics starting with $ (e.g. $SYS) are not matched by a wildcard at the first level
+    system = topic.startswith("$")
+
+    nodes = [root]
+    for depth, level in enumerate(levels):
+        next_nodes = []
+        for node in nodes:
+            if node.hash and not (system and depth == 0):
+                return True
+
+            child = node.children.get(level)
+            if child is not None:
+                next_nodes.append(child)
+            if node.plus is not None and not (system and depth == 0):
+                next_nodes.append(node.plus)
+
+        if not next_nodes:
+            return False
+        nodes = next_nodes
+
+    # "a/#" also matches "a" itself
+    return any(node.end or node.hash for node in nodes)
+
+
+class TopicFilter:
+    """Include/exclude filter for MQTT topics using the MQTT wildcards (+ matches one level, # the rest).
+
+    The patterns are compiled into a trie so matching a topic takes time proportional to the depth of the topic
+    rather than to the number of patterns, and the result for each topic is cached as logs only hold a handful of
+    distinct topics.
+
+    Parameters
+    ----------
+    include : List(str)
+        Topic filters to keep (None keeps every topic)
+    exclude : List(str)
+        Topic filters to drop, even if they are included
+
+    Attributes
+    ----------
+    INCLUDE : List(str)
+        Topic filters to keep
+    EXCLUDE : List(str)
+        Topic filters to drop
+    """
+
+    # Maximum number of topics cached before the cache is cleared
+    CACHE_SIZE = 4096
+
+    def __init__(self, include: list = None, exclude: list = None) -> None:
+        self.INCLUDE = list(include) if include else []
+        self.EXCLUDE = list(exclude) if exclude else []
+
+        self._INCLUDE_TRIE = None
+        if self.INCLUDE:
+            self._INCLUDE_TRIE = _Node()
+            for pattern in self.INCLUDE:
+                _insert(self._INCLUDE_TRIE, pattern)
+
+        self._EXCLUDE_TRIE = None
+        if self.EXCLUDE:
+            self._EXCLUDE_TRIE = _Node()
+            for pattern in self.EXCLUDE:
+                _insert(self._EXCLUDE_TRIE, pattern)
+
+        self._cache = {}
+
+    def __bool__(self) -> bool:
+        """Whether the filter drops any topic at all."""
+        return bool(self.INCLUDE or self.EXCLUDE)
+
+    def matches(self, topic: str) -> bool:
+        """Whether a topic passes the filter.
+
+        Parameters
+        ----------
+        topic : str
+            MQTT topic (without wildcards)
+
+        Returns
+        -------
+        bool
+            True if the topic is included and not excluded
+        """
+        result = self._cache.get(topic)
+        if result is None:
+            result = (
+                self._INCLUDE_TRIE is None or _match(self._INCLUDE_TRIE, topic)
+            ) and (self._EXCLUDE_TRIE is None or not _match(self._EXCLUDE_TRIE, topic))
+
+            if len(self._cache) >= self.CACHE_SIZE:
+                self._cache.clear()
+            self._cache[topic] = result
+
+        return result
+
+    def filter_records(self, records):
+        """Streams the (time_delta, mqtt_topic, message) records whose topic passes the filter."""
+        matches = self.matches
+        for record in records:
+            if matches(record[1]):
+                yield record